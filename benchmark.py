@@ -0,0 +1,419 @@
+"""
+Benchmarks for the remote ZIP engine.
+
+Builds synthetic archives, serves them from a local HTTP server that supports range
+requests (with optional latency and bandwidth limits) and measures the main code
+paths: listing, page rendering, file throughput, folder downloads, previews and the
+cold start of one-off CLI runs.
+Each result records the wall time, the number of range requests and the bytes
+fetched, and the run is written to JSON so results can be compared between commits.
+
+    python benchmark.py --quick
+    python benchmark.py --latency 0.05 --bandwidth 20 --compare benchmark-results/old.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from pathlib import Path
+from urllib.parse import quote
+
+import remote_zip_viewer
+
+# --- Configuration ---
+DATA_DIR = Path("benchmark-data")          # Generated archives are kept here between runs
+RESULTS_DIR = Path("benchmark-results")    # One JSON file per run
+
+# Archive sizes for a full run and for --quick.
+FULL_SCALE = {"tiny_files": 1_000_000, "huge_members": 3, "huge_member_mb": 256, "deep_levels": 64, "zip64_files": 70_000}
+QUICK_SCALE = {"tiny_files": 20_000, "huge_members": 2, "huge_member_mb": 32, "deep_levels": 32, "zip64_files": 70_000}
+
+
+# --- Synthetic archives ---
+
+def _log_lines(size, seed=0):
+    """Yields compressible log-like lines totalling at least size bytes."""
+    written, i = 0, 0
+    while written < size:
+        line = b"%010d INFO worker-%02d handled request %d in %d ms\n" % (i, (i + seed) % 16, i * 7919 % 1000003, i % 997)
+        written += len(line)
+        i += 1
+        yield line
+
+def make_tiny_files(path, count):
+    """Many tiny files spread over a two-level tree, as in dataset or source dumps."""
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_STORED) as zf:
+        for i in range(count):
+            zf.writestr(f"data/part{i % 1000:03d}/item_{i:07d}.json", b'{"id": %d}' % i)
+
+def make_huge_members(path, members, size_mb):
+    """A few large DEFLATE members, plus one STORED copy for raw throughput."""
+    size = size_mb * 1024 * 1024
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED, allowZip64=True) as zf:
+        for n in range(members):
+            with zf.open(f"logs/server{n}.log", "w", force_zip64=True) as f:
+                for line in _log_lines(size, n):
+                    f.write(line)
+        info = zipfile.ZipInfo("raw/stored.bin")
+        info.compress_type = zipfile.ZIP_STORED
+        with zf.open(info, "w", force_zip64=True) as f:
+            for line in _log_lines(size):
+                f.write(line)
+
+def make_deep_tree(path, levels, files_per_level=20):
+    """A deeply nested tree with a few files at every level."""
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        folder = ""
+        for level in range(levels):
+            folder += f"level{level:02d}/"
+            for i in range(files_per_level):
+                zf.writestr(f"{folder}file{i:02d}.txt", f"level {level} file {i}\n".encode() * 20)
+
+def make_zip64(path, count):
+    """More entries than a classic end record can count, which forces the ZIP64 records."""
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as zf:
+        for i in range(count):
+            zf.writestr(f"entries/{i // 1000:03d}/e{i:06d}.txt", b"x")
+
+def build_archives(data_dir, scale):
+    """Creates the benchmark archives that don't exist yet; returns {name: path}."""
+    data_dir.mkdir(parents=True, exist_ok=True)
+    specs = {
+        "tiny": (f"tiny_{scale['tiny_files']}.zip", make_tiny_files, (scale["tiny_files"],)),
+        "huge": (f"huge_{scale['huge_members']}x{scale['huge_member_mb']}mb.zip", make_huge_members,
+                 (scale["huge_members"], scale["huge_member_mb"])),
+        "deep": (f"deep_{scale['deep_levels']}.zip", make_deep_tree, (scale["deep_levels"],)),
+        "zip64": (f"zip64_{scale['zip64_files']}.zip", make_zip64, (scale["zip64_files"],)),
+    }
+    archives = {}
+    for name, (filename, builder, args) in specs.items():
+        path = data_dir / filename
+        if not path.exists():
+            print(f"Generating {filename}...")
+            partial = path.with_suffix(".partial")
+            builder(partial, *args)
+            partial.replace(path)
+        archives[name] = path
+    return archives
+
+
+# --- Range-capable HTTP server ---
+
+class ThrottledRangeHandler(SimpleHTTPRequestHandler):
+    """Serves files with single byte ranges, adding latency and a bandwidth limit per response."""
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return None
+        server = self.server
+        time.sleep(server.latency)
+        f = open(path, "rb")
+        stat = os.fstat(f.fileno())
+        size = stat.st_size
+        start, end = 0, size - 1
+        match = re.match(r"bytes=(\d*)-(\d*)$", self.headers.get("Range") or "")
+        if match:
+            first, last = match.groups()
+            if first:
+                start = int(first)
+                end = min(int(last), size - 1) if last else size - 1
+            else:
+                start = max(size - int(last), 0)
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+        with server.lock:
+            server.stats["requests"] += 1
+            server.stats["range_requests"] += bool(match)
+        self.send_header("Content-Type", "application/zip")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("ETag", f'"{stat.st_mtime_ns:x}-{size:x}"')
+        self.send_header("Last-Modified", self.date_time_string(stat.st_mtime))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+        f.seek(start)
+        self._remaining = end - start + 1
+        return f
+
+    def copyfile(self, source, outputfile):
+        server = self.server
+        chunk_size = 64 * 1024
+        while self._remaining > 0:
+            chunk = source.read(min(chunk_size, self._remaining))
+            if not chunk:
+                break
+            started = time.monotonic()
+            outputfile.write(chunk)
+            self._remaining -= len(chunk)
+            with server.lock:
+                server.stats["bytes_sent"] += len(chunk)
+            if server.bandwidth:
+                delay = len(chunk) / server.bandwidth - (time.monotonic() - started)
+                if delay > 0:
+                    time.sleep(delay)
+
+@contextlib.contextmanager
+def serve(directory, latency=0.0, bandwidth=None):
+    """
+    Serves directory on a free local port. latency is added to every request in seconds,
+    bandwidth caps each response in bytes per second. Yields the server; its .stats
+    count requests and bytes sent.
+    """
+    def handler(*args, **kwargs):
+        return ThrottledRangeHandler(*args, directory=str(directory), **kwargs)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.bandwidth = bandwidth
+    server.lock = threading.Lock()
+    server.stats = {"requests": 0, "range_requests": 0, "bytes_sent": 0}
+    server.base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+# --- Scenarios ---
+
+def reset_caches():
+    """Empties every in-memory cache and pool, so the next measurement starts cold."""
+    remote_zip_viewer.archive_pool.clear()
+    remote_zip_viewer.block_cache.clear()
+    remote_zip_viewer.file_list_cache.clear()
+    remote_zip_viewer.session_pool.clear()
+    remote_zip_viewer.seek_indexes.clear()
+    remote_zip_viewer.preview_cache.clear()
+
+class Recorder:
+    """Runs measurements against a server and collects their results."""
+
+    def __init__(self, server):
+        self.server = server
+        self.results = []
+
+    @contextlib.contextmanager
+    def measure(self, scenario, archive, **extra):
+        """
+        Times the body (unless it sets "seconds" itself) and records the requests and
+        bytes the server sent meanwhile.
+        """
+        with self.server.lock:
+            before = dict(self.server.stats)
+        started = time.perf_counter()
+        result = dict(scenario=scenario, archive=archive, **extra)
+        yield result
+        result["seconds"] = round(result.get("seconds", time.perf_counter() - started), 6)
+        with self.server.lock:
+            after = dict(self.server.stats)
+        result["requests"] = after["requests"] - before["requests"]
+        result["range_requests"] = after["range_requests"] - before["range_requests"]
+        result["bytes_fetched"] = after["bytes_sent"] - before["bytes_sent"]
+        if result.get("bytes_served"):
+            result["mb_per_second"] = round(result["bytes_served"] / 1e6 / max(result["seconds"], 1e-9), 2)
+        self.results.append(result)
+        print(f"  {scenario:<24} {archive:<6} {result['seconds']:>9.3f}s {result['requests']:>6} requests "
+              f"{result['bytes_fetched'] / 1e6:>10.2f} MB fetched")
+
+def scenario_listing(recorder, url, archive):
+    """list_entries cold (empty caches and disk index), from the disk index, and from memory."""
+    reset_caches()
+    remote_zip_viewer.disk_index.path = Path(tempfile.mkdtemp()) / "index.sqlite3"
+    with recorder.measure("list_entries_cold", archive) as result:
+        result["entries"] = len(remote_zip_viewer.list_entries(url)) - 1
+    reset_caches()
+    with recorder.measure("list_entries_disk", archive):
+        remote_zip_viewer.list_entries(url)
+    with recorder.measure("list_entries_warm", archive):
+        remote_zip_viewer.list_entries(url)
+
+def scenario_view(recorder, client, url, archive):
+    """Renders /view with a warm listing."""
+    remote_zip_viewer.list_entries(url)
+    with recorder.measure("view_render", archive) as result:
+        response = client.get(f"/view?url={quote(url, safe='')}")
+        result["bytes_served"] = len(response.data)
+
+def _drain(response):
+    """Consumes a streamed test response without holding it in memory; returns its size."""
+    try:
+        return sum(len(chunk) for chunk in response.response)
+    finally:
+        response.close()
+
+def scenario_file(recorder, client, url, archive, names):
+    """Full /file downloads of large members, cold (first read) and again (cached blocks and seek index)."""
+    for name in names:
+        for label in ("file_cold", "file_warm"):
+            if label == "file_cold":
+                reset_caches()
+            with recorder.measure(label, archive, member=name) as result:
+                response = client.get(f"/file?url={quote(url, safe='')}&name={quote(name)}")
+                result["bytes_served"] = _drain(response)
+
+def scenario_folder(recorder, client, url, archive, folder):
+    """Exports a folder through /folder and downloads it with the CLI."""
+    reset_caches()
+    with recorder.measure("folder_export", archive, folder=folder) as result:
+        response = client.get(f"/folder?url={quote(url, safe='')}&name={quote(folder)}")
+        result["bytes_served"] = _drain(response)
+    reset_caches()
+    with tempfile.TemporaryDirectory() as output, recorder.measure("folder_cli", archive, folder=folder) as result:
+        with contextlib.redirect_stdout(io.StringIO()):
+            remote_zip_viewer._cli_download_folder(folder, url, output, False, None, jobs=4)
+        result["bytes_served"] = sum(p.stat().st_size for p in Path(output).rglob("*") if p.is_file())
+
+def scenario_preview(recorder, client, url, archive, name):
+    """Preview latency: first window, a tail before and after a full read, and a cached window."""
+    reset_caches()
+    base = f"/api/preview?url={quote(url, safe='')}&name={quote(name)}"
+    with recorder.measure("preview_head", archive, member=name):
+        client.get(base)
+    with recorder.measure("preview_tail_cold", archive, member=name):
+        client.get(f"{base}&tail=100")
+    with recorder.measure("preview_cached", archive, member=name):
+        client.get(f"{base}&tail=100")
+    remote_zip_viewer.preview_cache.clear()
+    remote_zip_viewer.block_cache.clear()
+    with recorder.measure("preview_tail_seek", archive, member=name):
+        client.get(f"{base}&tail=100&length=65536")
+
+def scenario_startup(recorder, url, archive, runs=5):
+    """
+    Cold start of one-off CLI listings in fresh processes: the first run with an empty
+    disk index, then the median of `runs` more. Also records whether importing the
+    module pulls in Flask.
+    """
+    script = Path(remote_zip_viewer.__file__).resolve()
+    with tempfile.TemporaryDirectory() as workdir:
+        env = dict(os.environ, REMOTE_ZIP_CACHE_DIR=workdir)
+        command = [sys.executable, str(script), url, "-l"]
+
+        def timed_run():
+            started = time.perf_counter()
+            subprocess.run(command, cwd=workdir, env=env, check=True, stdout=subprocess.DEVNULL)
+            return time.perf_counter() - started
+
+        with recorder.measure("cli_list_first_run", archive) as result:
+            result["seconds"] = timed_run()
+        with recorder.measure("cli_list_startup", archive, runs=runs) as result:
+            result["seconds"] = sorted(timed_run() for _ in range(runs))[runs // 2]
+        with recorder.measure("module_import", archive) as result:
+            probe = "import sys, time; t = time.perf_counter(); import remote_zip_viewer; print(time.perf_counter() - t, 'flask' in sys.modules)"
+            output = subprocess.check_output([sys.executable, "-c", probe], cwd=script.parent, env=env, text=True)
+            seconds, flask_loaded = output.split()
+            result["seconds"] = float(seconds)
+            result["imports_flask"] = flask_loaded == "True"
+
+def run(archives, latency=0.0, bandwidth=None, scenarios=None):
+    """Runs the selected scenarios (all by default) and returns their results."""
+    client = remote_zip_viewer.app.test_client()
+    remote_zip_viewer.logger.disabled = True
+    data_dir = Path(next(iter(archives.values()))).parent
+    selected = set(scenarios or ("list", "view", "file", "folder", "preview", "startup"))
+    with serve(data_dir, latency, bandwidth) as server:
+        recorder = Recorder(server)
+        url = {name: f"{server.base_url}/{Path(path).name}" for name, path in archives.items()}
+        if "list" in selected:
+            for name in ("tiny", "deep", "zip64"):
+                scenario_listing(recorder, url[name], name)
+        if "view" in selected:
+            for name in ("tiny", "deep"):
+                scenario_view(recorder, client, url[name], name)
+        if "file" in selected:
+            scenario_file(recorder, client, url["huge"], "huge", ["logs/server0.log", "raw/stored.bin"])
+        if "folder" in selected:
+            scenario_folder(recorder, client, url["tiny"], "tiny", "data/part007")
+            scenario_folder(recorder, client, url["deep"], "deep", "level00/level01")
+        if "preview" in selected:
+            scenario_preview(recorder, client, url["huge"], "huge", "logs/server1.log")
+        if "startup" in selected:
+            scenario_startup(recorder, url["deep"], "deep")
+    return recorder.results
+
+
+# --- Reporting ---
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, baseline_path):
+    """Prints the change in time, requests and bytes fetched against an earlier run."""
+    baseline = json.loads(Path(baseline_path).read_text())
+    key = lambda r: (r["scenario"], r["archive"], r.get("member") or r.get("folder"))
+    old = {key(r): r for r in baseline["results"]}
+    print(f"\nCompared with {baseline.get('commit') or baseline_path}:")
+    for result in results:
+        before = old.get(key(result))
+        if before is None:
+            continue
+        change = (result["seconds"] - before["seconds"]) / max(before["seconds"], 1e-9) * 100
+        print(f"  {result['scenario']:<24} {result['archive']:<6} {change:+7.1f}% time, "
+              f"{result['requests'] - before['requests']:+d} requests, "
+              f"{(result['bytes_fetched'] - before['bytes_fetched']) / 1e6:+.2f} MB")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the remote ZIP engine against a local range server.")
+    parser.add_argument("--quick", action="store_true", help="Use smaller archives (20k tiny files, 32 MB members).")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every request.")
+    parser.add_argument("--bandwidth", type=float, default=None, help="Per-response bandwidth limit in MB/s.")
+    parser.add_argument("--scenario", action="append", choices=["list", "view", "file", "folder", "preview", "startup"],
+                        help="Run only this scenario (repeatable).")
+    parser.add_argument("--data-dir", type=Path, default=DATA_DIR, help="Where generated archives are kept.")
+    parser.add_argument("-o", "--output", type=Path, help="Result file. Defaults to benchmark-results/<commit>.json.")
+    parser.add_argument("--compare", help="An earlier result file to compare against.")
+    args = parser.parse_args()
+
+    scale = QUICK_SCALE if args.quick else FULL_SCALE
+    archives = build_archives(args.data_dir, scale)
+    bandwidth = args.bandwidth * 1e6 if args.bandwidth else None
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        remote_zip_viewer.disk_index.path = Path(cache_dir) / "index.sqlite3"
+        print(f"Running benchmarks (latency {args.latency}s, bandwidth {args.bandwidth or 'unlimited'} MB/s)...")
+        results = run(archives, args.latency, bandwidth, args.scenario)
+
+    commit = _git_commit()
+    report = {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "version": remote_zip_viewer.__version__,
+        "config": {"scale": scale, "latency": args.latency, "bandwidth": bandwidth},
+        "results": results,
+    }
+    output = args.output or RESULTS_DIR / f"{commit or time.strftime('%Y%m%d-%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"\nResults written to {output}")
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
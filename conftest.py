@@ -1,4 +1,11 @@
+import os
+import re
+import threading
+import time
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
 import pytest
+import remote_zip_viewer
 from remote_zip_viewer import app as flask_app
 
 @pytest.fixture
@@ -11,4 +18,106 @@ def app():
 @pytest.fixture
 def client(app):
     """A test client for the app."""
-    return app.test_client()
\ No newline at end of file
+    return app.test_client()
+
+@pytest.fixture(autouse=True)
+def reset_archive_pool(tmp_path, monkeypatch):
+    """Pooled archives and sessions, cached blocks, listings, previews, seek and stored indexes and metrics must not leak between tests."""
+    monkeypatch.setattr(remote_zip_viewer.disk_index, "path", tmp_path / "cache" / "index.sqlite3")
+    remote_zip_viewer.archive_pool.clear()
+    remote_zip_viewer.block_cache.clear()
+    remote_zip_viewer.file_list_cache.clear()
+    remote_zip_viewer.session_pool.clear()
+    remote_zip_viewer.seek_indexes.clear()
+    remote_zip_viewer.preview_cache.clear()
+    remote_zip_viewer.metrics.clear()
+    yield
+    remote_zip_viewer.archive_pool.clear()
+    remote_zip_viewer.block_cache.clear()
+    remote_zip_viewer.file_list_cache.clear()
+    remote_zip_viewer.session_pool.clear()
+    remote_zip_viewer.seek_indexes.clear()
+    remote_zip_viewer.preview_cache.clear()
+    remote_zip_viewer.metrics.clear()
+
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    """A static file handler that understands single byte-range requests and keep-alive."""
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return None
+        self.server.requests.append((self.command, self.headers.get('Range')))
+        self.server.clients.add(self.client_address)
+        time.sleep(self.server.delay)
+        f = open(path, 'rb')
+        stat = os.fstat(f.fileno())
+        size = stat.st_size
+        start, end = 0, size - 1
+        match = re.match(r'bytes=(\d*)-(\d*)$', self.headers.get('Range') or '')
+        if match:
+            first, last = match.groups()
+            if first:
+                start = int(first)
+                end = min(int(last), size - 1) if last else size - 1
+            else:
+                start = max(size - int(last), 0)
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', 'application/zip')
+        self.send_header('Content-Length', str(end - start + 1))
+        if self.server.validators:
+            self.send_header('ETag', f'"{stat.st_mtime_ns:x}-{size:x}"')
+            self.send_header('Last-Modified', self.date_time_string(stat.st_mtime))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+        f.seek(start)
+        self._remaining = end - start + 1
+        return f
+
+    def copyfile(self, source, outputfile):
+        while self._remaining > 0:
+            chunk = source.read(min(64 * 1024, self._remaining))
+            if not chunk:
+                break
+            outputfile.write(chunk)
+            self._remaining -= len(chunk)
+
+
+class RequestLog(list):
+    """
+    The list of served requests. Through .server, .delay slows every response down,
+    .validators = False drops ETag and Last-Modified, and .clients holds the address of
+    every connection that sent a request.
+    """
+    server = None
+
+
+@pytest.fixture
+def range_server(tmp_path):
+    """
+    Serves tmp_path over HTTP with range support.
+    Yields (base_url, directory, requests) where requests lists every (method, Range) served.
+    """
+    def handler(*args, **kwargs):
+        return RangeRequestHandler(*args, directory=str(tmp_path), **kwargs)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.delay = 0
+    server.validators = True
+    server.clients = set()
+    server.requests = RequestLog()
+    server.requests.server = server
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", tmp_path, server.requests
+    server.shutdown()
+    server.server_close()
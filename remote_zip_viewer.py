@@ -4,9 +4,7 @@ def _ensure_dependencies():
     This makes the script more portable by handling its own dependencies.
     """
     import sys
-    import subprocess
     import os
-    import shutil
     
     # List of required packages and their corresponding import names
     required_packages = {
@@ -16,14 +14,16 @@ def _ensure_dependencies():
         'waitress': 'waitress'
     }
     
-    missing_packages = []
-    for package, import_name in required_packages.items():
-        try:
-            __import__(import_name)
-        except ImportError:
-            missing_packages.append(package)
+    # Probing with find_spec doesn't import anything, so CLI runs don't pay for Flask.
+    if os.environ.get('REMOTE_ZIP_SKIP_DEPENDENCY_CHECK'):
+        return
+    from importlib.util import find_spec
+    missing_packages = [package for package, import_name in required_packages.items()
+                        if find_spec(import_name) is None]
             
     if missing_packages:
+        import subprocess
+        import shutil
         print(f"The following required packages are missing: {', '.join(missing_packages)}")
         print("Attempting to install them now...")
 
@@ -69,19 +69,68 @@ def _ensure_dependencies():
 
 _ensure_dependencies()
 
-from flask import Flask, request, render_template_string, Response, redirect, url_for, abort, session
-from remotezip import RemoteZip
+from remotezip import RemoteZip, RemoteFetcher, PartialBuffer, RangeNotSupported, RemoteIOError
 from pathlib import Path
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, deque
+from contextlib import closing, contextmanager
+import contextvars
+import logging
 import mimetypes
+import re
 import zipfile
+import io
+import struct
+import sys
+import threading
+import time
+import weakref
+import zlib
 from functools import wraps
-from cachetools import cached, TTLCache
+from itertools import accumulate, chain
+from cachetools import TTLCache
+import requests
 import os
 
-app = Flask(__name__)
 __version__ = "0.8.8"
-app.secret_key = os.urandom(24) # Needed for secure session management
-app.jinja_env.globals['version'] = __version__
+logger = logging.getLogger(__name__)  # The Flask app logs through the same logger
+
+# --- Flask app ---
+# Flask is only imported when the web app is first used, so CLI runs start quickly.
+# Views are recorded with @route and registered when get_app() creates the app.
+_routes = []
+_app = None
+_app_lock = threading.Lock()
+
+def route(rule, **options):
+    """Records a view like app.route; it is registered once the Flask app is created."""
+    def decorator(view):
+        _routes.append((rule, options, view))
+        return view
+    return decorator
+
+def get_app():
+    """Returns the Flask app, importing Flask and registering every view on first use."""
+    global _app, request, render_template_string, Response, redirect, url_for, abort, session
+    with _app_lock:
+        if _app is None:
+            from flask import Flask, request, render_template_string, Response, redirect, url_for, abort, session
+            flask_app = Flask(__name__)
+            flask_app.secret_key = os.urandom(24) # Needed for secure session management
+            flask_app.jinja_env.globals['version'] = __version__
+            flask_app.add_template_filter(format_bytes, 'format_bytes')
+            flask_app.before_request(_start_request_timer)
+            flask_app.after_request(_add_server_timing)
+            for rule, options, view in _routes:
+                flask_app.add_url_rule(rule, view_func=view, **options)
+            _app = flask_app
+        return _app
+
+def __getattr__(name):
+    if name == 'app':
+        return get_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 INDEX_HTML = """
 <!doctype html>
@@ -160,82 +209,45 @@ INDEX_HTML = """
     <p class="error"><strong>Error:</strong> {{ error }}</p>
   {% endif %}
 
-  {% if tree is defined %}
+  {% if page is defined %}
   <article style="margin-top: 2rem;">
     <header>Contents of <a href="{{url}}" target="_blank">{{ url }}</a></header>
     <div style="padding: 1rem 0;">
-      <input type="search" id="search-box" placeholder="Search files and folders...">
+      <input type="search" id="search-box" placeholder="Search files and folders (wildcards like *.py allowed)...">
     </div>
+    <small id="search-status" class="hidden"></small>
     <div class="tree">
-  {% macro render_tree(subtree, prefix='') %}
-    <ul>
-    {% for name, node in subtree|dictsort %}
-      {% if node.type == 'dir' %}
-        <li id="folder-{{ (prefix + name)|replace('/', '-') }}" class="folder" onclick="toggle(event, this)">
-          <div class="tree-item">
-            <svg class="icon icon-closed" xmlns="http://www.w3.org/2000/svg" viewBox="0 0 24 24" fill="currentColor"><path d="M20 6h-8l-2-2H4c-1.1 0-1.99.9-1.99 2L2 18c0 1.1.9 2 2 2h16c1.1 0 2-.9 2-2V8c0-1.1-.9-2-2-2zm0 12H4V8h16v10z"/></svg>
-            <svg class="icon icon-open" xmlns="http://www.w3.org/2000/svg" viewBox="0 0 24 24" fill="currentColor"><path d="M20 6h-8l-2-2H4c-1.1 0-1.99.9-1.99 2L2 18c0 1.1.9 2 2 2h16c1.1 0 2-.9 2-2V8c0-1.1-.9-2-2-2zm-2.06 11L15 15.28 12.06 17l-1.06-1.06L14.44 12 11 8.56 12.06 7.5 15 10.44 17.94 7.5 19 8.56 15.56 12l3.44 3.44L17.94 17z"/></svg>
-            <span class="tree-item-label">{{ name }}</span>
-          </div>
-          {{ render_tree(node.children, prefix + name + '/') }}
-        </li>
-      {% else %}
-        <li class="file">
-          <div class="tree-item">
-            <svg class="icon" xmlns="http://www.w3.org/2000/svg" viewBox="0 0 24 24" fill="currentColor"><path d="M14 2H6c-1.1 0-1.99.9-1.99 2L4 20c0 1.1.89 2 1.99 2H18c1.1 0 2-.9 2-2V8l-6-6zM6 20V4h7v5h5v11H6z"/></svg>
-            <span class="tree-item-label" title="{{ name }}">{{ name }}</span>
-            <span class="tree-item-size">{{ node.info.file_size|format_bytes }}</span>
-            <div class="tree-item-actions">
-              {% if node.info.is_text or node.info.file_size < 102400 %}
-                <a href="{{ url_for('preview_file') }}?url={{ url|urlencode }}&name={{ node.info.filename|urlencode }}{% if no_verify %}&no_verify=on{% endif %}" role="button" class="outline secondary btn-sm">Preview</a>
-              {% endif %}
-              {% if node.info.is_image %}
-                <a href="{{ url_for('preview_image') }}?url={{ url|urlencode }}&name={{ node.info.filename|urlencode }}{% if no_verify %}&no_verify=on{% endif %}" role="button" class="outline secondary btn-sm">Image</a>
-              {% endif %}
-              <a href="{{ url_for('download_file') }}?url={{ url|urlencode }}&name={{ node.info.filename|urlencode }}{% if no_verify %}&no_verify=on{% endif %}" role="button" class="outline secondary btn-sm download-btn" data-filename="{{ node.info.filename }}">Get File</a>
-
-            </div>
-          </div>
-        </li>
-      {% endif %}
-    {% endfor %}
-    </ul>
-  {% endmacro %}
-  {{ render_tree(tree) }} {# Initial call to the macro #}
+      <ul id="tree-root" data-path=""></ul>
+      <ul id="search-results" class="hidden"></ul>
     </div>
   </article>
   {% endif %}
 <script>
   const currentUrl = "{{ url or '' }}";
+  const noVerify = {{ 'true' if no_verify else 'false' }};
   const folderStateKey = `folderState-${currentUrl}`;
   const downloadStateKey = `downloadState-${currentUrl}`;
+  const routes = {
+    list: "{{ url_for('api_list') }}",
+    search: "{{ url_for('api_search') }}",
+    preview: "{{ url_for('preview_file') }}",
+    image: "{{ url_for('preview_image') }}",
+    file: "{{ url_for('download_file') }}",
+    folder: "{{ url_for('download_folder') }}",
+  };
+  // The first page of the root folder is embedded; deeper levels are fetched on expand.
+  const initialPage = {{ (page if page is defined else None)|tojson }};
+
+  const folderIcons = '<svg class="icon icon-closed" xmlns="http://www.w3.org/2000/svg" viewBox="0 0 24 24" fill="currentColor"><path d="M20 6h-8l-2-2H4c-1.1 0-1.99.9-1.99 2L2 18c0 1.1.9 2 2 2h16c1.1 0 2-.9 2-2V8c0-1.1-.9-2-2-2zm0 12H4V8h16v10z"/></svg>'
+    + '<svg class="icon icon-open" xmlns="http://www.w3.org/2000/svg" viewBox="0 0 24 24" fill="currentColor"><path d="M20 6h-8l-2-2H4c-1.1 0-1.99.9-1.99 2L2 18c0 1.1.9 2 2 2h16c1.1 0 2-.9 2-2V8c0-1.1-.9-2-2-2zm-2.06 11L15 15.28 12.06 17l-1.06-1.06L14.44 12 11 8.56 12.06 7.5 15 10.44 17.94 7.5 19 8.56 15.56 12l3.44 3.44L17.94 17z"/></svg>';
+  const fileIcon = '<svg class="icon" xmlns="http://www.w3.org/2000/svg" viewBox="0 0 24 24" fill="currentColor"><path d="M14 2H6c-1.1 0-1.99.9-1.99 2L4 20c0 1.1.89 2 1.99 2H18c1.1 0 2-.9 2-2V8l-6-6zM6 20V4h7v5h5v11H6z"/></svg>';
 
   // --- Event Listeners ---
   document.addEventListener('DOMContentLoaded', () => {
-    // Restore folder state on page load
-    // Restore download state on page load
-    if (currentUrl && typeof storageKey !== 'undefined') {
-      try {
-        const state = JSON.parse(localStorage.getItem(storageKey) || '{}');
-        Object.keys(state).forEach(folderId => {
-          if (state[folderId]) {
-            const element = document.getElementById(folderId);
-            if (element) element.classList.add('expanded');
-          }
-        });
-      } catch (e) { console.error('Could not parse folder state:', e); }
-    }
-    if (currentUrl && typeof downloadStateKey !== 'undefined') {
-      try {
-        const downloadedFiles = JSON.parse(localStorage.getItem(downloadStateKey) || '[]');
-        downloadedFiles.forEach(filename => {
-          const btn = document.querySelector(`.download-btn[data-filename="${filename}"]`);
-          if (btn) updateDownloadButton(btn);
-        });
-      } catch (e) { console.error('Could not parse download state:', e); }
+    if (initialPage) {
+      appendEntries(document.getElementById('tree-root'), initialPage);
     }
 
-
     // Loading indicator for the "Open" button
     document.querySelector('form').addEventListener('submit', () => {
       document.getElementById('open-btn').setAttribute('aria-busy', 'true');
@@ -246,18 +258,6 @@ INDEX_HTML = """
       window.location.href = "{{ url_for('index') }}";
     });
 
-    // Add click listeners for all download buttons
-    document.querySelectorAll('.download-btn').forEach(btn => {
-      btn.addEventListener('click', () => {
-        const filename = btn.dataset.filename;
-        let downloadedFiles = JSON.parse(localStorage.getItem(downloadStateKey) || '[]');
-        if (!downloadedFiles.includes(filename)) {
-          downloadedFiles.push(filename);
-          localStorage.setItem(downloadStateKey, JSON.stringify(downloadedFiles));
-        }
-      });
-    });
-
     // Toggle auth fields visibility
     const authSwitch = document.getElementById('auth_switch');
     const authFields = document.getElementById('auth-fields');
@@ -273,47 +273,179 @@ INDEX_HTML = """
     }
   });
   
-  // Search functionality
+  // Search runs on the server; results replace the tree while a query is entered.
   const searchBox = document.getElementById('search-box');
   if (searchBox) {
+    let searchTimer = null;
+    let searchSeq = 0;
     searchBox.addEventListener('input', (e) => {
-        const searchTerm = e.target.value.toLowerCase();
-        const allItems = document.querySelectorAll('.tree li');
+        const searchTerm = e.target.value.trim();
+        const treeRoot = document.getElementById('tree-root');
+        const results = document.getElementById('search-results');
+        const status = document.getElementById('search-status');
+        clearTimeout(searchTimer);
+        const seq = ++searchSeq;
 
-        // If search is cleared, unhide everything and let localStorage state take over.
+        // If search is cleared, show the tree again with its saved state.
         if (!searchTerm) {
-            allItems.forEach(item => item.classList.remove('hidden'));
+            results.replaceChildren();
+            results.classList.add('hidden');
+            status.classList.add('hidden');
+            treeRoot.classList.remove('hidden');
             return;
         }
 
-        // First, hide all items.
-        allItems.forEach(item => item.classList.add('hidden'));
-
-        // Find matches and reveal them and their parents.
-        allItems.forEach(item => {
-            const label = item.querySelector('.tree-item-label');
-            if (label && label.textContent.toLowerCase().includes(searchTerm)) {
-                // Show the matched item itself.
-                item.classList.remove('hidden');
-                // Show and expand all of its parent folders.
-                let parent = item.parentElement.closest('li.folder');
-                while (parent) {
-                    parent.classList.remove('hidden');
-                    parent.classList.add('expanded');
-                    parent = parent.parentElement.closest('li.folder');
+        searchTimer = setTimeout(() => {
+            fetch(routeUrl(routes.search, {q: searchTerm}))
+              .then(response => response.json())
+              .then(page => {
+                if (seq !== searchSeq) return;
+                treeRoot.classList.add('hidden');
+                results.classList.remove('hidden');
+                status.classList.remove('hidden');
+                if (page.error) {
+                    results.replaceChildren();
+                    status.textContent = page.error;
+                    return;
                 }
-            }
-        });
+                results.replaceChildren(...page.entries.map(entry => renderEntry(entry, entry.path)));
+                status.textContent = page.entries.length
+                    ? `${page.entries.length}${page.truncated ? '+' : ''} matches`
+                    : 'No matches';
+              })
+              .catch(e => console.error('Search failed:', e));
+        }, 200);
     });
   }
 
   // --- Functions ---
+  function routeUrl(route, params) {
+    const query = new URLSearchParams(Object.assign({url: currentUrl}, params));
+    if (noVerify) query.set('no_verify', 'on');
+    return `${route}?${query}`;
+  }
+
+  function actionButton(label, href, extraClass) {
+    const a = document.createElement('a');
+    a.href = href;
+    a.setAttribute('role', 'button');
+    a.className = 'outline secondary btn-sm' + (extraClass ? ' ' + extraClass : '');
+    a.textContent = label;
+    return a;
+  }
+
+  function labelSpan(text) {
+    const span = document.createElement('span');
+    span.className = 'tree-item-label';
+    span.title = text;
+    span.textContent = text;
+    return span;
+  }
+
+  function renderEntry(entry, label) {
+    const li = document.createElement('li');
+    const item = document.createElement('div');
+    const actions = document.createElement('div');
+    item.className = 'tree-item';
+    actions.className = 'tree-item-actions';
+
+    if (entry.type === 'dir') {
+      li.className = 'folder';
+      li.id = `folder-${entry.path}`;
+      li.dataset.path = entry.path;
+      item.innerHTML = folderIcons;
+      const getFolder = actionButton('Get Folder', routeUrl(routes.folder, {name: entry.path}));
+      getFolder.addEventListener('click', (event) => event.stopPropagation());
+      actions.appendChild(getFolder);
+      item.append(labelSpan(label || entry.name), actions);
+      li.append(item, document.createElement('ul'));
+      li.addEventListener('click', (event) => toggle(event, li));
+      return li;
+    }
+
+    li.className = 'file';
+    item.innerHTML = fileIcon;
+    const size = document.createElement('span');
+    size.className = 'tree-item-size';
+    size.textContent = entry.size_label;
+    if (entry.is_text || entry.file_size < 102400) {
+      actions.appendChild(actionButton('Preview', routeUrl(routes.preview, {name: entry.path})));
+    }
+    if (entry.is_image) {
+      actions.appendChild(actionButton('Image', routeUrl(routes.image, {name: entry.path})));
+    }
+    const download = actionButton('Get File', routeUrl(routes.file, {name: entry.path}), 'download-btn');
+    download.dataset.filename = entry.path;
+    download.addEventListener('click', () => {
+      const downloadedFiles = JSON.parse(localStorage.getItem(downloadStateKey) || '[]');
+      if (!downloadedFiles.includes(entry.path)) {
+        downloadedFiles.push(entry.path);
+        localStorage.setItem(downloadStateKey, JSON.stringify(downloadedFiles));
+      }
+    });
+    actions.appendChild(download);
+    item.append(labelSpan(label || entry.name), size, actions);
+    li.appendChild(item);
+    return li;
+  }
+
+  function appendEntries(list, page) {
+    const folderState = JSON.parse(localStorage.getItem(folderStateKey) || '{}');
+    const downloadedFiles = JSON.parse(localStorage.getItem(downloadStateKey) || '[]');
+    const loadMore = list.querySelector(':scope > li.load-more');
+    if (loadMore) loadMore.remove();
+
+    page.entries.forEach(entry => {
+      const li = renderEntry(entry);
+      list.appendChild(li);
+      if (entry.type === 'dir' && folderState[entry.path]) {
+        li.classList.add('expanded');
+        loadFolder(li);
+      } else if (entry.type !== 'dir' && downloadedFiles.includes(entry.path)) {
+        updateDownloadButton(li.querySelector('.download-btn'));
+      }
+    });
+
+    if (page.next_cursor) {
+      const li = document.createElement('li');
+      li.className = 'load-more';
+      const button = actionButton('Load more...', '#');
+      button.addEventListener('click', (event) => {
+        event.preventDefault();
+        event.stopPropagation();
+        button.setAttribute('aria-busy', 'true');
+        fetchPage(list, page.path, page.next_cursor);
+      });
+      li.appendChild(button);
+      list.appendChild(li);
+    }
+  }
+
+  function fetchPage(list, path, cursor) {
+    const params = {path: path};
+    if (cursor) params.cursor = cursor;
+    return fetch(routeUrl(routes.list, params))
+      .then(response => response.json())
+      .then(page => {
+        if (page.error) throw new Error(page.error);
+        appendEntries(list, page);
+      })
+      .catch(e => console.error('Could not load folder:', e));
+  }
+
+  function loadFolder(element) {
+    if (element.dataset.loaded) return;
+    element.dataset.loaded = 'true';
+    fetchPage(element.querySelector(':scope > ul'), element.dataset.path, null);
+  }
+
   function toggle(event, element) {
     event.stopPropagation();
     element.classList.toggle('expanded');
+    if (element.classList.contains('expanded')) loadFolder(element);
     // Save folder state to localStorage
     const state = JSON.parse(localStorage.getItem(folderStateKey) || '{}');
-    state[element.id] = element.classList.contains('expanded');
+    state[element.dataset.path] = element.classList.contains('expanded');
     localStorage.setItem(folderStateKey, JSON.stringify(state));
   }
 
@@ -337,7 +469,6 @@ INDEX_HTML = """
 TEXT_EXTS = (".txt",".md",".py",".csv",".log",".json",".xml",".html",".htm",".cfg",".ini",".plist",".yaml",".yml")
 IMAGE_EXTS = (".png",".jpg",".jpeg",".gif",".webp")
 
-@app.template_filter('format_bytes')
 def format_bytes(size):
     """Formats a file size in bytes into a human-readable string."""
     if size is None:
@@ -352,385 +483,4234 @@ def format_bytes(size):
         return f"{int(size)} {power_labels[n]}"
     return f"{size:.2f} {power_labels[n]}"
 
-# Cache for storing the directory structure of remote ZIP files.
-# It holds up to 100 different URLs and each entry expires after 300 seconds (5 minutes).
-file_list_cache = TTLCache(maxsize=100, ttl=30000)
-
 def is_local_path(path):
     """Checks if a given path is a local file."""
     # This is a simple but effective check. If the path points to an existing
     # file on the disk, we'll treat it as a local path.
     return Path(path).is_file()
 
-def _get_session_kwargs(insecure=False, auth=None):
+def _get_session_kwargs(insecure=False, auth=None, session=None):
     """Returns the kwargs for the RemoteZip session."""
     kwargs = {'verify': not insecure}
     if auth:
         kwargs['auth'] = auth
+    if session is not None:
+        kwargs['session'] = session
     return kwargs
 
-def get_zip_context(url, insecure=False, auth=None, is_retry=False):
+# --- Metrics ---
+# Upstream requests, bytes and latency and cache lookups are counted per archive and per
+# route, and each request's time is split into phases (central directory, range fetches,
+# inflating, rendering). /metrics exposes everything in the Prometheus text format and
+# every response carries a Server-Timing header with its own phase times.
+METRICS_MAX_ARCHIVES = 100   # Archives with their own series; later ones are counted as "other"
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)  # Histogram bounds in seconds
+METRICS_TIMER_KEY = 'remote_zip.request_timer'   # WSGI environ key holding the request's RequestTimer
+METRICS_HELP = {
+    "remote_zip_requests_total": ("counter", "Requests served, by route and status."),
+    "remote_zip_request_seconds": ("histogram", "Time to serve a request, including its streamed body."),
+    "remote_zip_phase_seconds": ("histogram", "Time a request spent in each phase, excluding nested phases."),
+    "remote_zip_upstream_requests_total": ("counter", "Requests sent to archive servers."),
+    "remote_zip_upstream_bytes_total": ("counter", "Response body bytes announced by archive servers."),
+    "remote_zip_upstream_seconds": ("histogram", "Time until an archive server's response headers arrived."),
+    "remote_zip_cache_requests_total": ("counter", "Cache lookups, by cache and result."),
+    "remote_zip_cache_bytes": ("gauge", "Bytes held by each cache."),
+    "remote_zip_cache_entries": ("gauge", "Entries held by each cache."),
+}
+
+def _format_metric_value(value):
+    if value == float('inf'):
+        return "+Inf"
+    return str(value) if isinstance(value, int) else repr(float(value))
+
+def _format_metric_labels(labels):
+    if not labels:
+        return ""
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in labels) + "}"
+
+class Metrics:
+    """Thread-safe labelled counters and histograms, rendered in the Prometheus text format."""
+
+    def __init__(self, buckets=METRICS_BUCKETS, max_archives=METRICS_MAX_ARCHIVES):
+        self.buckets = tuple(buckets)
+        self.max_archives = max_archives
+        self._counters = {}
+        self._histograms = {}   # key -> one count per bucket and +Inf, then the sum
+        self._archives = set()
+        self._lock = threading.Lock()
+
+    def archive(self, url):
+        """
+        The archive label of a url: scheme, host and path only, so credentials and signed
+        query strings never end up in a label; "other" once max_archives are tracked.
+        """
+        if not url:
+            return "none"
+        from urllib.parse import urlsplit
+        parts = urlsplit(url)
+        if parts.scheme in ('http', 'https'):
+            url = f"{parts.scheme}://{parts.netloc.rpartition('@')[2]}{parts.path}"
+        with self._lock:
+            if url not in self._archives:
+                if len(self._archives) >= self.max_archives:
+                    return "other"
+                self._archives.add(url)
+        return url
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            histogram[bisect_left(self.buckets, value)] += 1
+            histogram[-1] += value
+
+    def value(self, name, **labels):
+        """Returns a counter's value, or the number of observations of a histogram."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if key in self._histograms:
+                return sum(self._histograms[key][:-1])
+            return self._counters.get(key, 0)
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self._archives.clear()
+
+    def render(self, gauges=()):
+        """Returns every series in the Prometheus text format. gauges are extra (name, labels, value) samples."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, list(values)) for key, values in self._histograms.items())
+        samples = {}
+        for (name, labels), value in counters:
+            samples.setdefault(name, []).append((name, labels, value))
+        for name, labels, value in gauges:
+            samples.setdefault(name, []).append((name, tuple(sorted(labels.items())), value))
+        for (name, labels), values in histograms:
+            lines = samples.setdefault(name, [])
+            total = 0
+            for bound, count in zip(self.buckets + (float('inf'),), values):
+                total += count
+                lines.append((f"{name}_bucket", labels + (("le", _format_metric_value(bound)),), total))
+            lines.append((f"{name}_sum", labels, values[-1]))
+            lines.append((f"{name}_count", labels, total))
+        out = []
+        for name in sorted(samples):
+            kind, text = METRICS_HELP.get(name, ("untyped", ""))
+            out.append(f"# HELP {name} {text}")
+            out.append(f"# TYPE {name} {kind}")
+            out.extend(f"{sample}{_format_metric_labels(labels)} {_format_metric_value(value)}"
+                       for sample, labels, value in samples[name])
+        return "\n".join(out) + "\n"
+
+metrics = Metrics()
+
+class RequestTimer:
     """
-    Returns a context manager for a local or remote zip file.
-    Automatically retries with SSL verification disabled on SSLCertVerificationError.
+    The time one request spends in each phase. A nested phase's time only counts for the
+    inner phase, except inside an absorbing phase (the central directory load), which
+    keeps the fetches it makes.
     """
-    from requests.exceptions import SSLError
 
-    if is_local_path(url):
-        return zipfile.ZipFile(url, 'r')
+    def __init__(self, route):
+        self.route = route
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.absorbing = 0
+        self._stack = []   # [phase, started, time spent in nested phases, absorbs]
 
-    kwargs = _get_session_kwargs(insecure, auth)
-    try:
-        app.logger.info(f"Attempting to connect to {url} with verify={kwargs.get('verify')}")
-        return RemoteZip(url, **kwargs)
-    except SSLError as e:
-        # If it's a cert verification error and we haven't already retried, try again with verification off.
-        if not insecure and not is_retry and 'CERTIFICATE_VERIFY_FAILED' in str(e):
-            app.logger.warning("SSL certificate verification failed. Retrying automatically with verification disabled.")
-            return get_zip_context(url, insecure=True, auth=auth, is_retry=True)
-        raise  # Re-raise the exception if it's not the one we're handling or if we've already retried.
+    def enter(self, phase, absorb=False):
+        self._stack.append([phase, time.perf_counter(), 0.0, absorb])
+        self.absorbing += absorb
 
-@cached(file_list_cache)
-def list_entries(url, insecure=False, auth=None):
-    """Parses a remote or local ZIP file and returns its directory structure as a nested dict."""
-    tree = {}
-    app.logger.info(f"Cache miss for {url}. Fetching and processing directory.")
-    with get_zip_context(url, insecure, auth) as zf:
-        for info in zf.infolist():
-            # Skip directory entries, we build the structure from file paths
-            if info.is_dir():
-                continue
+    def exit(self):
+        phase, started, nested, absorb = self._stack.pop()
+        elapsed = time.perf_counter() - started
+        self.phases[phase] = self.phases.get(phase, 0.0) + elapsed - nested
+        self.absorbing -= absorb
+        if self._stack:
+            self._stack[-1][2] += elapsed
 
-            parts = info.filename.split('/')
-            current_level = tree
-            for part in parts[:-1]:
-                if part not in current_level:
-                    current_level[part] = {"type": "dir", "children": {}}
-                current_level = current_level[part]["children"]
-            
-            filename = parts[-1]
-            if filename:
-                current_level[filename] = {
-                    "type": "file",
-                    "info": {
-                        "filename": info.filename,
-                        "file_size": info.file_size,
-                        "compress_size": info.compress_size,
-                        "is_text": info.filename.lower().endswith(TEXT_EXTS),
-                        "is_image": info.filename.lower().endswith(IMAGE_EXTS),
-                    }
-                }
-    return tree
+    def server_timing(self):
+        """The Server-Timing header value for the phases so far, in milliseconds."""
+        parts = [f"{phase};dur={seconds * 1000:.1f}" for phase, seconds in self.phases.items()]
+        parts.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(parts)
 
-@app.route("/")
-def index():
-    return render_template_string(INDEX_HTML)
+    def finish(self, status):
+        """Records the request once its body has been sent."""
+        metrics.inc("remote_zip_requests_total", route=self.route, status=str(status))
+        metrics.observe("remote_zip_request_seconds", time.perf_counter() - self.started, route=self.route)
+        for phase, seconds in self.phases.items():
+            metrics.observe("remote_zip_phase_seconds", seconds, route=self.route, phase=phase)
 
-@app.route("/view")
-def view():
-    url = request.args.get("url")
-    insecure = request.args.get("no_verify") == "on"
-    user = request.args.get("user")
-    password = request.args.get("password")
-    zip_password = request.args.get("zip_password")
-    
-    # Clear previous session data
-    session.clear()
-    if not url:
-        return redirect(url_for("index"))
-    
-    auth = None
-    if user:
-        auth = (user, password or '')
-        session['http_user'] = user
-        session['http_password'] = password or ''
-    if zip_password:
-        session['zip_password'] = zip_password
+_request_timer = contextvars.ContextVar('remote_zip_request_timer', default=None)
 
+def _metrics_route():
+    timer = _request_timer.get()
+    return timer.route if timer is not None else "none"
+
+@contextmanager
+def timed(phase, absorb=False):
+    """Counts the time spent in the block towards a phase of the current request, if any."""
+    timer = _request_timer.get()
+    if timer is None or timer.absorbing:
+        yield
+        return
+    timer.enter(phase, absorb)
     try:
-        tree = list_entries(url, insecure=insecure, auth=auth)
-        return render_template_string(INDEX_HTML, tree=tree, url=url, no_verify=insecure, user=user, password=password, zip_password=zip_password)
-    except Exception as e:
-        return render_template_string(INDEX_HTML, error=str(e), url=url, no_verify=insecure, user=user, password=password, zip_password=zip_password)
+        yield
+    finally:
+        timer.exit()
 
-@app.route("/browse")
-def browse_local_file():
-    """Opens a native file dialog and redirects to the view page for the selected file."""
-    import tkinter as tk
-    from tkinter import filedialog
+def record_upstream(url, method, status, nbytes, seconds):
+    """Counts one request to an archive server."""
+    route = _metrics_route()
+    archive = metrics.archive(url)
+    metrics.inc("remote_zip_upstream_requests_total", archive=archive, route=route, method=method, status=str(status))
+    if nbytes:
+        metrics.inc("remote_zip_upstream_bytes_total", nbytes, archive=archive, route=route)
+    metrics.observe("remote_zip_upstream_seconds", seconds, route=route, method=method)
 
-    root = tk.Tk()
-    root.withdraw()  # Hide the main tkinter window
-    file_path = filedialog.askopenfilename(
-        title="Select a ZIP file",
-        filetypes=[("ZIP Archives", "*.zip")]
-    )
-    if file_path:
-        return redirect(url_for('view', url=file_path))
-    return "<script>window.close();</script>" # Close the tab if no file is selected
+def record_cache(cache, result, url=None):
+    """Counts one cache lookup; result is "hit", "miss" or a cache-specific outcome such as "stale"."""
+    metrics.inc("remote_zip_cache_requests_total", cache=cache, result=result,
+                archive=metrics.archive(url), route=_metrics_route())
 
-def with_remote_zip(f):
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        url = request.args.get("url")
-        name = request.args.get("name")
-        insecure = request.args.get("no_verify") == "on"
-        # Retrieve credentials from session instead of URL
-        user = session.get('http_user')
-        password = session.get('http_password')
-        zip_password = session.get('zip_password')
+def _record_response(response, *args, **kwargs):
+    """A requests response hook that counts every upstream request made through a session."""
+    method = response.request.method
+    length = response.headers.get('Content-Length', '')
+    nbytes = int(length) if method != 'HEAD' and length.isdigit() else 0
+    record_upstream(response.request.url, method, response.status_code, nbytes, response.elapsed.total_seconds())
 
-        if not url or not name:
-            abort(400, "Missing 'url' or 'name' parameter.")
-        
-        auth = None
-        if user:
-            auth = (user, password)
+def _make_http_session(pool_size):
+    """Returns a requests session whose keep-alive pool can serve pool_size concurrent streams."""
+    from requests.adapters import HTTPAdapter
+    http_session = requests.Session()
+    http_session.hooks['response'].append(_record_response)
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+    http_session.mount('http://', adapter)
+    http_session.mount('https://', adapter)
+    return http_session
 
-        # Pass the parsed arguments to the decorated function
-        return f(url, name, insecure, auth, zip_password, *args, **kwargs)
-    return decorated_function
+# --- HTTP session pool ---
+# Every archive handle on the same origin shares one requests session, and with it the
+# session's keep-alive connections, so previews and downloads skip the TCP and TLS
+# handshakes. Sessions are keyed by verify setting and credentials as well, so cookies
+# and connections are never shared between different logins.
+HTTP_POOL_SIZE = 16         # Keep-alive connections kept per session
+HTTP_MAX_SESSIONS = 64      # Sessions kept; the least recently used is closed beyond this
+HTTP_IDLE_TIMEOUT = 300     # Seconds an unused session is kept
+
+class SessionPool:
+    """A thread-safe LRU pool of requests sessions, one per origin, verify setting and login."""
+
+    def __init__(self, pool_size=HTTP_POOL_SIZE, max_sessions=HTTP_MAX_SESSIONS, idle_timeout=HTTP_IDLE_TIMEOUT):
+        self.pool_size = pool_size
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(url, insecure, auth):
+        from urllib.parse import urlsplit
+        parts = urlsplit(url)
+        return (parts.scheme.lower(), parts.netloc.lower(), bool(insecure), _credential_fingerprint(auth))
+
+    def get(self, url, insecure=False, auth=None):
+        """Returns the shared session for the url's origin, creating it if needed."""
+        key = self._key(url, insecure, auth)
+        now = time.monotonic()
+        closed = []
+        with self._lock:
+            for other, (session, last_used) in list(self._sessions.items()):
+                if now - last_used > self.idle_timeout:
+                    closed.append(session)
+                    del self._sessions[other]
+            entry = self._sessions.get(key)
+            session = entry[0] if entry else _make_http_session(self.pool_size)
+            self._sessions[key] = (session, now)
+            self._sessions.move_to_end(key)
+            while len(self._sessions) > self.max_sessions:
+                closed.append(self._sessions.popitem(last=False)[1][0])
+        # Closing only drops idle connections; handles still using a session keep working.
+        for old in closed:
+            old.close()
+        return session
 
-def _stream_zip_file(url, name, insecure, auth=None, zip_password=None):
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+    def clear(self):
+        with self._lock:
+            sessions = [session for session, _ in self._sessions.values()]
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
+
+session_pool = SessionPool()
+
+# --- Single-flight ---
+# When many requests miss the same cache entry at once, only the first one fetches it;
+# the others wait for its result instead of repeating the download.
+SINGLE_FLIGHT_TIMEOUT = 120   # Seconds a caller waits for another caller's fetch of the same key
+
+class _Flight:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
     """
-    A generator that creates a RemoteZip instance and streams a file from it.
-    This ensures the RemoteZip object remains open during the entire stream.
+    Collapses concurrent calls that share a key into one. The lock only guards the
+    table of in-flight calls, so calls with different keys never wait on each other.
     """
-    pwd_bytes = None
-    if zip_password:
-        pwd_bytes = zip_password.encode('utf-8')
-
-    try:
-        with get_zip_context(url, insecure, auth) as zf:
-            with zf.open(name, pwd=pwd_bytes) as f:
-                while True:
-                    chunk = f.read(64 * 1024)
-                    if not chunk:
-                        break
-                    yield chunk
-    except FileNotFoundError:
-        # This error won't be caught by Flask's regular error handlers
-        # because it happens inside a generator. We can't easily abort(404).
-        # The stream will just be empty, resulting in a 0-byte response.
-        app.logger.error(f"File '{name}' not found in zip at url {url}")
-    except RuntimeError as e:
-        if "password required" in str(e):
-            app.logger.error(f"Password required or incorrect for file '{name}' in zip at url {url}")
-        else:
-            app.logger.error(f"Error streaming zip file from url {url}: {e}")
-    except Exception as e:
-        app.logger.error(f"Error streaming zip file from url {url}: {e}")
 
-@app.route("/preview")
-@with_remote_zip
-def preview_file(url, name, insecure, auth, zip_password):
-    try:
-        pwd_bytes = zip_password.encode('utf-8') if zip_password else None
-        with get_zip_context(url, insecure, auth) as zf:
-            with zf.open(name, pwd=pwd_bytes) as f:
-                data = f.read(100*1024)  # limit preview size
-                try:
-                    text = data.decode("utf-8")
-                except UnicodeDecodeError:
-                    text = data.decode("latin-1", errors="replace")
-        return f"<h3>Preview of {name}</h3><pre>{text}</pre>"
-    except RuntimeError as e:
-        if "password required" in str(e):
-            return "<strong>Error:</strong> This file is encrypted. Please provide a password in the main form and try again.", 401
-        raise e
+    def __init__(self, timeout=SINGLE_FLIGHT_TIMEOUT):
+        self.timeout = timeout
+        self._flights = {}
+        self._lock = threading.Lock()
 
-@app.route("/image")
-@with_remote_zip
-def preview_image(url, name, insecure, auth, zip_password):
-    mime, _ = mimetypes.guess_type(name)
-    return Response(_stream_zip_file(url, name, insecure, auth, zip_password), mimetype=mime or "application/octet-stream")
+    def do(self, key, fn, *args, **kwargs):
+        """
+        Calls fn(*args, **kwargs) unless a call with the same key is already running, in
+        which case that call's result is returned (or its exception raised) instead.
+        Raises TimeoutError if the running call takes longer than the timeout.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            if not flight.done.wait(self.timeout):
+                raise TimeoutError(f"Timed out after {self.timeout}s waiting for a concurrent fetch")
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = fn(*args, **kwargs)
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
 
-@app.route("/file")
-@with_remote_zip
-def download_file(url, name, insecure, auth, zip_password):
-    # We peek at the first chunk to see if a password error occurs before sending headers
-    stream_generator = _stream_zip_file(url, name, insecure, auth, zip_password)
-    try:
-        first_chunk = next(stream_generator)
-    except StopIteration: # Handles empty files
-        first_chunk = b''
-    except RuntimeError as e:
-        if "password required" in str(e):
-            return "<strong>Error:</strong> This file is encrypted. Please provide a password in the main form and try again.", 401
-        raise e
+single_flight = SingleFlight()
 
-    def combined_stream():
-        yield first_chunk
-        yield from stream_generator
+# --- Archive handle pool ---
+# Opening a RemoteZip downloads the end-of-central-directory record and the whole
+# central directory before a single member byte can be served. The pool keeps the
+# parsed directory of recently used archives so repeat requests go straight to the
+# member's local header.
+ARCHIVE_POOL_SIZE = 32          # Maximum number of archives kept open
+ARCHIVE_IDLE_TIMEOUT = 600      # Seconds an unused archive is kept in the pool
+ARCHIVE_REVALIDATE_AFTER = 30   # Seconds before the archive's ETag/Last-Modified is checked again
 
-    headers = {"Content-Disposition": f'attachment; filename="{Path(name).name}"'}
-    return Response(combined_stream(), headers=headers, mimetype="application/octet-stream")
+def archive_key(url, insecure=False, auth=None):
+    """The key of an archive in the in-memory caches; credentials are only kept as a hash."""
+    return (url, insecure, _credential_fingerprint(auth))
 
-def _cli_download(file_in_zip, url, output_path, insecure, auth, create_dirs):
-    """Handles the command-line download operation with progress display."""
-    import time
-    
-    if is_local_path:
-        print(f"Getting content of local file stored at {url}")
-    else:
-        print(f"Connecting to {url}...")
-    output = Path(output_path)
+def _parse_validators(headers):
+    """Extracts the ETag, Last-Modified and total size of a remote file from response headers."""
+    size = None
+    content_range = headers.get('Content-Range')
+    if content_range and '/' in content_range:
+        total = content_range.rsplit('/', 1)[1]
+        if total.isdigit():
+            size = int(total)
+    elif headers.get('Content-Length', '').isdigit():
+        size = int(headers['Content-Length'])
+    return {
+        'etag': headers.get('ETag'),
+        'last_modified': headers.get('Last-Modified'),
+        'size': size,
+    }
 
-    if output.is_dir():
-        output = output / Path(file_in_zip).name
+def _is_versioned(validators):
+    """Checks whether validators can tell versions apart; a bare size survives in-place rewrites."""
+    return bool(validators and (validators.get('etag') or validators.get('last_modified')))
 
-    # If create_dirs is specified, create the full path
-    if create_dirs:
-        output = Path(output_path) / file_in_zip
+def _validators_match(old, new):
+    """
+    Checks whether two sets of validators describe the same version of a remote file.
+    Without a shared ETag or Last-Modified the versions can't be compared and never match.
+    """
+    if old.get('etag') and new.get('etag'):
+        return old['etag'] == new['etag']
+    if old.get('last_modified') and new.get('last_modified'):
+        return old['last_modified'] == new['last_modified'] and old.get('size') == new.get('size')
+    return False
 
-    output.parent.mkdir(parents=True, exist_ok=True)
+# --- Byte-range block cache ---
+# Remote bytes are cached in fixed-size blocks shared by every handle and thread, so
+# previewing and then downloading a member (or two users fetching it) only hits the
+# server once. Ranges larger than BLOCK_CACHE_STREAM_LIMIT bypass the cache so a
+# single big download can't evict everything else.
+BLOCK_CACHE_SIZE = 64 * 1024 * 1024          # Total bytes held by the block cache
+BLOCK_SIZE = 256 * 1024                      # Alignment and size of a cached block
+BLOCK_CACHE_MAX_RUN = 16                     # Most blocks fetched by one range request
+BLOCK_CACHE_STREAM_LIMIT = 32 * 1024 * 1024  # Larger ranges are streamed uncached
 
-    try:
-        with get_zip_context(url, insecure, auth) as zf:
-            try:
-                print(f"Searching for '{file_in_zip}' in archive...")
-                info = zf.getinfo(file_in_zip)
-                total_size = info.file_size
-            except KeyError:
-                print(f"Error: File '{file_in_zip}' not found in the remote archive.")
-                return
+class BlockCache:
+    """A thread-safe LRU cache of remote byte blocks, bounded by total size."""
 
-            print(f"Downloading '{file_in_zip}' ({total_size} bytes) to '{output}'...")
+    def __init__(self, max_bytes=BLOCK_CACHE_SIZE, block_size=BLOCK_SIZE):
+        self.max_bytes = max_bytes
+        self.block_size = block_size
+        self.nbytes = 0
+        self._blocks = OrderedDict()
+        self._lock = threading.Lock()
 
-            downloaded_bytes = 0
-            start_time = time.time()
+    def get(self, key):
+        with self._lock:
+            data = self._blocks.get(key)
+            if data is not None:
+                self._blocks.move_to_end(key)
+            return data
 
-            with zf.open(file_in_zip) as source, open(output, "wb") as target:
-                while True:
-                    chunk = source.read(8192)
-                    if not chunk:
-                        break
-                    target.write(chunk)
-                    downloaded_bytes += len(chunk)
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._blocks
 
-                    elapsed_time = time.time() - start_time
-                    speed = downloaded_bytes / elapsed_time if elapsed_time > 0 else 0
-                    speed_mbps = (speed * 8) / (1024 * 1024)
-                    
-                    percent = (downloaded_bytes / total_size) * 100 if total_size > 0 else 100
-                    
-                    progress_bar = f"[{'=' * int(percent / 2):<50}]"
-                    
-                    # Use \r to return to the beginning of the line
-                    print(f"\r{progress_bar} {percent:.1f}% - {downloaded_bytes/1024/1024:.2f}MB - {speed_mbps:.2f} Mbps", end="")
+    def put(self, key, data):
+        with self._lock:
+            old = self._blocks.pop(key, None)
+            if old is not None:
+                self.nbytes -= len(old)
+            self._blocks[key] = data
+            self.nbytes += len(data)
+            while self.nbytes > self.max_bytes and self._blocks:
+                _, evicted = self._blocks.popitem(last=False)
+                self.nbytes -= len(evicted)
 
-            # Print a newline at the end
-            print("\nDownload complete.")
+    def clear(self):
+        with self._lock:
+            self._blocks.clear()
+            self.nbytes = 0
 
-    except Exception as e:
-        print(f"An error occurred: {e}")
+block_cache = BlockCache()
 
-def _cli_download_folder(folder_path, url, output_path, insecure, auth):
-    """Handles downloading all files within a specified folder in the ZIP."""
-    import time
+class CachedRangeReader:
+    """
+    A file-like view of the remote range [start, end] that is served block by block
+    from the BlockCache. Missing neighbouring blocks are fetched with one range request,
+    and the run length doubles on consecutive misses like a read-ahead window.
+    """
 
-    print(f"Connecting to {url} to download folder '{folder_path}'...")
-    output_base = Path(output_path)
+    def __init__(self, cache, identity, fetch_raw, start, end):
+        self._cache = cache
+        self._identity = identity
+        self._fetch_raw = fetch_raw
+        self._start = start
+        self._end = end
+        self._position = start
+        self._run = 1
+        self.closed = False
 
-    # Ensure the base output path exists
-    output_base.mkdir(parents=True, exist_ok=True)
+    def _block(self, index):
+        key = (self._identity, index)
+        data = self._cache.get(key)
+        record_cache("block", "miss" if data is None else "hit", self._identity[0])
+        if data is not None:
+            return data
+        # Readers missing the same block share one request.
+        return single_flight.do(('block',) + key, self._fetch_run, index)
 
-    try:
-        with get_zip_context(url, insecure, auth) as zf:
-            # Normalize folder path to end with a slash
-            if not folder_path.endswith('/'):
-                folder_path += '/'
+    def _fetch_run(self, index):
+        """Fetches the missing block at index, plus the following missing blocks of the run."""
+        data = self._cache.get((self._identity, index))
+        if data is not None:
+            return data
+        bs = self._cache.block_size
+        last_needed = self._end // bs
+        count = 1
+        while (count < self._run and index + count <= last_needed
+               and (self._identity, index + count) not in self._cache):
+            count += 1
+        raw = self._fetch_raw(index * bs, (index + count) * bs - 1)
+        self._run = min(self._run * 2, BLOCK_CACHE_MAX_RUN)
+        for i in range(0, len(raw), bs):
+            self._cache.put((self._identity, index + i // bs), raw[i:i + bs])
+        return raw[:bs]
 
-            # Find all files that are inside the specified folder_path
-            files_to_download = [
-                info for info in zf.infolist()
-                if info.filename.startswith(folder_path) and not info.is_dir()
-            ]
+    def read(self, size=-1):
+        remaining = self._end + 1 - self._position
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+        bs = self._cache.block_size
+        parts = []
+        while size > 0:
+            block = self._block(self._position // bs)
+            offset = self._position % bs
+            chunk = block[offset:offset + size]
+            if not chunk:
+                break  # The remote file ended early
+            parts.append(chunk)
+            self._position += len(chunk)
+            size -= len(chunk)
+        return b"".join(parts)
 
-            if not files_to_download:
-                print(f"Error: No files found in folder '{folder_path}' or folder does not exist.")
-                return
+    def tell(self):
+        return self._position - self._start
 
-            print(f"Found {len(files_to_download)} file(s) to download.")
+    def close(self):
+        self.closed = True
 
-            for i, info in enumerate(files_to_download):
-                # Determine the output path for the file
-                # This preserves the subdirectory structure relative to the output path
-                relative_path = info.filename
-                file_output_path = output_base / relative_path
+class RangeFetcher(RemoteFetcher):
+    """
+    A RemoteFetcher that remembers the validators of the archive it reads from and
+    serves range requests through the shared block cache.
+    """
 
-                # Create parent directories for the file
-                file_output_path.parent.mkdir(parents=True, exist_ok=True)
+    def __init__(self, url, session=None, cache=None, **kwargs):
+        super().__init__(url, session, **kwargs)
+        self.validators = None
+        self.recording = None
+        self._cache = cache
+        self._cache_owner = (url, _credential_fingerprint(kwargs.get('auth')))
 
-                print(f"\n[{i+1}/{len(files_to_download)}] Downloading '{info.filename}' to '{file_output_path}'...")
+    def _cache_identity(self):
+        """
+        Identifies this version of the remote file, or None if it can't be told apart from
+        other versions. A bare Content-Length doesn't change when a file is rewritten in place,
+        so blocks are only cached when the server sends an ETag or Last-Modified.
+        """
+        if not _is_versioned(self.validators):
+            return None
+        token = self.validators.get('etag') or self.validators.get('last_modified')
+        return self._cache_owner + (token, self.validators.get('size'))
 
-                with zf.open(info.filename) as source, open(file_output_path, "wb") as target:
-                    while True:
-                        chunk = source.read(8192)
-                        if not chunk:
-                            break
-                        target.write(chunk)
-            print("\nFolder download complete.")
+    def fetch_raw(self, start, end):
+        """Fetches the bytes of the remote range [start, end] without caching."""
+        with timed('fetch'):
+            buffer = super().fetch((start, end), stream=False)
+            try:
+                return buffer.read()
+            finally:
+                buffer.close()
 
-    except Exception as e:
-        print(f"An error occurred: {e}")
+    def _populate(self, buffer):
+        """Stores the whole blocks of an already fetched, in-memory PartialBuffer."""
+        identity = self._cache_identity()
+        if identity is None:
+            return
+        bs = self._cache.block_size
+        offset = buffer.tell()
+        data = buffer.buffer.getvalue()
+        at_eof = offset + len(data) == self.validators.get('size')
+        index = -(-offset // bs)
+        while True:
+            start = index * bs - offset
+            block = data[start:start + bs]
+            if not block or (len(block) < bs and not at_eof):
+                break
+            self._cache.put((identity, index), block)
+            index += 1
 
-def _cli_stream_to_console(file_in_zip, url, insecure, auth):
-    """Handles streaming a file's content directly to standard output."""
-    import sys
-    try:
-        # Write directly to the stdout buffer to handle binary data
-        for chunk in _stream_zip_file(url, file_in_zip, insecure, auth):
-            sys.stdout.buffer.write(chunk)
-    except Exception as e:
-        print(f"An error occurred: {e}", file=sys.stderr)
+    def fetch(self, data_range, stream=False):
+        with timed('fetch'):
+            buffer = self._fetch(data_range, stream)
+        if self.recording is not None and not stream:
+            self.recording.append((buffer.tell(), buffer.buffer.getvalue()))
+        return buffer
 
-def _cli_list_files(url, list_path, no_subdirs, insecure, auth):
-    """Lists files and directories from the remote ZIP."""
-    from fnmatch import fnmatch
+    def _fetch(self, data_range, stream):
+        start, end = data_range
+        if self._cache is not None and start < 0 and not stream:
+            # The tail of the archive (central directory) is kept for later handles.
+            buffer = super().fetch(data_range, stream=False)
+            self._populate(buffer)
+            return buffer
+        identity = self._cache_identity()
+        if (self._cache is None or identity is None or start < 0 or end is None
+                or end - start + 1 > BLOCK_CACHE_STREAM_LIMIT):
+            return super().fetch(data_range, stream=stream)
+        reader = CachedRangeReader(self._cache, identity, self.fetch_raw, start, end)
+        return PartialBuffer(reader, start, end - start + 1, stream)
 
-    print(f"Fetching file list from {url}...")
-    try:
-        with get_zip_context(url, insecure, auth) as zf:
-            all_files = [info.filename for info in zf.infolist() if not info.is_dir()]
+    def _request(self, kwargs):
+        if self._session:
+            res = self._session.get(self._url, stream=True, **kwargs)
+        else:
+            res = requests.get(self._url, stream=True, **kwargs)
+        res.raise_for_status()
+        if 'Content-Range' not in res.headers:
+            res.close()
+            raise RangeNotSupported("The server doesn't support range requests")
+        if self.validators is None:
+            self.validators = _parse_validators(res.headers)
+        return res.raw, res.headers['Content-Range']
 
-        if list_path:
-            # Normalize list_path to ensure it's treated as a directory
-            if not list_path.endswith('/'):
-                list_path += '/'
-            
-            # Filter files that are directly within the list_path
-            if no_subdirs:
-                # Show only files directly in list_path, no deeper
-                files_to_show = [f for f in all_files if f.startswith(list_path) and '/' not in f[len(list_path):]]
-            else:
-                # Show all files and subdirs under list_path
-                files_to_show = [f for f in all_files if f.startswith(list_path)]
+    def head_validators(self):
+        """Fetches the current validators of the remote file without downloading it."""
+        kwargs = self.prepare_request()
+        if self._session:
+            res = self._session.head(self._url, allow_redirects=True, **kwargs)
         else:
-            # Listing from the root
-            if no_subdirs:
-                # Show only files in the root
-                files_to_show = [f for f in all_files if '/' not in f]
-            else:
-                # Show all files
-                files_to_show = all_files
+            res = requests.head(self._url, allow_redirects=True, **kwargs)
+        if res.ok:
+            return _parse_validators(res.headers)
+        # Some servers refuse HEAD; a one byte range request carries the same headers.
+        kwargs = self.prepare_request((0, 0))
+        if self._session:
+            res = self._session.get(self._url, stream=True, **kwargs)
+        else:
+            res = requests.get(self._url, stream=True, **kwargs)
+        res.close()
+        res.raise_for_status()
+        return _parse_validators(res.headers)
 
-        print("\nContents:")
-        for filename in sorted(files_to_show):
+class ArchiveDirectory:
+    """The parsed central directory of a remote archive, shared by all pooled handles."""
+
+    def __init__(self, zf, size, validators, position_to_size=None):
+        self.filelist = zf.filelist
+        self.name_to_info = zf.NameToInfo
+        self.start_dir = zf.start_dir
+        self.comment = zf.comment
+        self.size = size
+        if position_to_size is None:
+            position_to_size = RemoteZip._get_position_to_size(zf)
+        self.position_to_size = position_to_size
+        self.validators = validators or {}
+        self.validated_at = time.monotonic()
+        self.last_used = self.validated_at
+
+class PooledRemoteZip(RemoteZip):
+    """
+    A RemoteZip that can be built from an already parsed ArchiveDirectory.
+    Each instance has its own file position, so handles can be used from different
+    threads while sharing one directory.
+    """
+
+    def __init__(self, url, directory=None, **kwargs):
+        self._directory = directory
+        self.fetcher = None
+
+        def make_fetcher(*args, **fetcher_kwargs):
+            self.fetcher = RangeFetcher(*args, cache=block_cache, **fetcher_kwargs)
+            if directory is None:
+                self.fetcher.recording = []
+            return self.fetcher
+
+        super().__init__(url, fetcher=make_fetcher, **kwargs)
+        # Everything fetched while parsing; used to snapshot the directory for the disk index.
+        self._directory_segments = self.fetcher.recording or []
+        self.fetcher.recording = None
+        if directory is not None and self.fetcher.validators is None:
+            self.fetcher.validators = directory.validators
+
+    def directory_snapshot(self):
+        """
+        Returns (offset, data) holding every byte from the central directory to the end
+        of the archive, which is all zipfile needs to parse its contents again.
+        """
+        start = self.start_dir
+        end = self.size()
+        data = bytearray(end - start)
+        missing = [(start, end)]
+        for offset, segment in self._directory_segments:
+            lo, hi = max(offset, start), min(offset + len(segment), end)
+            if lo >= hi:
+                continue
+            data[lo - start:hi - start] = segment[lo - offset:hi - offset]
+            missing = [part for a, b in missing for part in ((a, min(b, lo)), (max(a, hi), b)) if part[0] < part[1]]
+        for a, b in missing:
+            data[a - start:b - start] = self.fetcher.fetch_raw(a, b - 1)
+        return start, bytes(data)
+
+    def _RealGetContents(self):
+        directory = self._directory
+        if directory is None:
+            return super()._RealGetContents()
+        self.filelist = directory.filelist
+        self.NameToInfo = directory.name_to_info
+        self.start_dir = directory.start_dir
+        self._comment = directory.comment
+        # Nothing has been fetched yet; an empty buffer makes the first read issue a range request.
+        self.fp._file_size = directory.size
+        self.fp.buffer = PartialBuffer(io.BytesIO(), 0, 0, False)
+
+    def _get_position_to_size(self):
+        if self._directory is not None:
+            return self._directory.position_to_size
+        return super()._get_position_to_size()
+
+# --- Persistent central-directory index ---
+# The tail of each archive (central directory, ZIP64 records and end record) is kept
+# in a small SQLite database, so restarts and one-off CLI runs only need a HEAD request
+# to confirm the archive hasn't changed before listing it.
+INDEX_MAX_ARCHIVES = 500                # Oldest entries beyond this are pruned
+INDEX_MAX_BYTES = 64 * 1024 * 1024      # Per table; oldest snapshots beyond this are pruned
+
+def _default_cache_dir():
+    """Returns the per-user cache directory, honouring REMOTE_ZIP_CACHE_DIR."""
+    if os.environ.get('REMOTE_ZIP_CACHE_DIR'):
+        return Path(os.environ['REMOTE_ZIP_CACHE_DIR'])
+    if os.name == 'nt':
+        return Path(os.environ.get('LOCALAPPDATA', Path.home())) / 'RemoteZipViewer'
+    return Path(os.environ.get('XDG_CACHE_HOME', Path.home() / '.cache')) / 'remote-zip-viewer'
+
+_FINGERPRINT_KEY = os.urandom(32)   # In-memory keys only need to be stable within the process
+
+def _credential_fingerprint(auth, secret=None):
+    """
+    Returns a keyed hash of HTTP credentials, so they are never stored in clear text.
+    Without the secret a stored fingerprint can't be brute-forced back into a password.
+    """
+    if not auth:
+        return ''
+    import hashlib, hmac
+    return hmac.new(secret or _FINGERPRINT_KEY, '\0'.join(auth).encode('utf-8'), hashlib.sha256).hexdigest()[:32]
+
+class _DirectorySnapshot:
+    """A read-only file holding only the tail of an archive. Earlier bytes read as zeros."""
+
+    def __init__(self, offset, data):
+        self._offset = offset
+        self._data = data
+        self._size = offset + len(data)
+        self._position = 0
+
+    def seek(self, offset, whence=0):
+        if whence == 2:
+            offset += self._size
+        elif whence == 1:
+            offset += self._position
+        self._position = max(offset, 0)
+        return self._position
+
+    def tell(self):
+        return self._position
+
+    def read(self, size=-1):
+        end = self._size if size is None or size < 0 else min(self._position + size, self._size)
+        start = self._position
+        self._position = max(end, start)
+        if start >= end:
+            return b""
+        padding = max(min(self._offset, end) - start, 0)
+        return bytes(padding) + self._data[max(start - self._offset, 0):end - self._offset]
+
+    def close(self):
+        pass
+
+class DiskIndex:
+    """
+    A SQLite store of archive directory snapshots, keyed by URL and credentials.
+    Credentials are fingerprinted with a random per-install secret kept next to the database.
+    """
+
+    def __init__(self, path, max_archives=INDEX_MAX_ARCHIVES, max_bytes=INDEX_MAX_BYTES):
+        self.path = Path(path)
+        self.max_archives = max_archives
+        self.max_bytes = max_bytes
+        self._secret = None
+
+    def _connect(self):
+        import sqlite3
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.path), timeout=10)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS archives ("
+            " key TEXT PRIMARY KEY, url TEXT, etag TEXT, last_modified TEXT, size INTEGER,"
+            " directory_offset INTEGER, directory BLOB, updated REAL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS listings ("
+            " key TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, size INTEGER, listing BLOB, updated REAL)"
+        )
+        return conn
+
+    def _load_secret(self):
+        """Returns the install's fingerprint secret, creating it readable by the owner only."""
+        if self._secret is None:
+            key_path = self.path.with_name(self.path.name + '.key')
+            key_path.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                fd = os.open(str(key_path), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            except FileExistsError:
+                secret = key_path.read_bytes()
+            else:
+                secret = os.urandom(32)
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(secret)
+            if len(secret) < 32:  # Truncated by a concurrent first run still writing it
+                raise OSError(f"The index key {key_path} is incomplete")
+            self._secret = secret
+        return self._secret
+
+    def _key(self, url, auth):
+        return f"{_credential_fingerprint(auth, self._load_secret() if auth else None)}:{url}"
+
+    def _prune(self, conn, table, column):
+        """Drops the oldest rows beyond the entry count or byte budget of a table."""
+        conn.execute(
+            f"DELETE FROM {table} WHERE key NOT IN (SELECT key FROM {table} ORDER BY updated DESC LIMIT ?)",
+            (self.max_archives,)
+        )
+        total, stale = 0, []
+        for key, length in conn.execute(f"SELECT key, length({column}) FROM {table} ORDER BY updated DESC"):
+            total += length or 0
+            if total > self.max_bytes:
+                stale.append((key,))
+        conn.executemany(f"DELETE FROM {table} WHERE key = ?", stale)
+
+    def load(self, url, auth=None):
+        """
+        Returns the stored ArchiveDirectory for the url, or None.
+        The directory still has to be revalidated against the server before it is trusted.
+        """
+        import sqlite3
+        try:
+            with closing(self._connect()) as conn:
+                row = conn.execute(
+                    "SELECT etag, last_modified, size, directory_offset, directory FROM archives WHERE key = ?",
+                    (self._key(url, auth),)
+                ).fetchone()
+            if row is None:
+                return None
+            etag, last_modified, size, offset, data = row
+            zf = zipfile.ZipFile(_DirectorySnapshot(offset, data))
+        except (sqlite3.Error, OSError, zipfile.BadZipFile) as e:
+            logger.warning(f"Could not load the stored index for {url}: {e}")
+            return None
+        validators = {'etag': etag, 'last_modified': last_modified, 'size': size}
+        directory = ArchiveDirectory(zf, size, validators)
+        directory.validated_at = float('-inf')
+        return directory
+
+    def store(self, url, auth, directory, zf):
+        """
+        Saves the directory snapshot of a freshly parsed PooledRemoteZip. Archives without
+        an ETag or Last-Modified are skipped, as a later restart couldn't revalidate them.
+        """
+        import sqlite3
+        if not _is_versioned(directory.validators):
+            return
+        try:
+            offset, data = zf.directory_snapshot()
+            validators = directory.validators
+            with closing(self._connect()) as conn, conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO archives VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (self._key(url, auth), url, validators.get('etag'), validators.get('last_modified'),
+                     directory.size, offset, data, time.time())
+                )
+                self._prune(conn, 'archives', 'directory')
+        except (sqlite3.Error, OSError, requests.RequestException, RemoteIOError) as e:
+            logger.warning(f"Could not store the index for {url}: {e}")
+
+    def load_listing(self, url, auth=None):
+        """Returns (validators, serialized ArchiveIndex) for the url, or None."""
+        import sqlite3
+        try:
+            with closing(self._connect()) as conn:
+                row = conn.execute(
+                    "SELECT etag, last_modified, size, listing FROM listings WHERE key = ?", (self._key(url, auth),)
+                ).fetchone()
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"Could not load the stored listing for {url}: {e}")
+            return None
+        if row is None:
+            return None
+        etag, last_modified, size, listing = row
+        return {'etag': etag, 'last_modified': last_modified, 'size': size}, listing
+
+    def store_listing(self, url, auth, validators, index):
+        """Saves the serialized ArchiveIndex of an archive version, if the version can be revalidated."""
+        import sqlite3
+        if not _is_versioned(validators):
+            return
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO listings VALUES (?, ?, ?, ?, ?, ?)",
+                    (self._key(url, auth), validators.get('etag'), validators.get('last_modified'),
+                     validators.get('size'), index.to_bytes(), time.time())
+                )
+                self._prune(conn, 'listings', 'listing')
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"Could not store the listing for {url}: {e}")
+
+disk_index = DiskIndex(_default_cache_dir() / 'index.sqlite3')
+
+class ArchivePool:
+    """A bounded, thread-safe LRU pool of parsed archive directories."""
+
+    def __init__(self, max_entries=ARCHIVE_POOL_SIZE, idle_timeout=ARCHIVE_IDLE_TIMEOUT,
+                 revalidate_after=ARCHIVE_REVALIDATE_AFTER, disk_index=None):
+        self.max_entries = max_entries
+        self.disk_index = disk_index
+        self.idle_timeout = idle_timeout
+        self.revalidate_after = revalidate_after
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _purge_idle(self, now):
+        expired = [key for key, directory in self._entries.items() if now - directory.last_used > self.idle_timeout]
+        for key in expired:
+            del self._entries[key]
+
+    def get(self, key):
+        """Returns the pooled directory for a key, or None."""
+        now = time.monotonic()
+        with self._lock:
+            self._purge_idle(now)
+            directory = self._entries.get(key)
+            if directory is not None:
+                directory.last_used = now
+                self._entries.move_to_end(key)
+            return directory
+
+    def put(self, key, directory):
+        with self._lock:
+            self._entries[key] = directory
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def open(self, url, key, **kwargs):
+        """
+        Returns a PooledRemoteZip for the url, reusing a pooled directory when the
+        remote file has not changed since it was parsed.
+        """
+        directory = self.get(key)
+        if directory is None or time.monotonic() - directory.validated_at > self.revalidate_after:
+            record_cache("archive", "miss" if directory is None else "revalidate", url)
+            with timed('cd', absorb=True):
+                directory = single_flight.do(('archive', key), self._refresh, url, key, kwargs)
+        else:
+            record_cache("archive", "hit", url)
+        return PooledRemoteZip(url, directory=directory, **kwargs)
+
+    def _refresh(self, url, key, kwargs):
+        """Loads, revalidates or parses the directory of an archive; runs once per key at a time."""
+        directory = self.get(key)
+        if directory is None and self.disk_index is not None:
+            directory = self.disk_index.load(url, kwargs.get('auth'))
+            record_cache("disk", "miss" if directory is None else "hit", url)
+            if directory is not None:
+                self.put(key, directory)
+
+        if directory is not None and time.monotonic() - directory.validated_at > self.revalidate_after:
+            with closing(PooledRemoteZip(url, directory=directory, **kwargs)) as zf:
+                current = zf.fetcher.head_validators()
+            if _validators_match(directory.validators, current):
+                directory.validated_at = time.monotonic()
+                return directory
+            logger.info(f"Archive at {url} has changed. Reloading its central directory.")
+            self.discard(key)
+            directory = None
+
+        if directory is not None:
+            return directory
+
+        with closing(PooledRemoteZip(url, **kwargs)) as zf:
+            directory = ArchiveDirectory(zf, zf.size(), zf.fetcher.validators, zf.fp._member_position_to_size)
+            self.put(key, directory)
+            if self.disk_index is not None:
+                self.disk_index.store(url, kwargs.get('auth'), directory, zf)
+        return directory
+
+archive_pool = ArchivePool(disk_index=disk_index)
+
+def get_zip_context(url, insecure=False, auth=None, is_retry=False, session=None):
+    """
+    Returns a context manager for a local or remote zip file.
+    Remote archives are opened through the archive pool, so their central directory
+    is only downloaded once. Range requests use the given requests session, or the
+    origin's shared session from the session pool.
+    Automatically retries with SSL verification disabled on SSLCertVerificationError.
+    """
+    from requests.exceptions import SSLError
+
+    if is_local_path(url):
+        return zipfile.ZipFile(url, 'r')
+
+    kwargs = _get_session_kwargs(insecure, auth, session or session_pool.get(url, insecure, auth))
+    try:
+        logger.info(f"Attempting to connect to {url} with verify={kwargs.get('verify')}")
+        return archive_pool.open(url, archive_key(url, insecure, auth), **kwargs)
+    except SSLError as e:
+        # If it's a cert verification error and we haven't already retried, try again with verification off.
+        if not insecure and not is_retry and 'CERTIFICATE_VERIFY_FAILED' in str(e):
+            logger.warning("SSL certificate verification failed. Retrying automatically with verification disabled.")
+            return get_zip_context(url, insecure=True, auth=auth, is_retry=True, session=session)
+        raise  # Re-raise the exception if it's not the one we're handling or if we've already retried.
+
+# --- Coalesced range planning ---
+# Bulk paths (folder downloads, exports) read many small neighbouring members. Rather
+# than one range request per member, the planner merges members separated by small
+# gaps into a few large requests and then splits the fetched bytes back into members.
+COALESCE_MAX_GAP = 64 * 1024             # Largest unwanted gap still fetched to join two members
+COALESCE_MAX_SPAN = 8 * 1024 * 1024      # Largest coalesced request, which is held in memory
+COALESCE_MEMBER_LIMIT = 1024 * 1024      # Members larger than this are streamed on their own
+
+class RangeGroup:
+    """A contiguous byte range of the archive holding one or more whole members."""
+    __slots__ = ('start', 'end', 'members')
+
+    def __init__(self, start, end, members):
+        self.start = start
+        self.end = end          # Exclusive
+        self.members = members
+
+    def __len__(self):
+        return self.end - self.start
+
+    def __repr__(self):
+        return f"<RangeGroup {self.start}-{self.end} members={len(self.members)}>"
+
+def member_extents(zf):
+    """Returns a dict of header_offset -> bytes up to the next member (or the central directory)."""
+    if isinstance(zf, PooledRemoteZip):
+        return zf.fp._member_position_to_size
+    return RemoteZip._get_position_to_size(zf)
+
+def plan_ranges(infos, extents, max_gap=COALESCE_MAX_GAP, max_span=COALESCE_MAX_SPAN):
+    """
+    Groups members into as few range requests as possible. Members are merged while the
+    gap to the previous member is at most max_gap and the group stays within max_span.
+    """
+    groups = []
+    for info in sorted(infos, key=lambda i: i.header_offset):
+        start = info.header_offset
+        end = start + extents[start]
+        if groups:
+            group = groups[-1]
+            if start - group.end <= max_gap and max(end, group.end) - group.start <= max_span:
+                group.end = max(group.end, end)
+                group.members.append(info)
+                continue
+        groups.append(RangeGroup(start, end, [info]))
+    return groups
+
+def read_archive_range(zf, start, length):
+    """Reads raw bytes of a local or remote archive without going through a member."""
+    if isinstance(zf, PooledRemoteZip):
+        return zf.fetcher.fetch_raw(start, start + length - 1)
+    with zf._lock:
+        zf.fp.seek(start)
+        return zf.fp.read(length)
+
+def group_member_data(group, data, info):
+    """Returns the raw (compressed) bytes of one member from the bytes fetched for its RangeGroup."""
+    offset = info.header_offset - group.start
+    header = data[offset:offset + zipfile.sizeFileHeader]
+    if len(header) != zipfile.sizeFileHeader or header[:4] != zipfile.stringFileHeader:
+        raise zipfile.BadZipFile(f"Bad local file header for '{info.filename}'")
+    fields = struct.unpack(zipfile.structFileHeader, header)
+    data_start = offset + zipfile.sizeFileHeader + fields[10] + fields[11]
+    return data[data_start:data_start + info.compress_size]
+
+def split_range_group(group, data):
+    """
+    Splits the bytes fetched for a RangeGroup back into its members.
+    Yields (ZipInfo, raw compressed bytes) pairs.
+    """
+    for info in group.members:
+        yield info, group_member_data(group, data, info)
+
+def iter_group_members(zf, group, pwd=None):
+    """Fetches a RangeGroup with one request and yields (ZipInfo, file-like) for each member."""
+    data = read_archive_range(zf, group.start, len(group))
+    for info, raw in split_range_group(group, data):
+        yield info, zipfile.ZipExtFile(io.BytesIO(raw), 'r', info, pwd)
+
+# --- Decompression pipeline ---
+# Fetching is I/O-bound and runs in threads, but inflating many large members and
+# checking their CRCs is CPU-bound and serialized by the GIL. Fetched member data is
+# handed to a process pool instead; fetch threads wait once DECOMPRESS_MAX_PENDING bytes
+# are queued, so they can't run ahead of the decompressors and memory stays bounded.
+DECOMPRESS_MIN_SIZE = 256 * 1024             # Smaller members are inflated by the fetching thread
+DECOMPRESS_MAX_MEMBER = 64 * 1024 * 1024     # Larger members are streamed by the fetching thread, not held in memory
+DECOMPRESS_MAX_PENDING = 256 * 1024 * 1024   # Compressed bytes queued for the pool before fetchers wait
+DECOMPRESS_POOL_MIN = 32 * 1024 * 1024       # Compressed bytes worth spawning a pool for, unless processes are given
+
+@contextmanager
+def _replacing(path):
+    """
+    Yields <path>.inflating opened for writing and moves it over path once the block
+    succeeds. A failed or interrupted write removes it, so it never leaves a
+    complete-looking file behind.
+    """
+    partial = f"{path}.inflating"
+    try:
+        with open(partial, "wb") as target:
+            yield target
+        os.replace(partial, path)
+    except BaseException:
+        if os.path.exists(partial):
+            os.unlink(partial)
+        raise
+
+def _extract_member(raw, info, path):
+    """Runs in a worker process: inflates a member's raw data, checks its CRC-32 and writes it to path."""
+    import shutil
+    with zipfile.ZipExtFile(io.BytesIO(raw), 'r', info) as source, _replacing(path) as target:
+        shutil.copyfileobj(source, target, 1024 * 1024)
+    return info.file_size
+
+class DecompressPipeline:
+    """
+    Inflates and writes members in a pool of worker processes. submit() blocks while
+    more than max_pending compressed bytes are queued. on_done(info, error) is called
+    from a pool thread when a member is written (error is None) or has failed. Workers
+    are only spawned by the first submit, and several downloads can share one pipeline
+    through bind().
+    """
+
+    def __init__(self, processes=None, max_pending=DECOMPRESS_MAX_PENDING, on_done=None):
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        self.processes = processes or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self.pending = 0
+        self._on_done = on_done
+        # Spawned workers don't inherit the fetch threads' locks, which fork could copy mid-use.
+        self._executor = ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context('spawn'))
+        self._ready = threading.Condition()
+
+    @staticmethod
+    def worthwhile(infos, processes=0):
+        """
+        Whether to start a pool for these members. An explicit process count starts it for
+        any member it wants; by default (0) the pool must get DECOMPRESS_POOL_MIN bytes.
+        """
+        if (processes or os.cpu_count() or 1) < 2:
+            return False
+        wanted = sum(info.compress_size for info in infos if DecompressPipeline.wants(info))
+        return wanted > 0 and (processes or wanted >= DECOMPRESS_POOL_MIN)
+
+    @staticmethod
+    def wants(info):
+        """Whether a member is worth inflating in the pool rather than in the fetching thread."""
+        return (info.compress_type != zipfile.ZIP_STORED and not info.flag_bits & 0x1
+                and info.file_size >= DECOMPRESS_MIN_SIZE and info.compress_size <= DECOMPRESS_MAX_MEMBER)
+
+    def bind(self, on_done):
+        """Returns a view of this pipeline for one download, reporting to its own on_done."""
+        return _BoundPipeline(self, on_done)
+
+    def submit(self, raw, info, path, on_done=None):
+        """Queues a member's compressed data to be inflated to path; returns a Future."""
+        on_done = on_done or self._on_done
+        size = len(raw)
+        with self._ready:
+            # A member larger than the whole budget still goes through once nothing else is queued.
+            self._ready.wait_for(lambda: not self.pending or self.pending + size <= self.max_pending)
+            self.pending += size
+        try:
+            future = self._executor.submit(_extract_member, raw, info, str(path))
+        except BaseException:
+            self._release(size)
+            raise
+        future.add_done_callback(lambda f: self._finished(f, info, size, on_done))
+        return future
+
+    def _release(self, size):
+        with self._ready:
+            self.pending -= size
+            self._ready.notify_all()
+
+    def _finished(self, future, info, size, on_done):
+        self._release(size)
+        if on_done is not None:
+            on_done(info, future.exception())
+
+    def close(self):
+        """Waits for every queued member and stops the workers."""
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class _BoundPipeline:
+    """One download's view of a shared DecompressPipeline; wait() waits for its own members only."""
+
+    def __init__(self, pipeline, on_done):
+        self.pipeline = pipeline
+        self._on_done = on_done
+        self._futures = []
+        self._lock = threading.Lock()
+
+    def wants(self, info):
+        return self.pipeline.wants(info)
+
+    def submit(self, raw, info, path):
+        future = self.pipeline.submit(raw, info, path, self._on_done)
+        with self._lock:
+            self._futures.append(future)
+        return future
+
+    def wait(self):
+        from concurrent.futures import wait
+        with self._lock:
+            futures = list(self._futures)
+        wait(futures)
+
+# --- Streaming ZIP export ---
+# A new archive is written on the fly from members of the source archive. Their
+# compressed data and CRCs are copied verbatim (fetched with coalesced range requests),
+# so no member is ever inflated or recompressed; only fresh local headers and a new
+# central directory are generated. Every size is known up front, so the total length is too.
+ZIP64_LIMIT = 0xFFFFFFFF
+
+def _strip_zip64_extra(extra):
+    """Removes ZIP64 extended information from an extra field; it is rebuilt for the new offsets."""
+    result = bytearray()
+    position = 0
+    while position + 4 <= len(extra):
+        header_id, size = struct.unpack("<HH", extra[position:position + 4])
+        if header_id != 0x0001:
+            result += extra[position:position + 4 + size]
+        position += 4 + size
+    return bytes(result)
+
+class _ExportEntry:
+    """A source member and everything needed to write it into the exported archive."""
+    __slots__ = ('info', 'name', 'flag_bits', 'extra', 'offset', 'local_header', 'descriptor')
+
+class ZipStreamWriter:
+    """
+    Plans and streams a ZIP archive made of members copied verbatim from another archive.
+    `members` is a list of (ZipInfo, new name) pairs.
+    """
+
+    def __init__(self, members):
+        self.entries = []
+        offset = 0
+        # Members are written in archive order, so coalesced reads stay sequential.
+        for info, name in sorted(members, key=lambda member: member[0].header_offset):
+            entry = _ExportEntry()
+            entry.info = info
+            entry.name = name.encode('ascii') if name.isascii() else name.encode('utf-8')
+            # Bit 11 marks UTF-8 names; bit 3 (data descriptor) is kept because traditional
+            # encryption checks its password byte against the time instead of the CRC when it is set.
+            entry.flag_bits = (info.flag_bits & ~0x800) | (0 if name.isascii() else 0x800)
+            entry.extra = _strip_zip64_extra(info.extra)
+            entry.offset = offset
+            entry.local_header = self._local_header(entry)
+            entry.descriptor = self._data_descriptor(entry)
+            offset += len(entry.local_header) + info.compress_size + len(entry.descriptor)
+            self.entries.append(entry)
+        self.central_directory = self._central_directory(offset)
+        self.size = offset + len(self.central_directory)
+
+    @staticmethod
+    def _dos_time(info):
+        dt = info.date_time
+        dosdate = (max(dt[0], 1980) - 1980) << 9 | dt[1] << 5 | dt[2]
+        dostime = dt[3] << 11 | dt[4] << 5 | (dt[5] // 2)
+        return dostime, dosdate
+
+    def _local_header(self, entry):
+        info = entry.info
+        extra = entry.extra
+        compress_size, file_size = info.compress_size, info.file_size
+        extract_version = info.extract_version
+        if compress_size >= ZIP64_LIMIT or file_size >= ZIP64_LIMIT:
+            extra = struct.pack("<HHQQ", 0x0001, 16, file_size, compress_size) + extra
+            compress_size = file_size = ZIP64_LIMIT
+            extract_version = max(extract_version, 45)
+        dostime, dosdate = self._dos_time(info)
+        header = struct.pack(zipfile.structFileHeader, zipfile.stringFileHeader, extract_version, info.reserved,
+                             entry.flag_bits, info.compress_type, dostime, dosdate, info.CRC,
+                             compress_size, file_size, len(entry.name), len(extra))
+        return header + entry.name + extra
+
+    @staticmethod
+    def _data_descriptor(entry):
+        info = entry.info
+        if not entry.flag_bits & 0x08:
+            return b""
+        if info.compress_size >= ZIP64_LIMIT or info.file_size >= ZIP64_LIMIT:
+            return struct.pack("<4sLQQ", b"PK\x07\x08", info.CRC, info.compress_size, info.file_size)
+        return struct.pack("<4sLLL", b"PK\x07\x08", info.CRC, info.compress_size, info.file_size)
+
+    def _central_directory(self, start_dir):
+        records = []
+        for entry in self.entries:
+            info = entry.info
+            zip64 = []
+            file_size, compress_size, offset = info.file_size, info.compress_size, entry.offset
+            if file_size >= ZIP64_LIMIT:
+                zip64.append(file_size)
+                file_size = ZIP64_LIMIT
+            if compress_size >= ZIP64_LIMIT:
+                zip64.append(compress_size)
+                compress_size = ZIP64_LIMIT
+            if offset >= ZIP64_LIMIT:
+                zip64.append(offset)
+                offset = ZIP64_LIMIT
+            extra = entry.extra
+            extract_version = info.extract_version
+            if zip64:
+                extra = struct.pack(f"<HH{len(zip64)}Q", 0x0001, 8 * len(zip64), *zip64) + extra
+                extract_version = max(extract_version, 45)
+            dostime, dosdate = self._dos_time(info)
+            records.append(struct.pack(
+                zipfile.structCentralDir, zipfile.stringCentralDir, max(info.create_version, extract_version),
+                info.create_system, extract_version, info.reserved, entry.flag_bits, info.compress_type,
+                dostime, dosdate, info.CRC, compress_size, file_size, len(entry.name), len(extra),
+                len(info.comment), 0, info.internal_attr, info.external_attr, offset))
+            records.append(entry.name + extra + info.comment)
+        central_directory = b"".join(records)
+
+        count, size_cd, offset_cd = len(self.entries), len(central_directory), start_dir
+        trailer = b""
+        if count >= 0xFFFF or size_cd >= ZIP64_LIMIT or offset_cd >= ZIP64_LIMIT:
+            trailer = struct.pack(zipfile.structEndArchive64, zipfile.stringEndArchive64, 44, 45, 45, 0, 0,
+                                  count, count, size_cd, offset_cd)
+            trailer += struct.pack(zipfile.structEndArchive64Locator, zipfile.stringEndArchive64Locator,
+                                   0, start_dir + size_cd, 1)
+            count, size_cd, offset_cd = min(count, 0xFFFF), min(size_cd, ZIP64_LIMIT), min(offset_cd, ZIP64_LIMIT)
+        trailer += struct.pack(zipfile.structEndArchive, zipfile.stringEndArchive, 0, 0,
+                               count, count, size_cd, offset_cd, 0)
+        return central_directory + trailer
+
+    def stream(self, zf):
+        """
+        Yields the new archive. Small neighbouring members are read with coalesced range
+        requests; larger ones are streamed in chunks, so memory stays bounded.
+        """
+        extents = member_extents(zf)
+        small = [entry.info for entry in self.entries if extents[entry.info.header_offset] <= COALESCE_MEMBER_LIMIT]
+        group_of = {}
+        for group in plan_ranges(small, extents):
+            for member in group.members:
+                group_of[member.header_offset] = group
+
+        current, data = None, None
+        for entry in self.entries:
+            info = entry.info
+            yield entry.local_header
+            group = group_of.get(info.header_offset)
+            if group is not None:
+                if group is not current:
+                    current, data = group, read_archive_range(zf, group.start, len(group))
+                yield group_member_data(group, data, info)
+            else:
+                data_offset = _member_data_offset(zf, info)
+                yield from _iter_archive_range(zf, data_offset, data_offset + info.compress_size)
+            yield entry.descriptor
+        yield self.central_directory
+
+# --- Compact archive index ---
+# Listings of large archives are kept as parallel arrays instead of nested dicts: one
+# table of interned path components plus one typed column per field. Nodes are laid out
+# breadth-first so the children of a directory are contiguous and sorted, and a
+# directory only needs the index range of its children.
+NODE_DIR, NODE_TEXT, NODE_IMAGE, NODE_ENCRYPTED = 1, 2, 4, 8
+
+def _sort_key(name):
+    """Sort order of names within a directory (case-insensitive, then exact)."""
+    return (name.lower(), name)
+
+class EntryView:
+    """A lightweight view of one node of an ArchiveIndex."""
+    __slots__ = ('index', 'id')
+
+    def __init__(self, index, node_id):
+        self.index = index
+        self.id = node_id
+
+    def __repr__(self):
+        return f"<EntryView {self.path!r}>"
+
+    @property
+    def name(self):
+        return self.index.names[self.id]
+
+    @property
+    def path(self):
+        return self.index.path(self.id)
+
+    @property
+    def is_dir(self):
+        return bool(self.index.flags[self.id] & NODE_DIR)
+
+    @property
+    def type(self):
+        return "dir" if self.is_dir else "file"
+
+    @property
+    def is_text(self):
+        return bool(self.index.flags[self.id] & NODE_TEXT)
+
+    @property
+    def is_image(self):
+        return bool(self.index.flags[self.id] & NODE_IMAGE)
+
+    @property
+    def is_encrypted(self):
+        return bool(self.index.flags[self.id] & NODE_ENCRYPTED)
+
+    @property
+    def file_size(self):
+        return self.index.file_size[self.id]
+
+    @property
+    def compress_size(self):
+        return self.index.compress_size[self.id]
+
+    @property
+    def compress_type(self):
+        return self.index.compress_type[self.id]
+
+    @property
+    def crc(self):
+        return self.index.crc[self.id]
+
+    @property
+    def header_offset(self):
+        return self.index.header_offset[self.id]
+
+    def children(self, offset=0, limit=None):
+        """Returns views of this directory's children, in sorted order."""
+        start, count = self.index.first_child[self.id], self.index.child_count[self.id]
+        stop = start + count if limit is None else min(start + count, start + offset + limit)
+        return [EntryView(self.index, i) for i in range(start + offset, stop)]
+
+class ArchiveIndex:
+    """The directory tree of an archive, stored column-wise in typed arrays."""
+
+    # Column name and array typecode, in serialization order.
+    COLUMNS = (
+        ('parent', 'i'), ('first_child', 'i'), ('child_count', 'i'),
+        ('flags', 'B'), ('compress_type', 'B'), ('crc', 'I'),
+        ('file_size', 'Q'), ('compress_size', 'Q'), ('header_offset', 'Q'),
+    )
+    MAGIC = b"RZIX1"
+
+    def __init__(self):
+        self.names = []
+        for column, typecode in self.COLUMNS:
+            setattr(self, column, array(typecode))
+        self._nbytes = None
+        self._search_index = None
+
+    def _append(self, name, parent, flags, info=None):
+        self.names.append(sys.intern(name))
+        self.parent.append(parent)
+        self.first_child.append(0)
+        self.child_count.append(0)
+        self.flags.append(flags)
+        if info is None:
+            for column in ('compress_type', 'crc', 'file_size', 'compress_size', 'header_offset'):
+                getattr(self, column).append(0)
+        else:
+            self.compress_type.append(info.compress_type)
+            self.crc.append(info.CRC)
+            self.file_size.append(info.file_size)
+            self.compress_size.append(info.compress_size)
+            self.header_offset.append(info.header_offset)
+        return len(self.names) - 1
+
+    @classmethod
+    def from_infolist(cls, infolist):
+        """Builds the index from ZipInfo objects. Directory entries are implied by file paths."""
+        root = {}
+        for info in infolist:
+            # Skip directory entries, we build the structure from file paths
+            if info.is_dir():
+                continue
+            parts = info.filename.split('/')
+            level = root
+            for part in parts[:-1]:
+                child = level.get(part)
+                if not isinstance(child, dict):
+                    child = level[part] = {}
+                level = child
+            if parts[-1] and not isinstance(level.get(parts[-1]), dict):
+                level[parts[-1]] = info
+
+        index = cls()
+        index._append('', -1, NODE_DIR)
+        queue = deque([(root, 0)])
+        while queue:
+            level, node = queue.popleft()
+            names = sorted(level, key=_sort_key)
+            index.first_child[node] = len(index.names)
+            index.child_count[node] = len(names)
+            for name in names:
+                child = level[name]
+                if isinstance(child, dict):
+                    queue.append((child, index._append(name, node, NODE_DIR)))
+                    continue
+                lower = child.filename.lower()
+                flags = ((NODE_TEXT if lower.endswith(TEXT_EXTS) else 0)
+                         | (NODE_IMAGE if lower.endswith(IMAGE_EXTS) else 0)
+                         | (NODE_ENCRYPTED if child.flag_bits & 0x1 else 0))
+                index._append(name, node, flags, child)
+        return index
+
+    def __len__(self):
+        """Number of nodes, including the root directory."""
+        return len(self.names)
+
+    @property
+    def root(self):
+        return EntryView(self, 0)
+
+    @property
+    def nbytes(self):
+        """Approximate memory used by the index, in bytes."""
+        if self._nbytes is None:
+            arrays = sum(getattr(self, column).itemsize * len(getattr(self, column)) for column, _ in self.COLUMNS)
+            names = sys.getsizeof(self.names) + sum(sys.getsizeof(name) for name in set(self.names))
+            self._nbytes = arrays + names
+        return self._nbytes
+
+    @property
+    def search_index(self):
+        """The SearchIndex over this listing, created on first use and kept with it."""
+        if self._search_index is None:
+            self._search_index = SearchIndex(self)
+        return self._search_index
+
+    def path(self, node_id):
+        """Rebuilds the full archive path of a node from its ancestors."""
+        parts = []
+        while node_id > 0:
+            parts.append(self.names[node_id])
+            node_id = self.parent[node_id]
+        return '/'.join(reversed(parts))
+
+    def find(self, path):
+        """Returns the EntryView for a path (files or directories). Raises KeyError if missing."""
+        node = 0
+        path = path.strip('/')
+        for part in path.split('/') if path else []:
+            if not self.flags[node] & NODE_DIR:
+                raise KeyError(path)
+            lo = self.first_child[node]
+            hi = end = lo + self.child_count[node]
+            key = _sort_key(part)
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if _sort_key(self.names[mid]) < key:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            if lo == end or self.names[lo] != part:
+                raise KeyError(path)
+            node = lo
+        return EntryView(self, node)
+
+    def to_bytes(self):
+        """Serializes the index: a header, the NUL-separated names, then each column."""
+        names = '\0'.join(self.names).encode('utf-8', 'surrogatepass')
+        header = self.MAGIC + (b'<' if sys.byteorder == 'little' else b'>') + struct.pack('<QQ', len(self.names), len(names))
+        return b''.join([header, names] + [getattr(self, column).tobytes() for column, _ in self.COLUMNS])
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Loads an index written by to_bytes."""
+        data = memoryview(data)
+        magic_size = len(cls.MAGIC)
+        if bytes(data[:magic_size]) != cls.MAGIC:
+            raise ValueError("Not a serialized ArchiveIndex")
+        swap = bytes(data[magic_size:magic_size + 1]) != (b'<' if sys.byteorder == 'little' else b'>')
+        position = magic_size + 1
+        count, names_size = struct.unpack_from('<QQ', data, position)
+        position += 16
+        index = cls()
+        index.names = [sys.intern(name) for name in
+                       bytes(data[position:position + names_size]).decode('utf-8', 'surrogatepass').split('\0')]
+        position += names_size
+        for column, typecode in cls.COLUMNS:
+            values = getattr(index, column)
+            size = values.itemsize * count
+            values.frombytes(data[position:position + size])
+            if swap:
+                values.byteswap()
+            position += size
+        return index
+
+# --- Filename search ---
+# Searches scan one lower-cased string holding every node's name (or path), one per line,
+# with str.find. Nodes are numbered breadth-first, so matches come out ordered by path
+# depth and a query can stop as soon as it has enough results.
+SEARCH_LIMIT = 100       # Results returned when no limit is given
+SEARCH_LIMIT_MAX = 1000  # Most results a client may ask for
+GLOB_CHARS = "*?["
+
+def _glob_to_regex(pattern):
+    """
+    Translates a glob into a regex for one line of the search text, plus its longest literal run.
+    '*' and '?' stay within one path component, '**/' spans any number of folders.
+    """
+    parts, literals, literal = [], [], ''
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == '*':
+            if pattern.startswith('**/', i):
+                parts.append('(?:.*/)?')
+                i += 3
+            elif pattern.startswith('**', i):
+                parts.append('.*')
+                i += 2
+            else:
+                parts.append('[^/]*')
+                i += 1
+        elif c == '?':
+            parts.append('[^/]')
+            i += 1
+        elif c == '[' and ']' in pattern[i + 2:]:
+            end = pattern.index(']', i + 2)
+            body = pattern[i + 1:end].replace('\\', '\\\\')
+            if body.startswith('!'):
+                body = '^' + body[1:]
+            parts.append(f'[{body}]')
+            i = end + 1
+        else:
+            parts.append(re.escape(c))
+            literal += c
+            i += 1
+            continue
+        literals.append(literal)
+        literal = ''
+    literals.append(literal)
+    return re.compile(''.join(parts)), max(literals, key=len)
+
+class SearchIndex:
+    """Substring and glob search over the names and paths of an ArchiveIndex."""
+
+    def __init__(self, index):
+        self.index = index
+        self._texts = {}
+        self._lock = threading.Lock()
+
+    def _text(self, full_path):
+        """Returns (text, line starts) for names or full paths, building it on first use."""
+        text = self._texts.get(full_path)
+        if text is None:
+            with self._lock:
+                text = self._texts.get(full_path)
+                if text is None:
+                    text = self._texts[full_path] = self._build(full_path)
+        return text
+
+    def _build(self, full_path):
+        names = self.index.names
+        if full_path:
+            names = list(names)
+            parent = self.index.parent
+            for node in range(1, len(names)):
+                if parent[node] > 0:
+                    names[node] = names[parent[node]] + '/' + names[node]
+        text = '\n'.join(names).lower()
+        if len(text) != sum(map(len, names)) + len(names) - 1:
+            # A few characters change length when lower-cased; lower each line on its own.
+            names = [name.lower() for name in names]
+            text = '\n'.join(names)
+        starts = array('Q', accumulate(map((1).__add__, map(len, names)), initial=0))
+        return text, starts
+
+    def prepare(self):
+        """Builds the name search text now, so the first query does not pay for it."""
+        self._text(False)
+
+    @property
+    def nbytes(self):
+        """Memory used by the search text built so far, in bytes."""
+        return sum(sys.getsizeof(text) + starts.itemsize * len(starts) for text, starts in self._texts.values())
+
+    def search(self, query, mode='substring', limit=SEARCH_LIMIT):
+        """
+        Returns (node ids, truncated) for up to limit matching entries, shallowest first.
+        Case-insensitive. Queries with a '/' match whole paths, others match entry names;
+        substring mode matches anywhere, glob mode must match the whole name or path.
+        """
+        query = query.lower()
+        full_path = '/' in query
+        if full_path:
+            query = query.strip('/')
+        if mode == 'glob':
+            regex, literal = _glob_to_regex(query)
+            match = regex.fullmatch
+        elif mode == 'substring':
+            literal, match = query, None
+        else:
+            raise ValueError(f"Unknown search mode '{mode}'")
+
+        text, starts = self._text(full_path)
+        last = len(starts) - 2
+        results = []
+        # Line 0 is the root folder, which never matches.
+        position = starts[1] if last > 0 else len(text) + 1
+        while len(results) <= limit:
+            found = text.find(literal, position)
+            if found == -1:
+                break
+            node = bisect_right(starts, found) - 1
+            line_end = starts[node + 1] - 1
+            if match is None or match(text, starts[node], line_end):
+                results.append(node)
+            position = line_end + 1
+            if node == last:
+                break
+        return results[:limit], len(results) > limit
+
+def _current_validators(url, insecure, auth):
+    """Returns the archive's current validators, from a recently validated pooled handle or a HEAD request."""
+    directory = archive_pool.get(archive_key(url, insecure, auth))
+    if directory is not None and time.monotonic() - directory.validated_at <= archive_pool.revalidate_after:
+        return directory.validators
+    fetcher = RangeFetcher(url, **_get_session_kwargs(insecure, auth, session_pool.get(url, insecure, auth)))
+    return fetcher.head_validators()
+
+# --- Streaming listing ---
+# Listings for scripts (`-l --format`, /api/entries) are written while the central
+# directory is read, one window at a time, instead of after every ZipInfo has been
+# built and sorted. Memory stays flat however many entries the archive has, and the
+# first rows go out as soon as the first window arrives. Rows keep the central
+# directory order; callers sort them if they need to.
+LISTING_FORMATS = ("ndjson", "csv", "tsv")
+LISTING_FIELDS = ("path", "type", "size", "compress_size", "crc", "method", "mtime", "offset")
+LISTING_WINDOW = 1024 * 1024            # Central directory bytes fetched per range request
+LISTING_TAIL = 22 + 0xFFFF + 20 + 56    # End record with the longest comment, ZIP64 locator and end record
+LISTING_CHUNK = 64 * 1024               # Text sent per chunk by /api/entries
+LISTING_MIMETYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv", "tsv": "text/tab-separated-values"}
+COMPRESSION_NAMES = {
+    zipfile.ZIP_STORED: "stored", zipfile.ZIP_DEFLATED: "deflate", 9: "deflate64",
+    zipfile.ZIP_BZIP2: "bzip2", zipfile.ZIP_LZMA: "lzma", 93: "zstd", 99: "aes",
+}
+
+class _LocalDirectorySource:
+    """Reads the central directory of a local archive."""
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+
+    def tail(self, length):
+        """Returns (offset, data) for the last length bytes of the archive."""
+        size = self._file.seek(0, 2)
+        offset = self._file.seek(max(size - length, 0))
+        return offset, self._file.read()
+
+    def read(self, start, end):
+        """Returns the bytes [start, end] of the archive."""
+        self._file.seek(start)
+        return self._file.read(end - start + 1)
+
+    def close(self):
+        self._file.close()
+
+class _RemoteDirectorySource:
+    """Reads the central directory of a remote archive with uncached range requests."""
+
+    def __init__(self, url, insecure, auth):
+        self.fetcher = RangeFetcher(url, **_get_session_kwargs(insecure, auth, session_pool.get(url, insecure, auth)))
+
+    def tail(self, length):
+        buffer = self.fetcher.fetch((-length, None))
+        try:
+            return buffer.tell(), buffer.read()
+        finally:
+            buffer.close()
+
+    def read(self, start, end):
+        return self.fetcher.fetch_raw(start, end)
+
+    def close(self):
+        pass
+
+def _zipinfo_from_record(header, record, concat):
+    """Builds the ZipInfo of one central directory record, as zipfile would."""
+    name_end = zipfile.sizeCentralDir + header[zipfile._CD_FILENAME_LENGTH]
+    extra_end = name_end + header[zipfile._CD_EXTRA_FIELD_LENGTH]
+    flags = header[zipfile._CD_FLAG_BITS]
+    info = zipfile.ZipInfo(bytes(record[zipfile.sizeCentralDir:name_end]).decode('utf-8' if flags & 0x800 else 'cp437'))
+    info.extra = bytes(record[name_end:extra_end])
+    info.comment = bytes(record[extra_end:])
+    (info.create_version, info.create_system, info.extract_version, info.reserved, info.flag_bits,
+     info.compress_type, t, d, info.CRC, info.compress_size, info.file_size) = header[1:12]
+    info.volume, info.internal_attr, info.external_attr = header[15:18]
+    info.header_offset = header[zipfile._CD_LOCAL_HEADER_OFFSET]
+    info._raw_time = t
+    info.date_time = ((d >> 9) + 1980, (d >> 5) & 0xF, d & 0x1F, t >> 11, (t >> 5) & 0x3F, (t & 0x1F) * 2)
+
+    # The ZIP64 extra field holds, in this order, each of the values that overflowed.
+    position = 0
+    while position + 4 <= len(info.extra):
+        tag, length = struct.unpack_from('<HH', info.extra, position)
+        if tag == 0x0001:
+            values = iter(struct.unpack_from(f'<{length // 8}Q', info.extra, position + 4))
+            for field in ('file_size', 'compress_size', 'header_offset'):
+                if getattr(info, field) == 0xFFFFFFFF:
+                    setattr(info, field, next(values, 0xFFFFFFFF))
+            break
+        position += 4 + length
+    info.header_offset += concat
+    return info
+
+def iter_central_directory(url, insecure=False, auth=None):
+    """
+    Yields the ZipInfo of every entry of a local or remote archive in central directory
+    order. The directory is parsed LISTING_WINDOW bytes at a time, so only one window is
+    held in memory; a recently validated pooled directory is reused without any request.
+    """
+    from requests.exceptions import SSLError
+
+    local = is_local_path(url)
+    if not local:
+        directory = archive_pool.get(archive_key(url, insecure, auth))
+        if directory is not None and time.monotonic() - directory.validated_at <= archive_pool.revalidate_after:
+            record_cache("archive", "hit", url)
+            yield from directory.filelist
+            return
+
+    source = _LocalDirectorySource(url) if local else _RemoteDirectorySource(url, insecure, auth)
+    with closing(source):
+        try:
+            tail_offset, tail = source.tail(LISTING_TAIL)
+        except SSLError as e:
+            if insecure or 'CERTIFICATE_VERIFY_FAILED' not in str(e):
+                raise
+            logger.warning("SSL certificate verification failed. Retrying automatically with verification disabled.")
+            yield from iter_central_directory(url, insecure=True, auth=auth)
+            return
+        endrec = zipfile._EndRecData(_DirectorySnapshot(tail_offset, tail))
+        if endrec is None:
+            raise zipfile.BadZipFile("File is not a zip file")
+        size, offset = endrec[zipfile._ECD_SIZE], endrec[zipfile._ECD_OFFSET]
+        # Bytes prepended to the archive (e.g. a self-extractor stub) shift every offset.
+        concat = endrec[zipfile._ECD_LOCATION] - size - offset
+        if endrec[zipfile._ECD_SIGNATURE] == zipfile.stringEndArchive64:
+            concat -= zipfile.sizeEndCentDir64 + zipfile.sizeEndCentDir64Locator
+        start, stop = offset + concat, offset + concat + size
+
+        data = bytearray()
+        position = start
+        while position < stop:
+            if position >= tail_offset:
+                window = tail[position - tail_offset:stop - tail_offset]
+            else:
+                window = source.read(position, min(position + LISTING_WINDOW, stop) - 1)
+            if not window:
+                break
+            position += len(window)
+            data += window
+            used = 0
+            while len(data) - used >= zipfile.sizeCentralDir:
+                header = struct.unpack_from(zipfile.structCentralDir, data, used)
+                if header[zipfile._CD_SIGNATURE] != zipfile.stringCentralDir:
+                    raise zipfile.BadZipFile("Bad magic number for central directory")
+                length = (zipfile.sizeCentralDir + header[zipfile._CD_FILENAME_LENGTH]
+                          + header[zipfile._CD_EXTRA_FIELD_LENGTH] + header[zipfile._CD_COMMENT_LENGTH])
+                if len(data) - used < length:
+                    break
+                yield _zipinfo_from_record(header, memoryview(data)[used:used + length], concat)
+                used += length
+            del data[:used]
+        if data or position < stop:
+            raise zipfile.BadZipFile("Truncated central directory")
+
+def iter_listing(url, list_path='', no_subdirs=False, insecure=False, auth=None):
+    """Yields the ZipInfo of the entries under list_path (or the whole archive), optionally without subfolders."""
+    prefix = list_path.strip('/') + '/' if list_path.strip('/') else ''
+    for info in iter_central_directory(url, insecure, auth):
+        rest = info.filename[len(prefix):].rstrip('/')
+        if not info.filename.startswith(prefix) or not rest:
+            continue
+        if no_subdirs and '/' in rest:
+            continue
+        yield info
+
+def listing_record(info):
+    """Returns the LISTING_FIELDS of one entry as a dict."""
+    year, month, day, hour, minute, second = info.date_time
+    return {
+        "path": info.filename,
+        "type": "dir" if info.is_dir() else "file",
+        "size": info.file_size,
+        "compress_size": info.compress_size,
+        "crc": f"{info.CRC:08x}",
+        "method": COMPRESSION_NAMES.get(info.compress_type, str(info.compress_type)),
+        "mtime": f"{year:04d}-{month:02d}-{day:02d}T{hour:02d}:{minute:02d}:{second:02d}",
+        "offset": info.header_offset,
+    }
+
+def format_listing(infos, fmt):
+    """Yields the lines of a listing in one of LISTING_FORMATS; csv and tsv start with a header row."""
+    import csv
+    import json
+    if fmt == "ndjson":
+        for info in infos:
+            yield json.dumps(listing_record(info), ensure_ascii=False) + "\n"
+        return
+    line = io.StringIO()
+    writer = csv.writer(line, delimiter="\t" if fmt == "tsv" else ",", lineterminator="\n")
+    writer.writerow(LISTING_FIELDS)
+    for info in infos:
+        yield line.getvalue()
+        line.seek(0)
+        line.truncate()
+        writer.writerow(listing_record(info).values())
+    yield line.getvalue()
+
+# --- Content search ---
+# Searches the contents of the members under a folder or matching a glob. Small
+# neighbouring members are fetched with coalesced range requests, larger ones are
+# streamed, and worker threads scan them concurrently. Large compressed members can be
+# handed to a process pool instead, so inflating and matching them isn't serialized by
+# the GIL. The search stops once enough matches are found or the byte budget is spent.
+GREP_MATCHES = 100                    # Matches returned when no limit is given
+GREP_MATCHES_MAX = 1000               # Most matches an /api/grep client may ask for
+GREP_MAX_BYTES = 256 * 1024 * 1024    # Uncompressed bytes scanned before the search stops
+GREP_CONTEXT_MAX = 10                 # Most context lines around each match
+GREP_JOBS = 4                         # Threads fetching and scanning members
+GREP_BLOCK = 1024 * 1024              # Bytes read from a member at a time
+GREP_LINE_LIMIT = 1000                # Longer lines are cut in results
+
+def _grep_text(line):
+    return line.rstrip(b'\r').decode('utf-8', 'replace')[:GREP_LINE_LIMIT]
+
+def _scan_member(source, regex, context, limit, max_bytes, stop=None):
+    """
+    Scans a member's file object for a bytes regex. Returns (matches, bytes read), where
+    each match has the line number, its text and up to `context` lines before and after it.
+    Blocks without a match are counted without splitting them into lines. Stops after
+    `limit` matches (once their context is complete), after max_bytes, or when stop is
+    set. Binary members (a NUL byte at the start) are skipped.
+    """
+    matches, waiting = [], []
+    before = deque(maxlen=context)
+    line_no = 0
+    read = 0
+    tail = b''
+    while not (stop is not None and stop.is_set()):
+        chunk = source.read(min(GREP_BLOCK, max_bytes - read)) if read < max_bytes else b''
+        if not read and b'\0' in chunk[:8192]:
+            return [], len(chunk)
+        read += len(chunk)
+        block = tail + chunk
+        if chunk:
+            cut = block.rfind(b'\n') + 1
+            block, tail = block[:cut], block[cut:]
+        if block and not waiting and regex.search(block) is None:
+            line_no += block.count(b'\n') + (not block.endswith(b'\n'))
+            if context:
+                lines = block.rsplit(b'\n', context + 1)
+                if block.endswith(b'\n'):
+                    lines.pop()
+                before.extend(_grep_text(line) for line in lines[-context:])
+        elif block:
+            lines = block.split(b'\n')
+            if block.endswith(b'\n'):
+                lines.pop()
+            for line in lines:
+                line_no += 1
+                text = _grep_text(line)
+                for match in waiting:
+                    match["after"].append(text)
+                waiting = [match for match in waiting if len(match["after"]) < context]
+                if len(matches) < limit and regex.search(line):
+                    match = {"line": line_no, "text": text, "before": list(before), "after": []}
+                    matches.append(match)
+                    if context:
+                        waiting.append(match)
+                before.append(text)
+                if len(matches) >= limit and not waiting:
+                    return matches, read
+        if not chunk:
+            break
+    return matches, read
+
+def _grep_member(raw, info, pattern, flags, context, limit, max_bytes, stop=None):
+    """Inflates a member's raw data and scans it; runs in a fetching thread or a worker process."""
+    with zipfile.ZipExtFile(io.BytesIO(raw), 'r', info) as source:
+        return _scan_member(source, re.compile(pattern, flags), context, limit, max_bytes, stop)
+
+class ContentSearch:
+    """
+    A search for a regex (or, with fixed, a literal string) in the members of an archive
+    under a folder prefix or matching a glob. Iterate results() for the members with
+    matches; the counters and truncated ("matches", "bytes" or None) are final once it
+    is exhausted. Raises re.error for an invalid pattern.
+    """
+
+    def __init__(self, url, pattern, select='', insecure=False, auth=None, pwd=None, ignore_case=False,
+                 fixed=False, context=0, max_matches=GREP_MATCHES, max_bytes=GREP_MAX_BYTES,
+                 jobs=GREP_JOBS, processes=1, session=None):
+        pattern = pattern.encode('utf-8')
+        self.regex = re.compile(re.escape(pattern) if fixed else pattern,
+                                re.MULTILINE | (re.IGNORECASE if ignore_case else 0))
+        self.url = url
+        self.select = select
+        self.insecure = insecure
+        self.auth = auth
+        self.pwd = pwd
+        self.context = context
+        self.max_matches = max_matches
+        self.jobs = max(1, jobs)
+        self.processes = processes
+        self.session = session
+        self.members_scanned = 0
+        self.bytes_scanned = 0
+        self.matches = 0
+        self.errors = []
+        self.truncated = None
+        self._budget = max_bytes
+        self._found = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def _selected(self, name):
+        """Globs match entry names, or whole paths if they contain a '/'; anything else is a folder prefix."""
+        select = self.select.strip('/')
+        if not select:
+            return True
+        if any(c in select for c in GLOB_CHARS):
+            regex = _glob_to_regex(select.lower())[0]
+            return regex.fullmatch((name if '/' in select else name.rsplit('/', 1)[-1]).lower()) is not None
+        return name.startswith(select + '/') or name == select
+
+    def _reserve(self, info):
+        """Takes the bytes a member may scan from the budget; 0 once it is spent or the search has stopped."""
+        with self._lock:
+            if self._stop.is_set():
+                return 0
+            budget = min(info.file_size, self._budget)
+            self._budget -= budget
+            if budget < info.file_size:
+                self.truncated = self.truncated or "bytes"
+            return budget
+
+    def _refund(self, budget):
+        with self._lock:
+            self._budget += budget
+
+    def _scanned(self, budget, read, matches):
+        """
+        Returns unused budget and stops the other workers once more matches are found than
+        will be reported, which is how results() tells a search cut short from one that
+        found exactly max_matches.
+        """
+        with self._lock:
+            self.members_scanned += 1
+            self.bytes_scanned += read
+            self._budget += max(budget - read, 0)
+            self._found += len(matches)
+            if self._found > self.max_matches:
+                self._stop.set()
+
+    def _scan_group(self, group, pool):
+        """
+        Reserves budget for a RangeGroup's members, fetches it with one request and scans
+        them. Returns (info, matches, error) tuples.
+        """
+        if self._stop.is_set():
+            return []
+        budgets = [self._reserve(info) for info in group.members]
+        if not any(budgets):
+            return []
+        try:
+            with get_zip_context(self.url, self.insecure, self.auth, session=self.session) as zf:
+                data = read_archive_range(zf, group.start, len(group))
+        except Exception as e:
+            self._refund(sum(budgets))
+            return [(info, [], e) for info, budget in zip(group.members, budgets) if budget]
+        found = []
+        for info, budget in zip(group.members, budgets):
+            if not budget:
+                continue
+            try:
+                args = (group_member_data(group, data, info), info, self.regex.pattern, self.regex.flags,
+                        self.context, self.max_matches + 1, budget)
+                if pool is not None and DecompressPipeline.wants(info):
+                    matches, read = pool.submit(_grep_member, *args).result()
+                else:
+                    matches, read = _grep_member(*args, stop=self._stop)
+                self._scanned(budget, read, matches)
+                found.append((info, matches, None))
+            except Exception as e:
+                self._refund(budget)
+                found.append((info, [], e))
+        return found
+
+    def _scan_streamed(self, info, pool):
+        """Streams one large or encrypted member through the scanner."""
+        budget = self._reserve(info)
+        if not budget:
+            return []
+        try:
+            with get_zip_context(self.url, self.insecure, self.auth, session=self.session) as zf, \
+                    zf.open(info, pwd=self.pwd) as source:
+                matches, read = _scan_member(source, self.regex, self.context, self.max_matches + 1, budget,
+                                             self._stop)
+        except Exception as e:
+            self._refund(budget)
+            return [(info, [], e)]
+        self._scanned(budget, read, matches)
+        return [(info, matches, None)]
+
+    def results(self):
+        """Yields {"path", "matches"} for each member with matches, in the order they finish."""
+        import multiprocessing
+        from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+
+        with get_zip_context(self.url, self.insecure, self.auth, session=self.session) as zf:
+            members = [info for info in zf.infolist() if not info.is_dir() and self._selected(info.filename)]
+            extents = member_extents(zf)
+
+        pool = None
+        if DecompressPipeline.worthwhile(members, self.processes):
+            pool = ProcessPoolExecutor(self.processes or os.cpu_count(), mp_context=multiprocessing.get_context('spawn'))
+        # Small neighbours are fetched together; members for the process pool are fetched whole.
+        small, tasks = [], []
+        for info in members:
+            extent = extents[info.header_offset]
+            if info.flag_bits & 0x1:
+                tasks.append((info.header_offset, self._scan_streamed, info))
+            elif extent <= COALESCE_MEMBER_LIMIT:
+                small.append(info)
+            elif pool is not None and DecompressPipeline.wants(info):
+                group = RangeGroup(info.header_offset, info.header_offset + extent, [info])
+                tasks.append((group.start, self._scan_group, group))
+            else:
+                tasks.append((info.header_offset, self._scan_streamed, info))
+        tasks += [(group.start, self._scan_group, group) for group in plan_ranges(small, extents)]
+        tasks.sort(key=lambda task: task[0])
+
+        executor = ThreadPoolExecutor(self.jobs)
+        futures = []
+        try:
+            futures = [executor.submit(scan, target, pool) for _, scan, target in tasks]
+            for future in as_completed(futures):
+                for info, matches, error in future.result():
+                    if error is not None:
+                        logger.warning(f"Could not search '{info.filename}' in {self.url}: {error}")
+                        self.errors.append((info.filename, error))
+                        continue
+                    kept = matches[:self.max_matches - self.matches]
+                    if len(kept) < len(matches):
+                        self.truncated = "matches"
+                    if not kept:
+                        continue
+                    self.matches += len(kept)
+                    yield {"path": info.filename, "matches": kept}
+                if self.truncated == "matches":
+                    break
+        finally:
+            self._stop.set()
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=True)
+            if pool is not None:
+                pool.shutdown(wait=True)
+
+# --- Listing cache ---
+# Listings are weighed by their estimated memory, so one huge archive counts for as
+# much as it costs. A listing older than the TTL is still served for up to
+# LISTING_CACHE_STALE_TTL more seconds while a background refresh revalidates it.
+LISTING_CACHE_BYTES = 256 * 1024 * 1024   # Total estimated size of cached listings
+LISTING_CACHE_TTL = 300                   # Seconds a listing is served without revalidation
+LISTING_CACHE_STALE_TTL = 3600            # Seconds an expired listing is still served while it is refreshed
+
+class _CountingTTLCache(TTLCache):
+    """A TTLCache that counts entries dropped for space and for age."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.evictions = 0
+        self.expirations = 0
+
+    def popitem(self):
+        item = super().popitem()
+        self.evictions += 1
+        return item
+
+    def expire(self, time=None):
+        expired = super().expire(time)
+        self.expirations += len(expired)
+        return expired
+
+class _CachedListing:
+    __slots__ = ('value', 'loaded_at', 'nbytes')
+
+    def __init__(self, value, loaded_at, nbytes):
+        self.value = value
+        self.loaded_at = loaded_at
+        self.nbytes = nbytes
+
+class ListingCache:
+    """
+    A thread-safe TTL cache of archive listings bounded by their estimated size in bytes,
+    with stale-while-revalidate and hit/miss/eviction counters.
+    """
+
+    def __init__(self, max_bytes=LISTING_CACHE_BYTES, ttl=LISTING_CACHE_TTL,
+                 stale_ttl=LISTING_CACHE_STALE_TTL, timer=time.monotonic):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries = _CountingTTLCache(maxsize=max_bytes, ttl=ttl + stale_ttl, timer=timer,
+                                          getsizeof=lambda entry: entry.nbytes)
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._reset_counters()
+
+    def _reset_counters(self):
+        self.hits = self.stale_hits = self.misses = 0
+        self.refreshes = self.refresh_errors = self.oversized = 0
+        self._entries.evictions = self._entries.expirations = 0
+
+    @staticmethod
+    def sizeof(value):
+        """Estimated memory of a listing, including its search text."""
+        return value.nbytes + value.search_index.nbytes
+
+    def get(self, key, load):
+        """
+        Returns the listing for key, calling load() on a miss. Concurrent misses share one
+        load; an expired listing is returned as is and refreshed in the background.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                record_cache("listing", "miss", key[0])
+            elif self._entries.timer() - entry.loaded_at <= self.ttl:
+                self.hits += 1
+                record_cache("listing", "hit", key[0])
+                return entry.value
+            else:
+                self.stale_hits += 1
+                record_cache("listing", "stale", key[0])
+                if key not in self._refreshing:
+                    self._refreshing.add(key)
+                    threading.Thread(target=self._refresh, args=(key, load), daemon=True).start()
+                return entry.value
+        return single_flight.do(('listing', key), self._load, key, load)
+
+    def _load(self, key, load):
+        value = load()
+        with self._lock:
+            try:
+                self._entries[key] = _CachedListing(value, self._entries.timer(), self.sizeof(value))
+            except ValueError:
+                # Larger than the whole cache; serve it without keeping it.
+                self.oversized += 1
+        return value
+
+    def _refresh(self, key, load):
+        try:
+            single_flight.do(('listing', key), self._load, key, load)
+            with self._lock:
+                self.refreshes += 1
+        except Exception as e:
+            with self._lock:
+                self.refresh_errors += 1
+            logger.warning(f"Background refresh of a cached listing failed: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def clear(self):
+        """Drops every listing and resets the counters."""
+        with self._lock:
+            self._entries.clear()
+            self._reset_counters()
+
+    def stats(self):
+        """Returns the cache counters and current size."""
+        with self._lock:
+            self._entries.expire()
+            return {
+                "entries": len(self._entries),
+                "bytes": self._entries.currsize,
+                "max_bytes": self._entries.maxsize,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "evictions": self._entries.evictions,
+                "expirations": self._entries.expirations,
+                "oversized": self.oversized,
+                "refreshes": self.refreshes,
+                "refresh_errors": self.refresh_errors,
+            }
+
+# Cache for storing the directory structure of remote ZIP files.
+file_list_cache = ListingCache()
+
+def list_entries(url, insecure=False, auth=None):
+    """
+    Parses a remote or local ZIP file and returns its directory structure as an ArchiveIndex,
+    with its name search index ready. Listings of remote archives are also kept in the disk index and reused while the
+    archive's validators are unchanged. Concurrent misses for the same archive share one load.
+    """
+    with timed('cd', absorb=True):
+        return file_list_cache.get(archive_key(url, insecure, auth), lambda: _load_entries(url, insecure, auth))
+
+def _load_entries(url, insecure, auth):
+    logger.info(f"Cache miss for {url}. Fetching and processing directory.")
+    remote = not is_local_path(url)
+    if remote and disk_index is not None:
+        stored = disk_index.load_listing(url, auth)
+        if stored is not None:
+            validators, data = stored
+            try:
+                if _validators_match(validators, _current_validators(url, insecure, auth)):
+                    index = ArchiveIndex.from_bytes(data)
+                    index.search_index.prepare()
+                    return index
+            except (requests.RequestException, ValueError) as e:
+                logger.warning(f"Could not reuse the stored listing for {url}: {e}")
+
+    with get_zip_context(url, insecure, auth) as zf:
+        index = ArchiveIndex.from_infolist(zf.infolist())
+        validators = zf.fetcher.validators if isinstance(zf, PooledRemoteZip) else None
+    if validators and disk_index is not None:
+        disk_index.store_listing(url, auth, validators, index)
+    index.search_index.prepare()
+    return index
+
+@route("/")
+def index():
+    return render_template_string(INDEX_HTML)
+
+# Folder listings are sent one level and one page at a time.
+LIST_PAGE_SIZE = 200    # Entries per page when no limit is given
+LIST_PAGE_MAX = 1000    # Largest page a client may ask for
+
+def _entry_json(entry):
+    """Returns the JSON representation of one EntryView."""
+    if entry.is_dir:
+        return {"name": entry.name, "path": entry.path, "type": "dir"}
+    return {
+        "name": entry.name,
+        "path": entry.path,
+        "type": "file",
+        "file_size": entry.file_size,
+        "compress_size": entry.compress_size,
+        "size_label": format_bytes(entry.file_size),
+        "is_text": entry.is_text,
+        "is_image": entry.is_image,
+    }
+
+def list_page(index, path='', cursor=None, limit=LIST_PAGE_SIZE):
+    """
+    Returns one page of a single directory level of an ArchiveIndex.
+    The cursor is the offset of the next entry; raises KeyError for unknown paths.
+    """
+    folder = index.find(path)
+    if not folder.is_dir:
+        raise KeyError(path)
+    offset = int(cursor) if cursor else 0
+    entries = [_entry_json(entry) for entry in folder.children(offset, limit)]
+    next_offset = offset + len(entries)
+    return {
+        "path": path.strip('/'),
+        "entries": entries,
+        "next_cursor": str(next_offset) if next_offset < index.child_count[folder.id] else None,
+    }
+
+@route("/view")
+def view():
+    url = request.args.get("url")
+    insecure = request.args.get("no_verify") == "on"
+    user = request.args.get("user")
+    password = request.args.get("password")
+    zip_password = request.args.get("zip_password")
+    
+    # Clear previous session data
+    session.clear()
+    if not url:
+        return redirect(url_for("index"))
+    
+    auth = None
+    if user:
+        auth = (user, password or '')
+        session['http_user'] = user
+        session['http_password'] = password or ''
+    if zip_password:
+        session['zip_password'] = zip_password
+
+    try:
+        index = list_entries(url, insecure=insecure, auth=auth)
+        page = list_page(index)
+        with timed('render'):
+            return render_template_string(INDEX_HTML, page=page, url=url, no_verify=insecure, user=user, password=password, zip_password=zip_password)
+    except Exception as e:
+        with timed('render'):
+            return render_template_string(INDEX_HTML, error=str(e), url=url, no_verify=insecure, user=user, password=password, zip_password=zip_password)
+
+def _request_credentials():
+    """Returns (insecure, auth, zip_password) for the current request; credentials come from the session."""
+    insecure = request.args.get("no_verify") == "on"
+    user = session.get('http_user')
+    password = session.get('http_password')
+    zip_password = session.get('zip_password')
+    auth = None
+    if user:
+        auth = (user, password)
+    return insecure, auth, zip_password
+
+@route("/api/list")
+def api_list():
+    """Returns one page of one folder level as JSON: ?url=...&path=...&cursor=...&limit=..."""
+    url = request.args.get("url")
+    if not url:
+        return {"error": "Missing 'url' parameter."}, 400
+    insecure, auth, _ = _request_credentials()
+    try:
+        limit = min(max(int(request.args.get("limit", LIST_PAGE_SIZE)), 1), LIST_PAGE_MAX)
+        cursor = request.args.get("cursor")
+        if cursor is not None:
+            int(cursor)
+    except ValueError:
+        return {"error": "Invalid 'limit' or 'cursor' parameter."}, 400
+    try:
+        index = list_entries(url, insecure=insecure, auth=auth)
+        return list_page(index, request.args.get("path", ""), cursor, limit)
+    except KeyError:
+        return {"error": f"Folder '{request.args.get('path')}' not found in the archive."}, 404
+    except Exception as e:
+        return {"error": str(e)}, 500
+
+@route("/api/search")
+def api_search():
+    """
+    Searches entry names and paths: ?url=...&q=...&mode=substring|glob&limit=...
+    The mode defaults to glob when the query contains wildcards. Results are shallowest first.
+    """
+    url = request.args.get("url")
+    query = request.args.get("q", "")
+    if not url or not query.strip('/'):
+        return {"error": "Missing 'url' or 'q' parameter."}, 400
+    mode = request.args.get("mode") or ("glob" if any(c in query for c in GLOB_CHARS) else "substring")
+    if mode not in ("substring", "glob"):
+        return {"error": f"Unknown search mode '{mode}'."}, 400
+    try:
+        limit = min(max(int(request.args.get("limit", SEARCH_LIMIT)), 1), SEARCH_LIMIT_MAX)
+    except ValueError:
+        return {"error": "Invalid 'limit' parameter."}, 400
+    insecure, auth, _ = _request_credentials()
+    try:
+        index = list_entries(url, insecure=insecure, auth=auth)
+        nodes, truncated = index.search_index.search(query, mode, limit)
+    except re.error as e:
+        return {"error": f"Invalid pattern: {e}"}, 400
+    except Exception as e:
+        return {"error": str(e)}, 500
+    return {
+        "query": query,
+        "mode": mode,
+        "entries": [_entry_json(EntryView(index, node)) for node in nodes],
+        "truncated": truncated,
+    }
+
+@route("/api/entries")
+def api_entries():
+    """
+    Streams every entry with its sizes, CRC, method, mtime and offset:
+    ?url=...&format=ndjson|csv|tsv&path=...&nosubdirs=1
+    Rows are sent in central directory order while it is parsed; sort them client-side.
+    """
+    url = request.args.get("url")
+    if not url:
+        return {"error": "Missing 'url' parameter."}, 400
+    fmt = request.args.get("format", "ndjson")
+    if fmt not in LISTING_FORMATS:
+        return {"error": f"Unknown format '{fmt}'."}, 400
+    insecure, auth, _ = _request_credentials()
+    infos = iter_listing(url, request.args.get("path", ""), request.args.get("nosubdirs") in ("1", "on", "true"),
+                         insecure, auth)
+    # The first entry is read up front, so an unreachable or broken archive still gets an error status.
+    try:
+        first = next(infos, None)
+    except Exception as e:
+        return {"error": str(e)}, 500
+    if first is not None:
+        infos = chain((first,), infos)
+
+    def generate():
+        lines, size = [], 0
+        try:
+            for line in format_listing(infos, fmt):
+                lines.append(line)
+                size += len(line)
+                if size >= LISTING_CHUNK:
+                    yield "".join(lines)
+                    lines, size = [], 0
+        except Exception as e:
+            logger.error(f"Error listing entries of url {url}: {e}")
+        if lines:
+            yield "".join(lines)
+
+    return Response(generate(), mimetype=LISTING_MIMETYPES[fmt])
+
+@route("/api/grep")
+def api_grep():
+    """
+    Searches member contents: ?url=...&q=...&path=<folder or glob>&fixed=1&icase=1&context=N&limit=N&max_bytes=N
+    Matches are sorted by path and line; truncated tells whether the match limit or the byte budget stopped the search.
+    """
+    url = request.args.get("url")
+    query = request.args.get("q", "")
+    if not url or not query:
+        return {"error": "Missing 'url' or 'q' parameter."}, 400
+    try:
+        limit = min(max(int(request.args.get("limit", GREP_MATCHES)), 1), GREP_MATCHES_MAX)
+        context = min(max(int(request.args.get("context", 0)), 0), GREP_CONTEXT_MAX)
+        max_bytes = min(max(int(request.args.get("max_bytes", GREP_MAX_BYTES)), 1), GREP_MAX_BYTES)
+    except ValueError:
+        return {"error": "Invalid 'limit', 'context' or 'max_bytes' parameter."}, 400
+    insecure, auth, zip_password = _request_credentials()
+    ignore_case = request.args.get("icase") in ("1", "on", "true")
+    fixed = request.args.get("fixed") in ("1", "on", "true")
+    try:
+        search = ContentSearch(url, query, request.args.get("path", ""), insecure, auth,
+                               zip_password.encode() if zip_password else None, ignore_case, fixed,
+                               context, limit, max_bytes)
+        results = list(search.results())
+    except re.error as e:
+        return {"error": f"Invalid pattern: {e}"}, 400
+    except Exception as e:
+        return {"error": str(e)}, 500
+    return {
+        "query": query,
+        "matches": sorted(({"path": result["path"], **match} for result in results for match in result["matches"]),
+                          key=lambda match: (match["path"], match["line"])),
+        "members_scanned": search.members_scanned,
+        "bytes_scanned": search.bytes_scanned,
+        "truncated": search.truncated,
+        "errors": [{"path": path, "error": str(error)} for path, error in search.errors],
+    }
+
+@route("/api/cache-stats")
+def api_cache_stats():
+    """Returns the size and hit counters of the in-memory caches, for tuning their capacity."""
+    return {
+        "listings": file_list_cache.stats(),
+        "blocks": {"bytes": block_cache.nbytes, "max_bytes": block_cache.max_bytes},
+        "archives": {"entries": len(archive_pool), "max_entries": archive_pool.max_entries},
+        "sessions": {"entries": len(session_pool), "max_entries": session_pool.max_sessions},
+    }
+
+def _cache_gauges():
+    listings = file_list_cache.stats()
+    with preview_cache_lock:
+        preview_bytes, previews = preview_cache.currsize, len(preview_cache)
+    return [
+        ("remote_zip_cache_bytes", {"cache": "listing"}, listings["bytes"]),
+        ("remote_zip_cache_bytes", {"cache": "block"}, block_cache.nbytes),
+        ("remote_zip_cache_bytes", {"cache": "preview"}, preview_bytes),
+        ("remote_zip_cache_bytes", {"cache": "seek"}, seek_indexes.nbytes),
+        ("remote_zip_cache_entries", {"cache": "listing"}, listings["entries"]),
+        ("remote_zip_cache_entries", {"cache": "preview"}, previews),
+        ("remote_zip_cache_entries", {"cache": "archive"}, len(archive_pool)),
+        ("remote_zip_cache_entries", {"cache": "session"}, len(session_pool)),
+        ("remote_zip_cache_entries", {"cache": "seek"}, seek_indexes.checkpoints),
+    ]
+
+@route("/metrics")
+def prometheus_metrics():
+    """Returns the request, upstream and cache metrics in the Prometheus text format."""
+    return Response(metrics.render(_cache_gauges()), mimetype="text/plain; version=0.0.4")
+
+def _start_request_timer():
+    timer = RequestTimer(request.endpoint or "unmatched")
+    _request_timer.set(timer)
+    request.environ[METRICS_TIMER_KEY] = timer
+
+def _add_server_timing(response):
+    """Sends the phase times so far; the request is recorded once its (streamed) body is closed."""
+    timer = request.environ.get(METRICS_TIMER_KEY)
+    if timer is not None:
+        response.headers['Server-Timing'] = timer.server_timing()
+        response.call_on_close(lambda: timer.finish(response.status_code))
+    return response
+
+@route("/browse")
+def browse_local_file():
+    """Opens a native file dialog and redirects to the view page for the selected file."""
+    import tkinter as tk
+    from tkinter import filedialog
+
+    root = tk.Tk()
+    root.withdraw()  # Hide the main tkinter window
+    file_path = filedialog.askopenfilename(
+        title="Select a ZIP file",
+        filetypes=[("ZIP Archives", "*.zip")]
+    )
+    if file_path:
+        return redirect(url_for('view', url=file_path))
+    return "<script>window.close();</script>" # Close the tab if no file is selected
+
+def with_remote_zip(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        url = request.args.get("url")
+        name = request.args.get("name")
+        # Retrieve credentials from session instead of URL
+        insecure, auth, zip_password = _request_credentials()
+
+        if not url or not name:
+            abort(400, "Missing 'url' or 'name' parameter.")
+
+        # Pass the parsed arguments to the decorated function
+        return f(url, name, insecure, auth, zip_password, *args, **kwargs)
+    return decorated_function
+
+def _member_data_offset(zf, info):
+    """Returns the archive offset of a member's data, just past its local file header."""
+    if isinstance(zf, PooledRemoteZip):
+        # Local headers are tiny and read often, so they go through the block cache.
+        buffer = zf.fetcher.fetch((info.header_offset, info.header_offset + zipfile.sizeFileHeader - 1))
+        try:
+            header = buffer.read()
+        finally:
+            buffer.close()
+    else:
+        header = read_archive_range(zf, info.header_offset, zipfile.sizeFileHeader)
+    if len(header) != zipfile.sizeFileHeader or header[:4] != zipfile.stringFileHeader:
+        raise zipfile.BadZipFile(f"Bad local file header for '{info.filename}'")
+    fields = struct.unpack(zipfile.structFileHeader, header)
+    return info.header_offset + zipfile.sizeFileHeader + fields[10] + fields[11]
+
+def _iter_archive_range(zf, start, stop, chunk_size=64 * 1024):
+    """Yields the raw archive bytes [start, stop) in chunks."""
+    if stop <= start:
+        return
+    if isinstance(zf, PooledRemoteZip):
+        buffer = zf.fetcher.fetch((start, stop - 1), stream=True)
+        try:
+            while True:
+                with timed('fetch'):
+                    chunk = buffer.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            buffer.close()
+    else:
+        position = start
+        while position < stop:
+            chunk = read_archive_range(zf, position, min(chunk_size, stop - position))
+            if not chunk:
+                break
+            position += len(chunk)
+            yield chunk
+
+# --- Seek index for DEFLATE members ---
+# Reading from the middle of a DEFLATE stream normally means inflating everything
+# before it. While a large member is inflated, a copy of the inflater is kept every
+# SEEK_CHECKPOINT_INTERVAL output bytes, together with the compressed and uncompressed
+# offsets it was taken at. Later reads resume from the nearest checkpoint before their
+# start and only fetch compressed bytes up to the first checkpoint past their end.
+SEEK_CHECKPOINT_INTERVAL = 4 * 1024 * 1024   # Uncompressed bytes between checkpoints
+SEEK_INDEX_MIN_SIZE = 16 * 1024 * 1024       # Smaller members are always inflated from the start
+SEEK_INDEX_MAX_CHECKPOINTS = 256             # Checkpoints kept over all members (~11 MB in all)
+SEEK_CHECKPOINT_BYTES = 45 * 1024            # Estimated memory of one checkpoint's inflater state
+SEEK_CHUNK_SIZE = 64 * 1024                  # Most uncompressed bytes produced per inflate call
+
+class SeekIndex:
+    """The inflate checkpoints of one DEFLATE member, ordered by uncompressed offset."""
+
+    def __init__(self, interval=SEEK_CHECKPOINT_INTERVAL):
+        self.interval = interval
+        self._uncompressed = array('Q', [0])
+        self._compressed = array('Q', [0])
+        self._states = [None]
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """Number of checkpoints, not counting the start of the member."""
+        return len(self._states) - 1
+
+    def nearest(self, offset):
+        """Returns (compressed offset, uncompressed offset, inflater) of the last checkpoint at or before offset."""
+        with self._lock:
+            i = bisect_right(self._uncompressed, offset) - 1
+            state = self._states[i]
+            return (self._compressed[i], self._uncompressed[i],
+                    state.copy() if state is not None else zlib.decompressobj(-15))
+
+    def following(self, offset):
+        """Returns the compressed offset of the first checkpoint at or after offset, or None."""
+        with self._lock:
+            i = bisect_left(self._uncompressed, offset)
+            return self._compressed[i] if i < len(self._compressed) else None
+
+    def add(self, compressed, uncompressed, inflater):
+        """Records a checkpoint if it is at least one interval past the last one. Returns True if added."""
+        with self._lock:
+            if uncompressed < self._uncompressed[-1] + self.interval:
+                return False
+            self._uncompressed.append(uncompressed)
+            self._compressed.append(compressed)
+            self._states.append(inflater.copy())
+            return True
+
+class SeekIndexCache:
+    """A thread-safe LRU of SeekIndexes, bounded by their total number of checkpoints."""
+
+    def __init__(self, max_checkpoints=SEEK_INDEX_MAX_CHECKPOINTS):
+        self.max_checkpoints = max_checkpoints
+        self.checkpoints = 0
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Returns the SeekIndex for key, creating an empty one if needed."""
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is None:
+                index = self._indexes[key] = SeekIndex()
+            self._indexes.move_to_end(key)
+            return index
+
+    def added(self, key):
+        """Accounts for a checkpoint added to key's index, evicting the least recently used indexes."""
+        with self._lock:
+            self.checkpoints += 1
+            while self.checkpoints > self.max_checkpoints and len(self._indexes) > 1:
+                evicted_key, evicted = next(iter(self._indexes.items()))
+                if evicted_key == key:
+                    self._indexes.move_to_end(key)
+                    continue
+                del self._indexes[evicted_key]
+                self.checkpoints -= len(evicted)
+
+    @property
+    def nbytes(self):
+        """Estimated memory held by the kept checkpoints."""
+        return self.checkpoints * SEEK_CHECKPOINT_BYTES
+
+    def clear(self):
+        with self._lock:
+            self._indexes.clear()
+            self.checkpoints = 0
+
+seek_indexes = SeekIndexCache()
+
+class RangeInflater:
+    """
+    Inflates the uncompressed bytes [start, stop) of a DEFLATE member from compressed
+    chunks, starting at the nearest checkpoint of its seek index and recording new ones.
+    Feed it the member's compressed bytes [compressed_start, compressed_stop).
+    Raises BadZipFile if the member is inflated in full and its CRC-32 does not match.
+    """
+
+    def __init__(self, info, start, stop, seek_index=None, on_checkpoint=None):
+        self.info = info
+        self.start = start
+        self.stop = stop
+        self.seek_index = seek_index if seek_index is not None else SeekIndex()
+        self._on_checkpoint = on_checkpoint
+        self.compressed_start, self.position, self._inflater = self.seek_index.nearest(start)
+        following = self.seek_index.following(stop)
+        self.compressed_stop = info.compress_size if following is None else following
+        self._consumed = self.compressed_start
+        # The CRC can only be checked when the whole member is inflated.
+        self._crc = 0 if self.position == 0 and stop >= info.file_size else None
+        self.done = stop <= start
+
+    def _emit(self, data):
+        if self._crc is not None:
+            self._crc = zlib.crc32(data, self._crc)
+            if self.position + len(data) >= self.info.file_size and self._crc != self.info.CRC:
+                raise zipfile.BadZipFile(f"Bad CRC-32 for file '{self.info.filename}'")
+        piece = data[max(self.start - self.position, 0):self.stop - self.position]
+        self.position += len(data)
+        if self.position >= self.stop:
+            self.done = True
+        return piece
+
+    def feed(self, compressed):
+        """Returns the list of output pieces produced by the next compressed chunk."""
+        pieces = []
+        with timed('inflate'):
+            self._feed(compressed, pieces)
+        return pieces
+
+    def _feed(self, compressed, pieces):
+        while compressed and not self.done:
+            data = self._inflater.decompress(compressed, SEEK_CHUNK_SIZE)
+            self._consumed += len(compressed) - len(self._inflater.unconsumed_tail)
+            compressed = self._inflater.unconsumed_tail
+            if data:
+                piece = self._emit(data)
+                if piece:
+                    pieces.append(piece)
+            if self.seek_index.add(self._consumed, self.position, self._inflater) and self._on_checkpoint:
+                self._on_checkpoint()
+            if not data and not compressed:
+                break
+
+    def finish(self):
+        """Returns the output still buffered in the inflater once all compressed bytes were fed."""
+        pieces = []
+        with timed('inflate'):
+            while not self.done:
+                data = self._inflater.flush(SEEK_CHUNK_SIZE) if not self._inflater.eof else b''
+                if not data:
+                    break
+                piece = self._emit(data)
+                if piece:
+                    pieces.append(piece)
+        return pieces
+
+def _seek_index_key(zf, info):
+    """The key of a member's seek index, or None if it should not be kept."""
+    if not isinstance(zf, PooledRemoteZip) or info.file_size < SEEK_INDEX_MIN_SIZE:
+        return None
+    identity = zf.fetcher._cache_identity()
+    return None if identity is None else (identity, info.header_offset)
+
+def _range_inflater(zf, info, start, stop):
+    """Returns a RangeInflater for a member, using its kept seek index when it has one."""
+    key = _seek_index_key(zf, info)
+    if key is None:
+        return RangeInflater(info, start, stop)
+    return RangeInflater(info, start, stop, seek_indexes.get(key), lambda: seek_indexes.added(key))
+
+def _iter_deflate_range(zf, info, start, stop):
+    """Yields the uncompressed bytes [start, stop) of a DEFLATE member, starting at its nearest checkpoint."""
+    inflater = _range_inflater(zf, info, start, stop)
+    if inflater.done:
+        return
+    data_offset = _member_data_offset(zf, info)
+    chunks = _iter_archive_range(zf, data_offset + inflater.compressed_start, data_offset + inflater.compressed_stop)
+    try:
+        for chunk in chunks:
+            yield from inflater.feed(chunk)
+            if inflater.done:
+                return
+        yield from inflater.finish()
+    finally:
+        chunks.close()
+
+def _iter_member_range(zf, info, pwd, start, stop):
+    """
+    Yields the uncompressed bytes [start, stop) of a member of an open archive.
+    STORED members are read straight from the archive and remote DEFLATE members
+    resume from their seek index; anything else is inflated from the start and skipped.
+    """
+    if info.compress_type == zipfile.ZIP_STORED and not info.flag_bits & 0x1:
+        data_offset = _member_data_offset(zf, info)
+        yield from _iter_archive_range(zf, data_offset + start, data_offset + stop)
+        return
+    if (info.compress_type == zipfile.ZIP_DEFLATED and not info.flag_bits & 0x1
+            and isinstance(zf, PooledRemoteZip)):
+        yield from _iter_deflate_range(zf, info, start, stop)
+        return
+    with zf.open(info, pwd=pwd) as f:
+        if start:
+            f.seek(start)
+        remaining = stop - start
+        while remaining > 0:
+            with timed('inflate'):
+                chunk = f.read(min(64 * 1024, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+def _stream_zip_file(url, name, insecure, auth=None, zip_password=None, start=0, stop=None):
+    """
+    A generator that creates a RemoteZip instance and streams a file from it.
+    This ensures the RemoteZip object remains open during the entire stream.
+    Only the uncompressed bytes [start, stop) are sent; for STORED members the range
+    maps directly onto the remote archive instead of streaming from offset 0, and
+    DEFLATE members resume from the nearest checkpoint of their seek index.
+    """
+    pwd_bytes = None
+    if zip_password:
+        pwd_bytes = zip_password.encode('utf-8')
+
+    try:
+        with get_zip_context(url, insecure, auth) as zf:
+            info = zf.getinfo(name)
+            yield from _iter_member_range(zf, info, pwd_bytes, start, info.file_size if stop is None else stop)
+    except FileNotFoundError:
+        # This error won't be caught by Flask's regular error handlers
+        # because it happens inside a generator. We can't easily abort(404).
+        # The stream will just be empty, resulting in a 0-byte response.
+        logger.error(f"File '{name}' not found in zip at url {url}")
+    except RuntimeError as e:
+        if "password" in str(e):
+            # Raised by the first chunk, so _member_response can still answer 401.
+            logger.error(f"Password required or incorrect for file '{name}' in zip at url {url}")
+            raise
+        logger.error(f"Error streaming zip file from url {url}: {e}")
+    except Exception as e:
+        logger.error(f"Error streaming zip file from url {url}: {e}")
+
+# A gzip member header: no name, no mtime, unknown OS. The trailer is CRC-32 and size.
+GZIP_HEADER = b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff"
+
+def _stream_gzip_member(url, name, insecure, auth=None):
+    """
+    A generator that sends a DEFLATE member without inflating it, by wrapping its raw
+    compressed bytes in a gzip header and a trailer built from the central directory.
+    """
+    try:
+        with get_zip_context(url, insecure, auth) as zf:
+            info = zf.getinfo(name)
+            data_offset = _member_data_offset(zf, info)
+            yield GZIP_HEADER
+            yield from _iter_archive_range(zf, data_offset, data_offset + info.compress_size)
+            yield struct.pack("<II", info.CRC, info.file_size & 0xFFFFFFFF)
+    except Exception as e:
+        logger.error(f"Error streaming compressed data of '{name}' from url {url}: {e}")
+
+def _archive_validators(zf, url):
+    """Returns the validators (ETag, Last-Modified, size) of the archive behind a zip handle."""
+    if isinstance(zf, PooledRemoteZip):
+        return zf.fetcher.validators or {}
+    from email.utils import formatdate
+    stat = os.stat(url)
+    return {'etag': None, 'last_modified': formatdate(stat.st_mtime, usegmt=True), 'size': stat.st_size}
+
+def _member_info(url, name, insecure, auth):
+    """Returns the ZipInfo of a member and the validators of its archive. Raises KeyError if missing."""
+    with get_zip_context(url, insecure, auth) as zf:
+        return zf.getinfo(name), _archive_validators(zf, url)
+
+def _member_validators(info, validators):
+    """Builds the ETag and Last-Modified of a member from its CRC and its archive's validators."""
+    import zlib
+    from datetime import datetime, timezone
+    from werkzeug.http import http_date
+
+    token = validators.get('etag') or validators.get('last_modified') or validators.get('size') or ''
+    archive_hash = zlib.crc32(f"{token}:{info.header_offset}".encode('utf-8'))
+    etag = f"{info.CRC:08x}-{info.file_size:x}-{archive_hash:08x}"
+    last_modified = validators.get('last_modified')
+    if not last_modified:
+        try:
+            last_modified = http_date(datetime(*info.date_time, tzinfo=timezone.utc))
+        except ValueError:
+            last_modified = None
+    return etag, last_modified
+
+def _member_response(url, name, insecure, auth, zip_password, mimetype, headers=None):
+    """
+    Builds the streaming response for a member, honouring conditional requests
+    (If-None-Match, If-Modified-Since) and single byte ranges (Range, If-Range).
+    """
+    from werkzeug.http import parse_date
+
+    try:
+        info, validators = _member_info(url, name, insecure, auth)
+    except KeyError:
+        abort(404, f"File '{name}' not found in the archive.")
+    if info.flag_bits & 0x1 and not zip_password:
+        return "<strong>Error:</strong> This file is encrypted. Please provide a password in the main form and try again.", 401
+
+    etag, last_modified = _member_validators(info, validators)
+    headers = dict(headers or {})
+    headers["Accept-Ranges"] = "bytes"
+
+    # DEFLATE members are sent still compressed when the client accepts gzip. HTTP's
+    # "deflate" coding needs an Adler-32 of the uncompressed data, which a ZIP doesn't
+    # store, while the gzip trailer only needs the CRC-32 and size we already have.
+    # Encrypted members must be decrypted here, so they are never passed through.
+    passthrough = False
+    if info.compress_type == zipfile.ZIP_DEFLATED and not info.flag_bits & 0x1:
+        headers["Vary"] = "Accept-Encoding"
+        passthrough = request.range is None and request.accept_encodings["gzip"] > 0
+    if passthrough:
+        etag += "-gzip"
+        headers["Content-Encoding"] = "gzip"
+    headers["ETag"] = f'"{etag}"'
+    if last_modified:
+        headers["Last-Modified"] = last_modified
+
+    # Conditional GET: If-None-Match takes precedence over If-Modified-Since.
+    if request.if_none_match:
+        if request.if_none_match.contains(etag):
+            return Response(status=304, headers=headers)
+    elif request.if_modified_since and last_modified:
+        if parse_date(last_modified) <= request.if_modified_since:
+            return Response(status=304, headers=headers)
+
+    # Under the ASGI entry point, bodies that are plain ranges of the archive are sent by
+    # the async range reader instead of iterating the response in a worker thread.
+    async_body = ASYNC_BODY_KEY in request.environ and not is_local_path(url)
+
+    if passthrough:
+        headers["Content-Length"] = str(len(GZIP_HEADER) + info.compress_size + 8)
+        if async_body and not info.flag_bits & 0x1:
+            request.environ[ASYNC_BODY_KEY] = MemberBody(
+                url, insecure, auth, info, 0, info.compress_size, inflate=False,
+                prefix=GZIP_HEADER, suffix=struct.pack("<II", info.CRC, info.file_size & 0xFFFFFFFF))
+        return Response(_stream_gzip_member(url, name, insecure, auth), headers=headers, mimetype=mimetype)
+
+    size = info.file_size
+    start, stop, status = 0, size, 200
+    range_applies = request.range is not None
+    if range_applies and request.if_range.etag:
+        range_applies = request.if_range.etag == etag
+    elif range_applies and request.if_range.date:
+        range_applies = bool(last_modified) and parse_date(last_modified) <= request.if_range.date
+    if range_applies:
+        byte_range = request.range.range_for_length(size)
+        if byte_range is None:
+            if len(request.range.ranges) == 1:
+                headers["Content-Range"] = f"bytes */{size}"
+                return Response(status=416, headers=headers)
+            # Multiple ranges are not supported; send the whole member instead.
+        else:
+            start, stop = byte_range
+            status = 206
+            headers["Content-Range"] = f"bytes {start}-{stop - 1}/{size}"
+    headers["Content-Length"] = str(stop - start)
+
+    if async_body and not info.flag_bits & 0x1 and info.compress_type in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+        request.environ[ASYNC_BODY_KEY] = MemberBody(
+            url, insecure, auth, info, start, stop, inflate=info.compress_type == zipfile.ZIP_DEFLATED)
+        return Response(_stream_zip_file(url, name, insecure, auth, zip_password, start, stop),
+                        status=status, headers=headers, mimetype=mimetype)
+
+    # We peek at the first chunk to see if a password error occurs before sending headers
+    stream_generator = iter(_stream_zip_file(url, name, insecure, auth, zip_password, start, stop))
+    try:
+        first_chunk = next(stream_generator)
+    except StopIteration: # Handles empty files
+        first_chunk = b''
+    except RuntimeError as e:
+        if "password" in str(e):
+            return "<strong>Error:</strong> This file is encrypted and the password is missing or incorrect. Please provide the correct password in the main form and try again.", 401
+        raise e
+
+    def combined_stream():
+        yield first_chunk
+        yield from stream_generator
+
+    return Response(combined_stream(), status=status, headers=headers, mimetype=mimetype)
+
+# --- Text preview ---
+# Previews are served one window at a time. Windows are aligned to whole lines and
+# cached per archive version, member and window, so paging back and forth is free.
+PREVIEW_LENGTH = 100 * 1024          # Bytes per window when no length is given
+PREVIEW_MAX_LENGTH = 1024 * 1024     # Largest window a client may ask for
+PREVIEW_CACHE_BYTES = 32 * 1024 * 1024
+PREVIEW_CACHE_TTL = 300
+
+preview_cache = TTLCache(maxsize=PREVIEW_CACHE_BYTES, ttl=PREVIEW_CACHE_TTL,
+                         getsizeof=lambda window: len(window["text"]) + 256)
+preview_cache_lock = threading.Lock()
+
+PREVIEW_HTML = """
+<h3>Preview of {{ window.name }}</h3>
+<p>
+  {% if window.prev_offset is not none %}<a href="{{ link(offset=window.prev_offset) }}">Previous</a> |{% endif %}
+  Bytes {{ window.offset }}-{{ window.end }} of {{ window.size }}
+  {% if window.next_offset is not none %}| <a href="{{ link(offset=window.next_offset) }}">Next</a>{% endif %}
+  | <a href="{{ link(tail=100) }}">Last lines</a>
+</p>
+<pre>{{ window.text }}</pre>
+"""
+
+def _decode_preview(data):
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        return data.decode("latin-1", errors="replace")
+
+def read_preview(url, name, insecure, auth=None, zip_password=None, offset=0, length=PREVIEW_LENGTH, tail=None):
+    """
+    Returns one line-aligned window of a member as a dict with its text and the offsets
+    of the neighbouring windows. The window starts at the first line beginning at or
+    after offset and ends at the last line break within length bytes; with tail, it
+    holds the last `tail` lines instead. Raises KeyError if the member is missing.
+    """
+    info, validators = _member_info(url, name, insecure, auth)
+    etag, _ = _member_validators(info, validators)
+    key = (url, insecure, _credential_fingerprint(auth), name, etag, offset, length, tail)
+    with preview_cache_lock:
+        window = preview_cache.get(key)
+    record_cache("preview", "miss" if window is None else "hit", url)
+    if window is not None:
+        return window
+
+    pwd = zip_password.encode('utf-8') if zip_password else None
+    size = info.file_size
+    with get_zip_context(url, insecure, auth) as zf:
+        def read(start, stop):
+            return b"".join(_iter_member_range(zf, info, pwd, start, stop))
+
+        if tail is not None:
+            start = max(size - length, 0)
+            lines = read(start, size).splitlines(keepends=True)
+            if start > 0 and lines:
+                lines = lines[1:]  # The first line may have started before the window
+            data = b"".join(lines[-tail:] if tail > 0 else [])
+            start = size - len(data)
+        else:
+            start = min(offset, size)
+            # One byte before the window tells whether it starts at a line boundary.
+            before = max(start - 1, 0)
+            data = read(before, min(start + length, size))
+            if start > 0:
+                skip = 0 if data[:1] == b"\n" else data.find(b"\n")
+                if skip != -1:
+                    start = before + skip + 1
+                data = data[start - before:]
+            if start + len(data) < size:
+                cut = data.rfind(b"\n")
+                if cut != -1:
+                    data = data[:cut + 1]
+    end = start + len(data)
+
+    window = {
+        "name": name,
+        "size": size,
+        "offset": start,
+        "end": end,
+        "text": _decode_preview(data),
+        "prev_offset": max(start - length, 0) if start > 0 else None,
+        "next_offset": end if end < size else None,
+    }
+    with preview_cache_lock:
+        try:
+            preview_cache[key] = window
+        except ValueError:
+            pass  # Larger than the whole cache
+    return window
+
+def _preview_args():
+    """Parses offset, length and tail from the query string. Raises ValueError if invalid."""
+    offset = max(int(request.args.get("offset", 0)), 0)
+    length = min(max(int(request.args.get("length", PREVIEW_LENGTH)), 1), PREVIEW_MAX_LENGTH)
+    tail = request.args.get("tail")
+    return offset, length, max(int(tail), 0) if tail is not None else None
+
+@route("/preview")
+@with_remote_zip
+def preview_file(url, name, insecure, auth, zip_password):
+    """Shows one window of a text member: ?offset=...&length=... or ?tail=N (lines)."""
+    try:
+        offset, length, tail = _preview_args()
+    except ValueError:
+        abort(400, "Invalid 'offset', 'length' or 'tail' parameter.")
+    try:
+        window = read_preview(url, name, insecure, auth, zip_password, offset, length, tail)
+    except KeyError:
+        abort(404, f"File '{name}' not found in the archive.")
+    except RuntimeError as e:
+        if "password" in str(e):
+            return "<strong>Error:</strong> This file is encrypted. Please provide a password in the main form and try again.", 401
+        raise e
+
+    def link(**params):
+        query = {"url": url, "name": name, "length": length, **params}
+        if insecure:
+            query["no_verify"] = "on"
+        return url_for("preview_file", **query)
+    with timed('render'):
+        return render_template_string(PREVIEW_HTML, window=window, link=link)
+
+@route("/api/preview")
+@with_remote_zip
+def api_preview(url, name, insecure, auth, zip_password):
+    """Returns one window of a text member as JSON: ?offset=...&length=... or ?tail=N (lines)."""
+    try:
+        offset, length, tail = _preview_args()
+    except ValueError:
+        return {"error": "Invalid 'offset', 'length' or 'tail' parameter."}, 400
+    try:
+        return read_preview(url, name, insecure, auth, zip_password, offset, length, tail)
+    except KeyError:
+        return {"error": f"File '{name}' not found in the archive."}, 404
+    except RuntimeError as e:
+        if "password" in str(e):
+            return {"error": "This file is encrypted. Please provide a password."}, 401
+        return {"error": str(e)}, 500
+
+@route("/image")
+@with_remote_zip
+def preview_image(url, name, insecure, auth, zip_password):
+    mime, _ = mimetypes.guess_type(name)
+    return _member_response(url, name, insecure, auth, zip_password, mime or "application/octet-stream")
+
+@route("/file")
+@with_remote_zip
+def download_file(url, name, insecure, auth, zip_password):
+    headers = {"Content-Disposition": f'attachment; filename="{Path(name).name}"'}
+    return _member_response(url, name, insecure, auth, zip_password, "application/octet-stream", headers)
+
+@route("/folder")
+@with_remote_zip
+def download_folder(url, name, insecure, auth, zip_password):
+    """Streams a folder of the archive (or the whole archive for '/') as a new ZIP file."""
+    folder = name.strip('/')
+    prefix = folder + '/' if folder else ''
+    # Entries are stored relative to the folder's parent, so the ZIP unpacks into the folder itself.
+    parent = prefix[:prefix.rstrip('/').rfind('/') + 1] if folder else ''
+
+    with get_zip_context(url, insecure, auth) as zf:
+        members = [(info, info.filename[len(parent):]) for info in zf.infolist()
+                   if info.filename.startswith(prefix) and info.filename != prefix]
+    if not members:
+        abort(404, f"Folder '{name}' not found in the archive.")
+    writer = ZipStreamWriter(members)
+
+    def generate():
+        try:
+            with get_zip_context(url, insecure, auth) as zf:
+                yield from writer.stream(zf)
+        except Exception as e:
+            logger.error(f"Error exporting folder '{name}' from url {url}: {e}")
+
+    archive_name = Path(folder).name or Path(url).stem or "archive"
+    headers = {
+        "Content-Disposition": f'attachment; filename="{archive_name}.zip"',
+        "Content-Length": str(writer.size),
+    }
+    return Response(generate(), headers=headers, mimetype="application/zip")
+
+# --- Async range reads and ASGI entry point ---
+# Under an ASGI server (e.g. `uvicorn remote_zip_viewer:asgi_app`) member bodies are
+# streamed by an asyncio HTTP/1.1 client instead of a blocking thread per download.
+# Each chunk is only read from upstream after the previous one was handed to the
+# client, so a slow client slows the upstream read down rather than filling memory.
+# Everything else, including the headers and status of member responses, still comes
+# from the Flask app, which runs in a worker thread. asyncio is imported where it is
+# used, so CLI runs don't load it.
+ASYNC_BODY_KEY = 'remote_zip.member_body'  # WSGI environ key through which a view hands over its body
+ASYNC_CONNECTIONS_PER_ORIGIN = 16   # Upstream connections in use at once per origin; more requests wait
+ASYNC_IDLE_TIMEOUT = 30             # Seconds an idle keep-alive connection is kept
+ASYNC_READ_SIZE = 64 * 1024         # Bytes read from upstream per chunk
+ASYNC_MAX_REDIRECTS = 5
+
+class MemberBody:
+    """
+    The body of a member response as a range of the archive: the bytes [start, stop) of
+    a STORED member (or of the raw data, when inflate is False), or the uncompressed
+    bytes [start, stop) of a DEFLATE member. prefix and suffix are sent around it.
+    """
+    __slots__ = ('url', 'insecure', 'auth', 'info', 'start', 'stop', 'inflate', 'prefix', 'suffix')
+
+    def __init__(self, url, insecure, auth, info, start, stop, inflate, prefix=b'', suffix=b''):
+        self.url = url
+        self.insecure = insecure
+        self.auth = auth
+        self.info = info
+        self.start = start
+        self.stop = stop
+        self.inflate = inflate
+        self.prefix = prefix
+        self.suffix = suffix
+
+    def prepare(self):
+        """
+        Returns the archive offset of the member data and, for DEFLATE members, a
+        RangeInflater. Blocking; the local header is usually cached.
+        """
+        with get_zip_context(self.url, self.insecure, self.auth) as zf:
+            data_offset = _member_data_offset(zf, self.info)
+            inflater = _range_inflater(zf, self.info, self.start, self.stop) if self.inflate else None
+        return data_offset, inflater
+
+    async def stream(self, client):
+        """Yields the body, reading the archive through an AsyncRangeClient."""
+        import asyncio
+        data_offset, inflater = await asyncio.to_thread(self.prepare)
+        if self.prefix:
+            yield self.prefix
+        if inflater is None:
+            start, stop = self.start, self.stop
+        else:
+            start, stop = inflater.compressed_start, inflater.compressed_stop
+        upstream = self._upstream(client, data_offset + start, data_offset + stop)
+        try:
+            async for chunk in upstream:
+                if inflater is None:
+                    yield chunk
+                    continue
+                for piece in inflater.feed(chunk):
+                    yield piece
+                if inflater.done:
+                    break
+            else:
+                if inflater is not None:
+                    for piece in inflater.finish():
+                        yield piece
+        finally:
+            await upstream.aclose()
+        if self.suffix:
+            yield self.suffix
+
+    async def _upstream(self, client, start, stop):
+        """
+        Yields the archive bytes [start, stop). Like get_zip_context, a certificate
+        verification failure is retried once with verification disabled.
+        """
+        import ssl
+        upstream = client.stream(self.url, start, stop, verify=not self.insecure, auth=self.auth)
+        sent = False
+        try:
+            async for chunk in upstream:
+                sent = True
+                yield chunk
+        except ssl.SSLCertVerificationError:
+            if self.insecure or sent:
+                raise
+            logger.warning("SSL certificate verification failed. Retrying automatically with verification disabled.")
+            retry = client.stream(self.url, start, stop, verify=False, auth=self.auth)
+            try:
+                async for chunk in retry:
+                    yield chunk
+            finally:
+                await retry.aclose()
+        finally:
+            await upstream.aclose()
+
+class AsyncRangeClient:
+    """
+    A small asyncio HTTP/1.1 client for range requests, with a keep-alive pool per origin
+    (scheme, host, port and verify setting). At most `limit` connections per origin are
+    in use at once. A client belongs to one event loop; use AsyncRangeClient.current().
+    """
+    _clients = weakref.WeakKeyDictionary()
+
+    def __init__(self, limit=ASYNC_CONNECTIONS_PER_ORIGIN, idle_timeout=ASYNC_IDLE_TIMEOUT):
+        self.limit = limit
+        self.idle_timeout = idle_timeout
+        self._idle = {}
+        self._slots = {}
+
+    @classmethod
+    def current(cls):
+        """Returns the client of the running event loop."""
+        import asyncio
+        loop = asyncio.get_running_loop()
+        client = cls._clients.get(loop)
+        if client is None:
+            client = cls._clients[loop] = cls()
+        return client
+
+    @staticmethod
+    def _origin(url, verify):
+        from urllib.parse import urlsplit
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+            raise RemoteIOError(f"Unsupported URL scheme '{parts.scheme}'")
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        return parts.scheme, parts.hostname, port, bool(verify)
+
+    async def _connect(self, origin):
+        import asyncio
+        import ssl
+        scheme, host, port, verify = origin
+        context = None
+        if scheme == 'https':
+            context = ssl.create_default_context()
+            if not verify:
+                context.check_hostname = False
+                context.verify_mode = ssl.CERT_NONE
+        return await asyncio.open_connection(host, port, ssl=context, limit=ASYNC_READ_SIZE)
+
+    def _checkout(self, origin):
+        """Returns an idle connection to the origin, or None."""
+        idle = self._idle.get(origin)
+        now = time.monotonic()
+        while idle:
+            reader, writer, since = idle.pop()
+            if now - since <= self.idle_timeout and not reader.at_eof() and not writer.is_closing():
+                return reader, writer
+            writer.close()
+        return None
+
+    def _checkin(self, origin, reader, writer):
+        self._idle.setdefault(origin, []).append((reader, writer, time.monotonic()))
+
+    async def close(self):
+        """Closes every idle connection."""
+        for idle in self._idle.values():
+            for _, writer, _ in idle:
+                writer.close()
+        self._idle.clear()
+
+    @staticmethod
+    def _request_head(url, start, stop, auth, headers):
+        import base64
+        from urllib.parse import urlsplit
+        parts = urlsplit(url)
+        target = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+        lines = [f"GET {target} HTTP/1.1", f"Host: {parts.netloc.rpartition('@')[2]}",
+                 f"Range: bytes={start}-{stop - 1}", "Connection: keep-alive", "Accept-Encoding: identity"]
+        if auth:
+            token = base64.b64encode(f"{auth[0]}:{auth[1]}".encode('utf-8')).decode('ascii')
+            lines.append(f"Authorization: Basic {token}")
+        lines.extend(f"{name}: {value}" for name, value in (headers or {}).items())
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+    @staticmethod
+    async def _read_head(reader):
+        """Reads a response's status line and headers; returns (version, status, {lowercase name: value})."""
+        head = await reader.readuntil(b'\r\n\r\n')
+        status_line, *header_lines = head.decode('latin-1').split('\r\n')
+        version, status = status_line.split(' ', 2)[:2]
+        headers = {}
+        for line in header_lines:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+        return version, int(status), headers
+
+    @staticmethod
+    async def _read_body(reader, headers):
+        """Yields a response body framed by Content-Length or chunked encoding."""
+        import asyncio
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            while True:
+                size = int((await reader.readuntil(b'\r\n')).split(b';', 1)[0], 16)
+                if size == 0:
+                    # Skip any trailer fields up to the final empty line.
+                    while await reader.readuntil(b'\r\n') != b'\r\n':
+                        pass
+                    return
+                while size > 0:
+                    chunk = await reader.read(min(size, ASYNC_READ_SIZE))
+                    if not chunk:
+                        raise asyncio.IncompleteReadError(b'', size)
+                    size -= len(chunk)
+                    yield chunk
+                await reader.readexactly(2)
+        elif 'content-length' in headers:
+            remaining = int(headers['content-length'])
+            while remaining > 0:
+                chunk = await reader.read(min(remaining, ASYNC_READ_SIZE))
+                if not chunk:
+                    raise asyncio.IncompleteReadError(b'', remaining)
+                remaining -= len(chunk)
+                yield chunk
+        else:
+            while chunk := await reader.read(ASYNC_READ_SIZE):
+                yield chunk
+
+    async def stream(self, url, start, stop, verify=True, auth=None, headers=None):
+        """Yields the bytes [start, stop) of a remote file, read with one range request."""
+        import asyncio
+        from urllib.parse import urljoin
+        if stop <= start:
+            return
+        for _ in range(ASYNC_MAX_REDIRECTS + 1):
+            origin = self._origin(url, verify)
+            slots = self._slots.get(origin)
+            if slots is None:
+                slots = self._slots[origin] = asyncio.Semaphore(self.limit)
+            async with slots:
+                request_head = self._request_head(url, start, stop, auth, headers)
+                connection = self._checkout(origin)
+                while True:
+                    reused = connection is not None
+                    reader, writer = connection or await self._connect(origin)
+                    try:
+                        started = time.perf_counter()
+                        writer.write(request_head)
+                        await writer.drain()
+                        version, status, response_headers = await self._read_head(reader)
+                        length = response_headers.get('content-length', '')
+                        record_upstream(url, 'GET', status, int(length) if length.isdigit() else 0,
+                                        time.perf_counter() - started)
+                        break
+                    except (ConnectionError, asyncio.IncompleteReadError):
+                        writer.close()
+                        if not reused:
+                            raise
+                        # The server dropped the idle connection; retry on a new one.
+                        connection = None
+
+                keep_alive = (response_headers.get('connection', '').lower() != 'close'
+                              and (version == 'HTTP/1.1' or response_headers.get('connection', '').lower() == 'keep-alive')
+                              and ('content-length' in response_headers
+                                   or response_headers.get('transfer-encoding', '').lower() == 'chunked'))
+                finished = False
+                try:
+                    if status in (301, 302, 303, 307, 308) and 'location' in response_headers:
+                        async for _ in self._read_body(reader, response_headers):
+                            pass
+                        finished = True
+                        location = urljoin(url, response_headers['location'])
+                        if self._origin(location, verify) != origin:
+                            # Like requests, credentials are not sent on to another origin.
+                            auth = None
+                        url = location
+                        continue
+                    if status != 206:
+                        raise RemoteIOError(f"Expected a partial response from {url}, got HTTP {status}")
+                    async for chunk in self._read_body(reader, response_headers):
+                        yield chunk
+                    finished = True
+                    return
+                finally:
+                    if finished and keep_alive:
+                        self._checkin(origin, reader, writer)
+                    else:
+                        writer.close()
+        raise RemoteIOError(f"Too many redirects for {url}")
+
+def _wsgi_environ(scope, body):
+    """Builds the WSGI environ of an ASGI HTTP request."""
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            environ[name] = value
+        else:
+            key = f'HTTP_{name}'
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+async def asgi_app(scope, receive, send):
+    """
+    ASGI entry point. Requests are handled by the Flask app in a worker thread; member
+    bodies it hands over through ASYNC_BODY_KEY are streamed with the async range client.
+    """
+    import asyncio
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await AsyncRangeClient.current().close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    if scope['type'] != 'http':
+        return
+
+    body = bytearray()
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            break
+    environ = _wsgi_environ(scope, bytes(body))
+    environ[ASYNC_BODY_KEY] = None
+    started = []
+
+    def start_response(status, headers, exc_info=None):
+        started[:] = [int(status.split(' ', 1)[0]), headers]
+        return lambda data: None
+
+    result = await asyncio.to_thread(get_app(), environ, start_response)
+    # The timer was set in the worker's copy of the context; phases of the body count towards it too.
+    _request_timer.set(environ.get(METRICS_TIMER_KEY))
+    try:
+        status, headers = started
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+        })
+        member_body = environ[ASYNC_BODY_KEY]
+        if member_body is not None and scope['method'] != 'HEAD':
+            stream = member_body.stream(AsyncRangeClient.current())
+            try:
+                async for chunk in stream:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            except Exception as e:
+                logger.error(f"Error streaming '{member_body.info.filename}' from url {member_body.url}: {e}")
+            finally:
+                await stream.aclose()
+        else:
+            chunks = iter(result)
+            while (chunk := await asyncio.to_thread(next, chunks, None)) is not None:
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+
+PARTIAL_SUFFIX = ".part"   # Interrupted -g downloads are kept as <output>.part, described by <output>.part.json
+
+def _partial_state(info, validators, raw):
+    """What a partial download must match to be resumed: the member and the archive version it came from."""
+    return {
+        "name": info.filename,
+        "crc": info.CRC,
+        "file_size": info.file_size,
+        "compress_size": info.compress_size,
+        "header_offset": info.header_offset,
+        "validators": {key: validators.get(key) for key in ('etag', 'last_modified', 'size')},
+        "raw": raw,
+    }
+
+def _resume_offset(part, state_path, state):
+    """
+    Returns how many bytes of an existing partial download can be kept, or 0 if there is
+    none or it was written from a different member or a different version of the archive.
+    """
+    import json
+    try:
+        saved = json.loads(state_path.read_text())
+        size = part.stat().st_size
+    except (OSError, ValueError):
+        return 0
+    validators = saved.pop("validators", None) or {}
+    if saved != {key: value for key, value in state.items() if key != "validators"}:
+        return 0
+    if not _validators_match(validators, state["validators"]):
+        return 0
+    limit = state["compress_size"] if state["raw"] else state["file_size"]
+    return size if size <= limit else 0
+
+def _file_crc(path):
+    crc = 0
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+def _cli_download(file_in_zip, url, output_path, insecure, auth, create_dirs, log=print):
+    """
+    Handles the command-line download operation with progress display, written through
+    `log`. Returns a summary dict, with an "error" key if the download failed.
+    The download goes to <output>.part and can be resumed after an interruption: STORED
+    members continue from the partial file's size, compressed members are fetched raw
+    (resuming the same way) and inflated locally once complete. The result is checked
+    against the CRC-32 from the central directory before it replaces the output.
+    """
+    import json
+    import shutil
+
+    if is_local_path(url):
+        log(f"Getting content of local file stored at {url}")
+    else:
+        log(f"Connecting to {url}...")
+    output = Path(output_path)
+
+    if output.is_dir():
+        output = output / Path(file_in_zip).name
+
+    # If create_dirs is specified, create the full path
+    if create_dirs:
+        output = Path(output_path) / file_in_zip
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    part = output.with_name(output.name + PARTIAL_SUFFIX)
+    state_path = part.with_name(part.name + ".json")
+
+    try:
+        with get_zip_context(url, insecure, auth) as zf:
+            try:
+                log(f"Searching for '{file_in_zip}' in archive...")
+                info = zf.getinfo(file_in_zip)
+            except KeyError:
+                log(f"Error: File '{file_in_zip}' not found in the remote archive.")
+                return {"error": f"File '{file_in_zip}' not found in the archive"}
+            if info.flag_bits & 0x1:
+                # The CLI takes no zip password, so fail now rather than after the whole download.
+                log(f"Error: File '{file_in_zip}' is encrypted, which the command line doesn't support.")
+                return {"error": f"File '{file_in_zip}' is encrypted"}
+
+            # Compressed members are fetched as raw data, which can be resumed at any byte.
+            raw = info.compress_type != zipfile.ZIP_STORED
+            total_size = info.compress_size if raw else info.file_size
+            state = _partial_state(info, _archive_validators(zf, url), raw)
+            downloaded_bytes = _resume_offset(part, state_path, state)
+            if downloaded_bytes:
+                log(f"Resuming '{file_in_zip}' at {format_bytes(downloaded_bytes)} of {format_bytes(total_size)}...")
+            else:
+                # The state is written first, so a partial file without it is never trusted.
+                tmp_state = state_path.with_name(state_path.name + ".tmp")
+                tmp_state.write_text(json.dumps(state))
+                os.replace(tmp_state, state_path)
+            log(f"Downloading '{file_in_zip}' ({info.file_size} bytes) to '{output}'...")
+
+            if raw:
+                data_offset = _member_data_offset(zf, info)
+                chunks = _iter_archive_range(zf, data_offset + downloaded_bytes, data_offset + total_size)
+            else:
+                chunks = _iter_member_range(zf, info, None, downloaded_bytes, total_size)
+
+            resumed_bytes = downloaded_bytes
+            start_time = time.time()
+
+            with closing(chunks), open(part, "ab" if downloaded_bytes else "wb") as target:
+                for chunk in chunks:
+                    target.write(chunk)
+                    downloaded_bytes += len(chunk)
+
+                    elapsed_time = time.time() - start_time
+                    speed = (downloaded_bytes - resumed_bytes) / elapsed_time if elapsed_time > 0 else 0
+                    speed_mbps = (speed * 8) / (1024 * 1024)
+                    
+                    percent = (downloaded_bytes / total_size) * 100 if total_size > 0 else 100
+                    
+                    progress_bar = f"[{'=' * int(percent / 2):<50}]"
+                    
+                    # Use \r to return to the beginning of the line
+                    log(f"\r{progress_bar} {percent:.1f}% - {downloaded_bytes/1024/1024:.2f}MB - {speed_mbps:.2f} Mbps", end="")
+
+        if downloaded_bytes < total_size:
+            raise RemoteIOError(f"The download stopped at {downloaded_bytes} of {total_size} bytes; run the command again to resume.")
+        inflating = output.with_name(output.name + ".inflating")
+        try:
+            if raw:
+                log("\nInflating and verifying...", end="")
+                with open(part, "rb") as source_file, zipfile.ZipExtFile(source_file, 'r', info) as source, \
+                        open(inflating, "wb") as target:
+                    shutil.copyfileobj(source, target, 1024 * 1024)
+                os.replace(inflating, output)
+                part.unlink()
+            else:
+                if _file_crc(part) != info.CRC:
+                    raise zipfile.BadZipFile(f"Bad CRC-32 for file '{info.filename}'")
+                os.replace(part, output)
+        except (zipfile.BadZipFile, zlib.error, EOFError):
+            # The partial data is corrupt (bad CRC, bad or truncated DEFLATE stream),
+            # so resuming from it would fail again.
+            inflating.unlink(missing_ok=True)
+            part.unlink(missing_ok=True)
+            state_path.unlink(missing_ok=True)
+            raise
+        state_path.unlink(missing_ok=True)
+
+        # Print a newline at the end
+        log("\nDownload complete.")
+        return {"output": str(output), "bytes": info.file_size, "resumed_from": resumed_bytes}
+
+    except Exception as e:
+        log(f"An error occurred: {e}")
+        return {"error": str(e)}
+
+class _FolderProgress:
+    """Thread-safe aggregate progress and throughput display for folder downloads."""
+
+    def __init__(self, total_files, total_bytes, log=print):
+        self.total_files = total_files
+        self.total_bytes = total_bytes
+        self.done_files = 0
+        self.done_bytes = 0
+        self.failed_files = 0
+        self._start = time.time()
+        self._last_print = 0
+        self._log = log
+        self._lock = threading.Lock()
+
+    def add_bytes(self, count):
+        with self._lock:
+            self.done_bytes += count
+            self._print()
+
+    def file_finished(self, failed=False):
+        with self._lock:
+            if failed:
+                self.failed_files += 1
+            else:
+                self.done_files += 1
+            self._print(force=True)
+
+    def _print(self, force=False):
+        now = time.time()
+        if not force and now - self._last_print < 0.1:
+            return
+        self._last_print = now
+        elapsed = now - self._start
+        speed_mbps = (self.done_bytes / elapsed * 8) / (1024 * 1024) if elapsed > 0 else 0
+        percent = (self.done_bytes / self.total_bytes) * 100 if self.total_bytes > 0 else 100
+        failed = f" ({self.failed_files} failed)" if self.failed_files else ""
+        self._log(f"\r[{self.done_files}/{self.total_files} files{failed}] {percent:.1f}% - "
+              f"{self.done_bytes/1024/1024:.2f}MB of {self.total_bytes/1024/1024:.2f}MB - {speed_mbps:.2f} Mbps",
+              end="", flush=True)
+
+DOWNLOAD_RETRIES = 3       # Attempts per file before it is reported as failed
+DOWNLOAD_RETRY_DELAY = 1   # Seconds before the first retry; doubles on every attempt
+DOWNLOAD_RETRY_ERRORS = (requests.RequestException, RemoteIOError, OSError)  # Others fail at once
+
+def _encrypted_failure(info, progress):
+    """Fails an encrypted member up front; folder downloads have no password to open it with."""
+    progress.file_finished(failed=True)
+    return [(info.filename, RuntimeError(f"File '{info.filename}' is encrypted"))]
+
+def _download_member(url, insecure, auth, session, info, output_base, progress, pipeline=None):
+    """
+    Downloads one archive member to disk, retrying transient failures. The file only
+    appears under its name once it is complete.
+    With a pipeline, members it wants are fetched whole and inflated by its workers.
+    Returns a list of (filename, error) failures.
+    """
+    file_output_path = output_base / info.filename
+    if info.flag_bits & 0x1:
+        return _encrypted_failure(info, progress)
+    if pipeline is not None and pipeline.wants(info):
+        for attempt in range(1, DOWNLOAD_RETRIES + 1):
+            try:
+                with get_zip_context(url, insecure, auth, session=session) as zf:
+                    raw = read_archive_range(zf, _member_data_offset(zf, info), info.compress_size)
+                break
+            except Exception as e:
+                if attempt == DOWNLOAD_RETRIES or not isinstance(e, DOWNLOAD_RETRY_ERRORS):
+                    progress.file_finished(failed=True)
+                    return [(info.filename, e)]
+                time.sleep(DOWNLOAD_RETRY_DELAY * 2 ** (attempt - 1))
+        pipeline.submit(raw, info, file_output_path)
+        return []
+
+    for attempt in range(1, DOWNLOAD_RETRIES + 1):
+        written = 0
+        try:
+            with get_zip_context(url, insecure, auth, session=session) as zf:
+                with zf.open(info) as source, _replacing(file_output_path) as target:
+                    while True:
+                        chunk = source.read(64 * 1024)
+                        if not chunk:
+                            break
+                        target.write(chunk)
+                        written += len(chunk)
+                        progress.add_bytes(len(chunk))
+            progress.file_finished()
+            return []
+        except Exception as e:
+            progress.add_bytes(-written)
+            if attempt == DOWNLOAD_RETRIES or not isinstance(e, DOWNLOAD_RETRY_ERRORS):
+                progress.file_finished(failed=True)
+                return [(info.filename, e)]
+            time.sleep(DOWNLOAD_RETRY_DELAY * 2 ** (attempt - 1))
+
+def _download_group(url, insecure, auth, session, group, output_base, progress, pipeline=None):
+    """
+    Fetches a coalesced RangeGroup with a single range request and writes each of its
+    members, handing the ones the pipeline wants to its workers.
+    Returns a list of (filename, error) failures.
+    """
+    import shutil
+
+    for attempt in range(1, DOWNLOAD_RETRIES + 1):
+        try:
+            with get_zip_context(url, insecure, auth, session=session) as zf:
+                data = read_archive_range(zf, group.start, len(group))
+            break
+        except Exception as e:
+            if attempt == DOWNLOAD_RETRIES or not isinstance(e, DOWNLOAD_RETRY_ERRORS):
+                for _ in group.members:
+                    progress.file_finished(failed=True)
+                return [(info.filename, e) for info in group.members]
+            time.sleep(DOWNLOAD_RETRY_DELAY * 2 ** (attempt - 1))
+
+    failures = []
+    for info in group.members:
+        if info.flag_bits & 0x1:
+            failures.extend(_encrypted_failure(info, progress))
+            continue
+        try:
+            raw = group_member_data(group, data, info)
+            if pipeline is not None and pipeline.wants(info):
+                pipeline.submit(raw, info, output_base / info.filename)
+                continue
+            with zipfile.ZipExtFile(io.BytesIO(raw), 'r', info) as source, \
+                    _replacing(output_base / info.filename) as target:
+                shutil.copyfileobj(source, target, 64 * 1024)
+            progress.add_bytes(info.file_size)
+            progress.file_finished()
+        except Exception as e:
+            failures.append((info.filename, e))
+            progress.file_finished(failed=True)
+    return failures
+
+def _cli_download_folder(folder_path, url, output_path, insecure, auth, jobs=4, processes=0, session=None, log=print,
+                         pipeline=None):
+    """
+    Handles downloading all files within a specified folder in the ZIP.
+    Files are fetched by `jobs` worker threads sharing one keep-alive connection pool,
+    or the given requests session. Large compressed members are inflated by a pool of
+    `processes` worker processes (1 to inflate in the fetching threads; 0 for one per CPU,
+    started only once there is enough compressed data to pay for spawning them), or by
+    the given shared DecompressPipeline.
+    Messages go through `log`. Returns a summary dict, with an "error" key if the
+    download could not start.
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    log(f"Connecting to {url} to download folder '{folder_path}'...")
+    output_base = Path(output_path)
+    jobs = max(1, jobs)
+
+    # Ensure the base output path exists
+    output_base.mkdir(parents=True, exist_ok=True)
+    http_session = session or _make_http_session(jobs)
+
+    try:
+        with get_zip_context(url, insecure, auth, session=http_session) as zf:
+            # Normalize folder path to end with a slash
+            if not folder_path.endswith('/'):
+                folder_path += '/'
+
+            # Find all files that are inside the specified folder_path
+            files_to_download = [
+                info for info in zf.infolist()
+                if info.filename.startswith(folder_path) and not info.is_dir()
+            ]
+            extents = member_extents(zf)
+
+        if not files_to_download:
+            log(f"Error: No files found in folder '{folder_path}' or folder does not exist.")
+            return {"error": f"No files found in folder '{folder_path}'"}
+
+        total_bytes = sum(info.file_size for info in files_to_download)
+        log(f"Found {len(files_to_download)} file(s) to download ({format_bytes(total_bytes)}) using {jobs} job(s).")
+        progress = _FolderProgress(len(files_to_download), total_bytes, log)
+        failures = []
+
+        # This preserves the subdirectory structure relative to the output path
+        for info in files_to_download:
+            (output_base / info.filename).parent.mkdir(parents=True, exist_ok=True)
+
+        # Small, unencrypted neighbours are fetched together; everything else is streamed.
+        small = [info for info in files_to_download
+                 if extents[info.header_offset] <= COALESCE_MEMBER_LIMIT and not info.flag_bits & 0x1]
+        small_offsets = {info.header_offset for info in small}
+        large = [info for info in files_to_download if info.header_offset not in small_offsets]
+        groups = plan_ranges(small, extents)
+
+        def extracted(info, error):
+            if error is None:
+                progress.add_bytes(info.file_size)
+                progress.file_finished()
+            else:
+                failures.append((info.filename, error))
+                progress.file_finished(failed=True)
+
+        own_pipeline = bound = None
+        if DecompressPipeline.worthwhile(files_to_download, processes):
+            if pipeline is None:
+                pipeline = own_pipeline = DecompressPipeline(processes)
+            bound = pipeline.bind(extracted)
+        try:
+            with ThreadPoolExecutor(max_workers=jobs) as executor:
+                futures = [executor.submit(_download_group, url, insecure, auth, http_session,
+                                           group, output_base, progress, bound) for group in groups]
+                futures += [executor.submit(_download_member, url, insecure, auth, http_session,
+                                            info, output_base, progress, bound) for info in large]
+                for future in as_completed(futures):
+                    failures.extend(future.result())
+        finally:
+            if bound is not None:
+                bound.wait()
+            if own_pipeline is not None:
+                own_pipeline.close()
+
+        if failures:
+            log(f"\n{len(failures)} file(s) could not be downloaded:")
+            for filename, error in failures:
+                log(f"  {filename}: {error}")
+        else:
+            log("\nFolder download complete.")
+        return {
+            "output": str(output_base),
+            "files": progress.done_files,
+            "bytes": progress.done_bytes,
+            "failed": [{"name": filename, "error": str(error)} for filename, error in failures],
+        }
+
+    except Exception as e:
+        log(f"An error occurred: {e}")
+        return {"error": str(e)}
+    finally:
+        if session is None:
+            http_session.close()
+
+def _cli_stream_to_console(file_in_zip, url, insecure, auth):
+    """Handles streaming a file's content directly to standard output."""
+    import sys
+    try:
+        # Write directly to the stdout buffer to handle binary data
+        for chunk in _stream_zip_file(url, file_in_zip, insecure, auth):
+            sys.stdout.buffer.write(chunk)
+    except Exception as e:
+        print(f"An error occurred: {e}", file=sys.stderr)
+
+def _list_filenames(url, list_path, no_subdirs, insecure, auth):
+    """Returns the sorted file names of an archive under list_path, optionally without subfolders."""
+    with get_zip_context(url, insecure, auth) as zf:
+        all_files = [info.filename for info in zf.infolist() if not info.is_dir()]
+
+    if list_path:
+        # Normalize list_path to ensure it's treated as a directory
+        if not list_path.endswith('/'):
+            list_path += '/'
+        
+        # Filter files that are directly within the list_path
+        if no_subdirs:
+            # Show only files directly in list_path, no deeper
+            files_to_show = [f for f in all_files if f.startswith(list_path) and '/' not in f[len(list_path):]]
+        else:
+            # Show all files and subdirs under list_path
+            files_to_show = [f for f in all_files if f.startswith(list_path)]
+    else:
+        # Listing from the root
+        if no_subdirs:
+            # Show only files in the root
+            files_to_show = [f for f in all_files if '/' not in f]
+        else:
+            # Show all files
+            files_to_show = all_files
+    return sorted(files_to_show)
+
+def _cli_list_files(url, list_path, no_subdirs, insecure, auth, fmt=None):
+    """
+    Lists files and directories from the remote ZIP. With a format, every entry is
+    streamed to stdout as it is parsed, unsorted and without any other output.
+    """
+    if fmt:
+        try:
+            for line in format_listing(iter_listing(url, list_path, no_subdirs, insecure, auth), fmt):
+                sys.stdout.write(line)
+            sys.stdout.flush()
+        except BrokenPipeError:
+            # The reader (e.g. `head`) went away; silence the error Python reports at exit.
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        except Exception as e:
+            print(f"An error occurred: {e}", file=sys.stderr)
+        return
+    print(f"Fetching file list from {url}...")
+    try:
+        files_to_show = _list_filenames(url, list_path, no_subdirs, insecure, auth)
+        print("\nContents:")
+        for filename in files_to_show:
             print(filename)
     except Exception as e:
         print(f"An error occurred: {e}")
 
-def main():
-    """Main function to run the web server or handle CLI commands."""
+def _cli_grep(url, pattern, select, insecure, auth, ignore_case=False, fixed=False, context=0,
+              max_matches=GREP_MATCHES, max_bytes=GREP_MAX_BYTES, jobs=GREP_JOBS, processes=0):
+    """
+    Prints the lines of members under select (a folder or glob) that match pattern, as
+    path:line:text with path-line-text context lines, like grep. Returns grep's exit
+    status: 0 if something matched, 1 if nothing did, 2 on errors.
+    """
+    http_session = _make_http_session(jobs)
+    try:
+        search = ContentSearch(url, pattern, select, insecure, auth, None, ignore_case, fixed, context,
+                               max_matches, max_bytes, jobs, processes, http_session)
+        for result in search.results():
+            for match in result["matches"]:
+                if context:
+                    print("--")
+                first = match["line"] - len(match["before"])
+                for number, text in enumerate(match["before"], first):
+                    print(f"{result['path']}-{number}-{text}")
+                print(f"{result['path']}:{match['line']}:{match['text']}")
+                for number, text in enumerate(match["after"], match["line"] + 1):
+                    print(f"{result['path']}-{number}-{text}")
+    except Exception as e:
+        print(f"An error occurred: {e}", file=sys.stderr)
+        return 2
+    finally:
+        http_session.close()
+
+    for path, error in search.errors:
+        print(f"Could not search '{path}': {error}", file=sys.stderr)
+    if search.truncated:
+        reason = f"{search.max_matches} matches" if search.truncated == "matches" else f"{format_bytes(max_bytes)} scanned"
+        print(f"Stopped after {reason} ({search.members_scanned} file(s), {format_bytes(search.bytes_scanned)}).",
+              file=sys.stderr)
+    if search.errors:
+        return 2
+    return 0 if search.matches else 1
+
+# --- Batch mode ---
+# A manifest of jobs runs in one process, so every job shares the session pool, the
+# archive pool, the caches and the disk index. Each manifest line is either a JSON
+# object or whitespace-separated fields: url action [path] [output]. Blank lines and
+# lines starting with '#' are skipped. One NDJSON result is written per job.
+BATCH_ACTIONS = ("list", "get", "get-dir")
+BATCH_JOBS = 8          # Jobs run at once
+BATCH_PER_ORIGIN = 4    # Jobs run at once against the same scheme and host
+
+def _parse_batch_line(line):
+    """Returns the job of a manifest line as a dict, or None for blank and comment lines. Raises ValueError."""
+    import json
+    line = line.strip()
+    if not line or line.startswith('#'):
+        return None
+    if line.startswith('{'):
+        job = json.loads(line)
+        if not isinstance(job, dict):
+            raise ValueError("A JSON job must be an object")
+    else:
+        job = dict(zip(("url", "action", "path", "output"), line.split()))
+    job.setdefault("action", "list")
+    if not job.get("url"):
+        raise ValueError("The job has no url")
+    if job["action"] not in BATCH_ACTIONS:
+        raise ValueError(f"Unknown action '{job['action']}'; expected one of {', '.join(BATCH_ACTIONS)}")
+    if job["action"] != "list" and not job.get("path"):
+        raise ValueError(f"The '{job['action']}' action needs a path")
+    return job
+
+def _batch_origin(url):
+    from urllib.parse import urlsplit
+    parts = urlsplit(url)
+    return (parts.scheme.lower(), parts.netloc.rpartition('@')[2].lower()) if parts.netloc else ('file', '')
+
+def _run_batch_job(job, insecure, auth, processes, pipeline=None):
+    """
+    Runs one manifest job quietly and returns its result fields, with an "error" key
+    if it failed. get-dir jobs inflate through the batch's shared pipeline.
+    """
+    def quiet(*args, **kwargs):
+        pass
+
+    url, action, path, output = job["url"], job["action"], job.get("path"), job.get("output")
+    if action == "list":
+        names = _list_filenames(url, path, False, insecure, auth)
+        if not output:
+            return {"files": len(names), "entries": names}
+        Path(output).parent.mkdir(parents=True, exist_ok=True)
+        with open(output, "w", encoding="utf-8") as f:
+            f.writelines(f"{name}\n" for name in names)
+        return {"files": len(names), "output": output}
+    if action == "get":
+        if output and output.endswith(('/', os.sep)):
+            # A trailing slash names a folder to download into, even if it doesn't exist yet.
+            Path(output).mkdir(parents=True, exist_ok=True)
+        return _cli_download(path, url, output or ".", insecure, auth, False, log=quiet)
+    session = None if is_local_path(url) else session_pool.get(url, insecure, auth)
+    result = _cli_download_folder(path, url, output or ".", insecure, auth, processes=processes,
+                                  session=session, log=quiet, pipeline=pipeline)
+    if result.get("failed") and "error" not in result:
+        result["error"] = f"{len(result['failed'])} file(s) could not be downloaded"
+    return result
+
+def _cli_batch(manifest, insecure, auth, jobs=BATCH_JOBS, per_origin=BATCH_PER_ORIGIN, processes=0, out=None):
+    """
+    Runs the jobs of a manifest file ('-' for stdin) with at most `jobs` running at once,
+    and at most `per_origin` against one origin. Writes one NDJSON result per job to out
+    (stdout by default) as it finishes. Returns the number of failed jobs. get-dir jobs
+    share one pool of `processes` inflating workers instead of starting one each.
+    """
+    import json
+    from concurrent.futures import ThreadPoolExecutor
+
+    out = out or sys.stdout
+    jobs, per_origin = max(1, jobs), max(1, per_origin)
+    write_lock = threading.Lock()
+    failed = 0
+
+    def emit(record):
+        nonlocal failed
+        with write_lock:
+            failed += "error" in record
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+
+    source = sys.stdin if manifest == '-' else open(manifest, encoding="utf-8")
+    try:
+        lines = list(source)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+
+    pending = deque()
+    for number, line in enumerate(lines, 1):
+        try:
+            job = _parse_batch_line(line)
+        except ValueError as e:
+            emit({"line": number, "status": "error", "error": str(e)})
+            continue
+        if job is not None:
+            pending.append((number, job))
+
+    running = {}   # origin -> jobs in progress
+    ready = threading.Condition()
+
+    def run(number, job, origin):
+        started = time.perf_counter()
+        try:
+            result = _run_batch_job(job, insecure, auth, processes, pipeline)
+        except Exception as e:
+            result = {"error": str(e)}
+        finally:
+            with ready:
+                running[origin] -= 1
+                ready.notify_all()
+        record = {"line": number, **job, "status": "error" if "error" in result else "ok",
+                  "seconds": round(time.perf_counter() - started, 3), **result}
+        emit(record)
+
+    # Workers are only spawned once a job submits a member, so unused pools cost nothing.
+    pipeline = DecompressPipeline(processes) if (processes or os.cpu_count() or 1) > 1 else None
+    try:
+        with ThreadPoolExecutor(max_workers=jobs) as executor, ready:
+            while pending:
+                # Start the first waiting job whose origin has a free slot, keeping manifest order otherwise.
+                for position, (number, job) in enumerate(pending):
+                    origin = _batch_origin(job["url"])
+                    if sum(running.values()) < jobs and running.get(origin, 0) < per_origin:
+                        del pending[position]
+                        running[origin] = running.get(origin, 0) + 1
+                        executor.submit(run, number, job, origin)
+                        break
+                else:
+                    ready.wait()
+    finally:
+        if pipeline is not None:
+            pipeline.close()
+    return failed
+
+def _server_port():
+    """Returns the web server's port, kept in a .port file so it stays the same across reloads."""
     import socket
-    import webbrowser
     import atexit
-    from threading import Timer
-    from waitress import serve
-    import sys
-    import argparse
-    
+
     PORT_FILE = ".port"
     port = None
     
@@ -757,6 +4737,12 @@ def main():
             f.write(str(port))
         # Register a function to clean up the file on exit
         atexit.register(lambda: Path(PORT_FILE).unlink(missing_ok=True))
+    return port
+
+def main():
+    """Main function to run the web server or handle CLI commands."""
+    import sys
+    import argparse
     
     parser = argparse.ArgumentParser(
         description="Remote ZIP Viewer and Downloader. Run without arguments to start the web UI.",
@@ -772,6 +4758,9 @@ def main():
                            help="Shows contents of the zip. Optionally specify a path to list its contents.")
     cli_group.add_argument('--nosubdirs', action='store_true',
                            help="Don't show subdirectories. Used with -l or --list.")
+    cli_group.add_argument('--format', choices=LISTING_FORMATS,
+                           help="With -l, stream every entry with its sizes, CRC, method, mtime and offset\n"
+                                "as it is parsed, unsorted (pipe through sort if needed).")
 
     # Downloading files/directories
     cli_group.add_argument('-g', '--get', dest='get_path',
@@ -782,6 +4771,37 @@ def main():
                            help='Specify destination path for downloads. Defaults to the current directory.')
     cli_group.add_argument('-c', '--create-directories', action='store_true',
                            help="Create the full directory structure for a downloaded file.")
+    cli_group.add_argument('-j', '--jobs', type=int, default=4,
+                           help='Number of files downloaded with --directory, or searched with --grep, in parallel. Defaults to 4.')
+    cli_group.add_argument('--processes', type=int, default=0,
+                           help='Processes inflating large compressed files with --directory or --grep.\n'
+                                f'Defaults to one per CPU once they hold {DECOMPRESS_POOL_MIN // 1024 // 1024} MB; 1 inflates them in the download threads.')
+
+    # Content search
+    cli_group.add_argument('--grep', metavar='PATTERN',
+                           help='Print the lines of archive members matching a regular expression, like grep.')
+    cli_group.add_argument('--in', dest='grep_path', default='', metavar='PATH',
+                           help="Folder or glob (e.g. 'logs/' or '*.conf') selecting the members for --grep.")
+    cli_group.add_argument('-F', '--fixed-strings', action='store_true',
+                           help='Treat the --grep pattern as a literal string.')
+    cli_group.add_argument('-i', '--ignore-case', action='store_true',
+                           help='Ignore case in --grep matches.')
+    cli_group.add_argument('-C', '--context', type=int, default=0, metavar='N',
+                           help='Print N lines of context around --grep matches.')
+    cli_group.add_argument('--max-matches', type=int, default=GREP_MATCHES,
+                           help=f'Stop --grep after this many matches. Defaults to {GREP_MATCHES}.')
+    cli_group.add_argument('--max-bytes', type=int, default=GREP_MAX_BYTES,
+                           help=f'Stop --grep after scanning this many uncompressed bytes. Defaults to {GREP_MAX_BYTES // 1024 // 1024} MB.')
+
+    # Batch mode
+    cli_group.add_argument('--batch', metavar='MANIFEST',
+                           help="Run the jobs of a manifest file ('-' for stdin) and print one JSON result per job.\n"
+                                "Each line is 'url action [path] [output]' or a JSON object with those keys;\n"
+                                f"actions: {', '.join(BATCH_ACTIONS)}.")
+    cli_group.add_argument('--batch-jobs', type=int, default=BATCH_JOBS,
+                           help=f'Jobs run at once with --batch. Defaults to {BATCH_JOBS}.')
+    cli_group.add_argument('--per-origin', type=int, default=BATCH_PER_ORIGIN,
+                           help=f'Jobs run at once against the same host with --batch. Defaults to {BATCH_PER_ORIGIN}.')
 
     # Authentication and Security
     cli_group.add_argument('-u', '--user', dest='auth_user',
@@ -792,10 +4812,10 @@ def main():
     args = parser.parse_args()
 
     # Determine if we are in CLI mode
-    is_cli_mode = args.url or args.list_path is not None or args.get_path
+    is_cli_mode = args.url or args.list_path is not None or args.get_path or args.grep or args.batch
 
     if is_cli_mode:
-        if not args.url:
+        if not args.url and not args.batch:
             parser.error("The 'url' argument is required for CLI mode.")
 
         # --- Authentication ---
@@ -807,28 +4827,46 @@ def main():
             else:
                 auth = (args.auth_user, '')
 
+        # --- Action: Batch ---
+        if args.batch:
+            failed = _cli_batch(args.batch, args.insecure, auth, args.batch_jobs, args.per_origin, args.processes)
+            sys.exit(1 if failed else 0)
+
+        # --- Action: Search File Contents ---
+        elif args.grep:
+            sys.exit(_cli_grep(args.url, args.grep, args.grep_path, args.insecure, auth, args.ignore_case,
+                               args.fixed_strings, max(args.context, 0), max(args.max_matches, 1),
+                               max(args.max_bytes, 1), args.jobs, args.processes))
+
         # --- Action: List Files ---
-        if args.list_path is not None:
-            _cli_list_files(args.url, args.list_path, args.nosubdirs, args.insecure, auth)
+        elif args.list_path is not None:
+            _cli_list_files(args.url, args.list_path, args.nosubdirs, args.insecure, auth, args.format)
 
         # --- Action: Get File/Directory ---
         elif args.get_path:
             if args.directory:
                 # Download a directory
-                _cli_download_folder(args.get_path, args.url, args.output_path, args.insecure, auth)
+                _cli_download_folder(args.get_path, args.url, args.output_path, args.insecure, auth, args.jobs, args.processes)
             else:
                 # Download a single file
                 _cli_download(args.get_path, args.url, args.output_path, args.insecure, auth, args.create_directories)
         else:
-            print("No action specified. Use -l/--list to list files or -g/--get to download.", file=sys.stderr)
+            print("No action specified. Use -l/--list to list files, -g/--get to download or --grep to search.", file=sys.stderr)
 
     else:
-        # Otherwise, start the web server
+        # Otherwise, start the web server; only now are Flask and waitress imported.
+        import webbrowser
+        from threading import Timer
+        from waitress import serve
+
+        port = _server_port()
         url = f"http://127.0.0.1{f':{port}' if port != 80 else ''}"
         print(f"Server starting at {url}")
         Timer(1, lambda: webbrowser.open(url)).start()
-        serve(app, host="127.0.0.1", port=port)
+        serve(get_app(), host="127.0.0.1", port=port)
 
 if __name__ == "__main__":
     # This block is for local development and for running the compiled executable.
+    import multiprocessing
+    multiprocessing.freeze_support()  # Lets the decompression workers start from a frozen executable
     main()